@@ -0,0 +1,236 @@
+# Process many match videos with the models loaded once per worker process.
+#
+#   python batch_runner.py --input-dir matches/ --output-dir batch_outputs/ --workers 2
+#   python batch_runner.py --manifest todays_matches.txt --output-dir batch_outputs/
+#
+# A manifest lists one video path per line (relative paths are relative to the manifest,
+# lines starting with # are skipped). Every video gets <output-dir>/<video name>/ with
+# output_video.mp4 (.avi when cv2 writes it), player_stats.csv, profile.json (stage timings) and done.json. done.json is written last and records
+# the input file it was made from, so re-running the same command skips the finished
+# videos and an interrupted batch resumes where it stopped (--force redoes everything).
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import DetectionCache, profiler, get_output_video_path, ENCODERS
+from trackers import FILL_METHODS
+from inference import BACKENDS, QUANTIZATIONS, DEFAULT_SOCKET
+from mini_court import MiniCourt
+from main import process_video_streaming, build_trackers
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def get_video_paths(input_dir=None, manifest=None):
+    video_paths = []
+    if input_dir is not None:
+        for file_name in sorted(os.listdir(input_dir)):
+            if file_name.lower().endswith(VIDEO_EXTENSIONS):
+                video_paths.append(os.path.join(input_dir, file_name))
+    if manifest is not None:
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                video_paths.append(os.path.join(manifest_dir, line))
+    # Same video listed twice is processed once
+    return list(dict.fromkeys(os.path.abspath(video_path) for video_path in video_paths))
+
+
+def get_output_dirs(video_paths, output_dir):
+    # One directory per video named after the file; videos with the same file name in
+    # different directories get a short hash of their path appended
+    names = [os.path.splitext(os.path.basename(video_path))[0] for video_path in video_paths]
+    output_dirs = {}
+    for video_path, name in zip(video_paths, names):
+        if names.count(name) > 1:
+            name = f"{name}_{hashlib.sha1(video_path.encode()).hexdigest()[:8]}"
+        output_dirs[video_path] = os.path.join(output_dir, name)
+    return output_dirs
+
+
+def get_video_signature(video_path):
+    stat = os.stat(video_path)
+    return {'video_path': video_path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def is_done(video_path, video_output_dir):
+    done_path = os.path.join(video_output_dir, 'done.json')
+    if not os.path.exists(done_path):
+        return False
+    try:
+        with open(done_path) as f:
+            done = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # A changed input video is processed again
+    return done.get('input') == get_video_signature(video_path)
+
+
+# Models of a worker process, loaded once by init_worker and used for all its videos
+worker_models = None
+
+
+def init_worker(player_model_path, ball_model_path, court_model_path, cache_dir, tracker_options=None):
+    global worker_models
+    start_time = time.perf_counter()
+    player_tracker, ball_tracker, court_line_detector = build_trackers(tracker_options, player_model_path, ball_model_path, court_model_path)
+    worker_models = {
+        'player_tracker': player_tracker,
+        'ball_tracker': ball_tracker,
+        'court_line_detector': court_line_detector,
+        'detection_cache': DetectionCache(cache_dir),
+    }
+    print(f"[worker {os.getpid()}] models loaded in {time.perf_counter()-start_time:.1f}s", flush=True)
+
+
+def process_job(video_path, video_output_dir, options):
+    # Never raises, so one broken video does not stop the batch
+    start_time = time.perf_counter()
+    # Stage timings of this video only
+    profiler.reset()
+    try:
+        os.makedirs(video_output_dir, exist_ok=True)
+        output_video_path = get_output_video_path(video_output_dir, options.get('encoder_options', {}).get('encoder', 'cv2'))
+        player_stats_path = os.path.join(video_output_dir, 'player_stats.csv')
+        profile_path = os.path.join(video_output_dir, 'profile.json')
+
+        player_stats_data_df = process_video_streaming(video_path,
+                                                       output_video_path,
+                                                       worker_models['player_tracker'],
+                                                       worker_models['ball_tracker'],
+                                                       worker_models['court_line_detector'],
+                                                       worker_models['detection_cache'],
+                                                       **options)
+        player_stats_data_df.to_csv(player_stats_path, index=False)
+        profiler.save_report(profile_path, video_path=video_path)
+
+        seconds = time.perf_counter() - start_time
+        done = {
+            'input': get_video_signature(video_path),
+            'output_video_path': output_video_path,
+            'player_stats_path': player_stats_path,
+            'profile_path': profile_path,
+            'number_of_frames': len(player_stats_data_df),
+            'seconds': seconds,
+            'options': options,
+        }
+        # done.json appears last and atomically, it is what marks the video as finished
+        done_path = os.path.join(video_output_dir, 'done.json')
+        with open(done_path + '.tmp', 'w') as f:
+            json.dump(done, f, indent=2)
+        os.replace(done_path + '.tmp', done_path)
+        return {'video_path': video_path, 'status': 'done', 'seconds': seconds, 'number_of_frames': len(player_stats_data_df)}
+    except Exception:
+        return {'video_path': video_path, 'status': 'failed', 'seconds': time.perf_counter() - start_time, 'error': traceback.format_exc()}
+
+
+def run_batch(jobs, workers, model_paths, cache_dir, options, tracker_options=None):
+    # jobs: list of (video_path, video_output_dir); yields results as videos finish
+    initargs = (model_paths['player'], model_paths['ball'], model_paths['court'], cache_dir, tracker_options)
+    if workers <= 1:
+        init_worker(*initargs)
+        for video_path, video_output_dir in jobs:
+            yield process_job(video_path, video_output_dir, options)
+        return
+
+    # spawn: torch does not survive a fork of a process that already uses it
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker,
+                             initargs=initargs) as executor:
+        futures = [executor.submit(process_job, video_path, video_output_dir, options) for video_path, video_output_dir in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input-dir', default=None, help='process every video in this directory')
+    parser.add_argument('--manifest', default=None, help='text file with one video path per line')
+    parser.add_argument('--output-dir', default='batch_outputs')
+    parser.add_argument('--workers', type=int, default=1, help='videos processed at the same time, each worker loads the models once')
+    parser.add_argument('--force', action='store_true', help='process videos even if they already finished')
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--court-model', default='models/keypoints_model.pth')
+    parser.add_argument('--cache-dir', default='tracker_cache')
+    parser.add_argument('--window-size', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--projection', choices=MiniCourt.PROJECTION_MODES, default='player_height')
+    parser.add_argument('--track-court-keypoints', action='store_true')
+    parser.add_argument('--court-redetect-interval', type=int, default=None)
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help='PyTorch or the models exported by export_models.py')
+    parser.add_argument('--quantize', choices=QUANTIZATIONS, default=None)
+    parser.add_argument('--server', nargs='?', const=DEFAULT_SOCKET, default=None, help='run the models in the inference server listening on this socket, workers then load none')
+    parser.add_argument('--detection-stride', type=int, default=1, help='run the player detector on every K-th frame')
+    parser.add_argument('--ball-detection-stride', type=int, default=None, help='--detection-stride by default')
+    parser.add_argument('--motion-threshold', type=float, default=None)
+    parser.add_argument('--stride-fill', choices=FILL_METHODS, default='linear')
+    parser.add_argument('--person-only', action='store_true', help='ask the player model for people only')
+    parser.add_argument('--court-margin', type=float, default=None, help='detect players on a crop of the court only')
+    parser.add_argument('--ball-roi-size', type=int, default=None, help='search the ball in a crop around its predicted position')
+    parser.add_argument('--ball-roi-max-misses', type=int, default=3)
+    parser.add_argument('--ball-roi-imgsz', type=int, default=None)
+    parser.add_argument('--encoder', choices=ENCODERS, default='auto', help='ffmpeg compresses the output videos, cv2 writes MJPG')
+    parser.add_argument('--codec', default='h264')
+    parser.add_argument('--crf', type=int, default=23)
+    parser.add_argument('--preset', default='veryfast')
+    parser.add_argument('--encoder-threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.input_dir is None and args.manifest is None:
+        parser.error('one of --input-dir or --manifest is required')
+
+    video_paths = get_video_paths(args.input_dir, args.manifest)
+    output_dirs = get_output_dirs(video_paths, args.output_dir)
+    jobs = []
+    for video_path in video_paths:
+        if not args.force and is_done(video_path, output_dirs[video_path]):
+            print(f"skip {video_path} (done)")
+            continue
+        jobs.append((video_path, output_dirs[video_path]))
+    print(f"{len(jobs)} of {len(video_paths)} videos to process with {args.workers} worker(s)")
+
+    options = {
+        'window_size': args.window_size,
+        'batch_size': args.batch_size,
+        'projection_mode': args.projection,
+        'track_court_keypoints': args.track_court_keypoints,
+        'court_redetect_interval': args.court_redetect_interval,
+        'encoder_options': {'encoder': args.encoder, 'codec': args.codec, 'crf': args.crf, 'preset': args.preset,
+                            'threads': args.encoder_threads, 'background': True},
+    }
+    model_paths = {'player': args.player_model, 'ball': args.ball_model, 'court': args.court_model}
+    ball_detection_stride = args.detection_stride if args.ball_detection_stride is None else args.ball_detection_stride
+    tracker_options = {'player': {'stride': args.detection_stride, 'motion_threshold': args.motion_threshold, 'fill_method': args.stride_fill,
+                                 'person_only': args.person_only, 'court_margin': args.court_margin},
+                      'ball': {'stride': ball_detection_stride, 'motion_threshold': args.motion_threshold, 'fill_method': args.stride_fill,
+                               'roi_size': args.ball_roi_size, 'roi_max_misses': args.ball_roi_max_misses, 'roi_imgsz': args.ball_roi_imgsz}}
+    tracker_options['court'] = {}
+    for model_options in tracker_options.values():
+        model_options.update(backend=args.backend, quantization=args.quantize, server=args.server)
+
+    failed = []
+    start_time = time.perf_counter()
+    for result in run_batch(jobs, args.workers, model_paths, args.cache_dir, options, tracker_options):
+        if result['status'] == 'done':
+            print(f"done {result['video_path']}: {result['number_of_frames']} frames in {result['seconds']:.1f}s")
+        else:
+            failed.append(result)
+            print(f"FAILED {result['video_path']} after {result['seconds']:.1f}s\n{result['error']}")
+    print(f"{len(jobs)-len(failed)} done, {len(failed)} failed in {time.perf_counter()-start_time:.1f}s")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
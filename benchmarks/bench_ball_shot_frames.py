@@ -0,0 +1,94 @@
+# BallTracker.get_ball_shot_frames on a synthetic ball track
+#
+#   python benchmarks/bench_ball_shot_frames.py --frames 1000000 --reference-frames 20000
+#
+# The previous nested .iloc loop is kept below as the reference; it is only run on
+# the first --reference-frames frames because it is far too slow for a full match.
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trackers import BallTracker
+
+
+def make_ball_track(number_of_frames, seed=0):
+    # Ball bouncing between the players: a triangle wave in y with a random rally
+    # length per shot, some pixel noise and ~10% missing detections
+    rng = np.random.default_rng(seed)
+    shot_lengths = rng.integers(30, 90, number_of_frames // 30 + 1)
+    y = np.empty(number_of_frames)
+    position = 0
+    direction = 1
+    for shot_length in shot_lengths:
+        end = min(position + shot_length, number_of_frames)
+        y[position:end] = np.linspace(200, 800, shot_length)[:end-position][::direction]
+        direction = -direction
+        position = end
+        if position == number_of_frames:
+            break
+    y += rng.normal(0, 2, number_of_frames)
+    x = 900 + rng.normal(0, 50, number_of_frames)
+    detected = rng.random(number_of_frames) > 0.1
+    return [{1: [x[i], y[i], x[i]+10, y[i]+10]} if detected[i] else {} for i in range(number_of_frames)]
+
+
+def reference_get_ball_shot_frames(ball_positions):
+    ball_positions = [x.get(1,[]) for x in ball_positions]
+    df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
+    df_ball_positions['ball_hit'] = 0
+    df_ball_positions['mid_y'] = (df_ball_positions['y1'] + df_ball_positions['y2'])/2
+    df_ball_positions['mid_y_rolling_mean'] = df_ball_positions['mid_y'].rolling(window=5, min_periods=1, center=False).mean()
+    df_ball_positions['delta_y'] = df_ball_positions['mid_y_rolling_mean'].diff()
+    minimum_change_frames_for_hit = 25
+    for i in range(1,len(df_ball_positions)- int(minimum_change_frames_for_hit*1.2) ):
+        negative_position_change = df_ball_positions['delta_y'].iloc[i] >0 and df_ball_positions['delta_y'].iloc[i+1] <0
+        positive_position_change = df_ball_positions['delta_y'].iloc[i] <0 and df_ball_positions['delta_y'].iloc[i+1] >0
+        if negative_position_change or positive_position_change:
+            change_count = 0
+            for change_frame in range(i+1, i+int(minimum_change_frames_for_hit*1.2)+1):
+                negative_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] >0 and df_ball_positions['delta_y'].iloc[change_frame] <0
+                positive_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] <0 and df_ball_positions['delta_y'].iloc[change_frame] >0
+                if negative_position_change and negative_position_change_following_frame:
+                    change_count+=1
+                elif positive_position_change and positive_position_change_following_frame:
+                    change_count+=1
+            if change_count>minimum_change_frames_for_hit-1:
+                df_ball_positions.loc[i, 'ball_hit'] = 1
+    return df_ball_positions[df_ball_positions['ball_hit']==1].index.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=1_000_000)
+    parser.add_argument('--reference-frames', type=int, default=20_000)
+    args = parser.parse_args()
+
+    # get_ball_shot_frames does not use the detection model
+    ball_tracker = BallTracker.__new__(BallTracker)
+
+    ball_positions = make_ball_track(args.frames)
+
+    reference_positions = ball_positions[:args.reference_frames]
+    start = time.perf_counter()
+    reference_hits = reference_get_ball_shot_frames(reference_positions)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = ball_tracker.get_ball_shot_frames(reference_positions)
+    vectorized_seconds = time.perf_counter() - start
+    assert hits == reference_hits, "vectorized shot frames differ from the reference loop"
+    print(f"{args.reference_frames} frames: loop {reference_seconds:.3f}s, vectorized {vectorized_seconds:.4f}s "
+          f"({reference_seconds/vectorized_seconds:.0f}x), {len(hits)} shots, identical results")
+
+    start = time.perf_counter()
+    hits = ball_tracker.get_ball_shot_frames(ball_positions)
+    vectorized_seconds = time.perf_counter() - start
+    estimated_reference_seconds = reference_seconds * args.frames / args.reference_frames
+    print(f"{args.frames} frames: vectorized {vectorized_seconds:.3f}s, {len(hits)} shots "
+          f"(loop estimated at {estimated_reference_seconds:.0f}s)")
+
+
+if __name__ == '__main__':
+    main()
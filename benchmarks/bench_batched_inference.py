@@ -0,0 +1,66 @@
+# Throughput of PlayerTracker/BallTracker detect_frames for different batch sizes on CPU
+#
+#   python benchmarks/bench_batched_inference.py --video input_videos/input_video.mp4 --frames 64
+#
+# Without --video the frames are synthetic noise images of the given resolution.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trackers import PlayerTracker, BallTracker
+from utils import read_video_stream
+
+
+def get_frames(video_path, number_of_frames, width, height):
+    if video_path is not None:
+        frames = []
+        for frame in read_video_stream(video_path):
+            frames.append(frame)
+            if len(frames) == number_of_frames:
+                break
+        return frames
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(number_of_frames)]
+
+
+def time_detect_frames(tracker, frames, batch_size):
+    start = time.perf_counter()
+    tracker.detect_frames(frames, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=64)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    frames = get_frames(args.video, args.frames, args.width, args.height)
+
+    print(f"{'tracker':<8} {'batch':>5} {'seconds':>9} {'fps':>8} {'speedup':>8}")
+    for name, tracker_class, model_path in [('player', PlayerTracker, args.player_model),
+                                            ('ball', BallTracker, args.ball_model)]:
+        base_fps = None
+        for batch_size in args.batch_sizes:
+            tracker = tracker_class(model_path=model_path)
+            # Warm up outside the timed region
+            tracker.detect_frames(frames[:batch_size], batch_size=batch_size)
+
+            seconds = time_detect_frames(tracker, frames, batch_size)
+            fps = len(frames) / seconds
+            if base_fps is None:
+                base_fps = fps
+            print(f"{name:<8} {batch_size:>5} {seconds:>9.2f} {fps:>8.2f} {fps/base_fps:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# CourtLineDetector model construction time and per-frame latency, before and after
+# predict_batch (cv2 preprocessing into a preallocated buffer, inference_mode, channels_last)
+#
+#   python benchmarks/bench_court_line_detector.py --model models/keypoints_model.pth --frames 32
+#
+# Without the checkpoint a randomly initialized one is written to a temporary file.
+# The previous construction downloads the ImageNet weights; its time is reported as
+# skipped when there is no network.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import tempfile
+import time
+import numpy as np
+import cv2
+import torch
+import torchvision.transforms as transforms
+from torchvision import models
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from court_line_detector import CourtLineDetector
+
+
+class ReferenceCourtLineDetector:
+    # CourtLineDetector as it was before predict_batch
+    def __init__(self, model_path, pretrained=True):
+        self.model = models.resnet50(pretrained=pretrained)
+        self.model.fc = torch.nn.Linear(self.model.fc.in_features, 14*2)
+        self.model.load_state_dict(torch.load(model_path, map_location='cpu'))
+        self.transform = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+
+    def predict(self, image):
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image_tensor = self.transform(image_rgb).unsqueeze(0)
+        with torch.no_grad():
+            outputs = self.model(image_tensor)
+        keypoints = outputs.squeeze().cpu().numpy()
+        original_h, original_w = image.shape[:2]
+        keypoints[::2] *= original_w / 224.0
+        keypoints[1::2] *= original_h / 224.0
+        return keypoints
+
+
+def time_call(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='models/keypoints_model.pth')
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    model_path = args.model
+    if not os.path.exists(model_path):
+        model = models.resnet50(weights=None)
+        model.fc = torch.nn.Linear(model.fc.in_features, 14*2)
+        model_path = os.path.join(tempfile.mkdtemp(), 'keypoints_model.pth')
+        torch.save(model.state_dict(), model_path)
+        print(f"{args.model} not found, using random weights")
+
+    rng = np.random.default_rng(0)
+    frames = [cv2.GaussianBlur(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8), (9, 9), 0)
+              for _ in range(args.frames)]
+
+    try:
+        seconds, reference_detector = time_call(lambda: ReferenceCourtLineDetector(model_path))
+        print(f"construction before: {seconds:.2f}s (resnet50 with ImageNet weights)")
+    except Exception as e:
+        print(f"construction before: skipped ({type(e).__name__}: {e})")
+        # predict latency does not depend on the ImageNet weights
+        reference_detector = ReferenceCourtLineDetector(model_path, pretrained=False)
+    seconds, detector = time_call(lambda: CourtLineDetector(model_path))
+    print(f"construction after:  {seconds:.2f}s")
+
+    reference_detector.predict(frames[0])
+    seconds, _ = time_call(lambda: [reference_detector.predict(frame) for frame in frames])
+    print(f"predict before:      {seconds/len(frames)*1000:7.1f} ms/frame")
+
+    detector.predict(frames[0])
+    seconds, _ = time_call(lambda: [detector.predict(frame) for frame in frames])
+    print(f"predict after:       {seconds/len(frames)*1000:7.1f} ms/frame")
+    for batch_size in args.batch_sizes:
+        detector.predict_batch(frames[:batch_size])
+        seconds, _ = time_call(lambda: [detector.predict_batch(frames[i:i+batch_size]) for i in range(0, len(frames), batch_size)])
+        print(f"predict_batch({batch_size:>2}):   {seconds/len(frames)*1000:7.1f} ms/frame")
+
+
+if __name__ == '__main__':
+    main()
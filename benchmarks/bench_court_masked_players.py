@@ -0,0 +1,99 @@
+# Player detection restricted to people on and around the court (PlayerTracker
+# person_only and court_margin)
+#
+#   python benchmarks/bench_court_masked_players.py
+#   python benchmarks/bench_court_masked_players.py --margins 0.1 0.2 --video input_videos/input_video.mp4 --frames 120
+#
+# Without model weights: the court filter is applied to the recorded player detections
+# (tracker_stubs/player_detections.pkl, all people of every frame) and the crop share of
+# the frame, the rows and tracks kept, the pickled size of the detections and whether the
+# two chosen players survive are printed for every margin. --court-keypoints sets the 14
+# x, y pairs of the stub video, synthetic broadcast ones by default.
+# With --video the player model also runs on its first --frames frames for full frame,
+# person only and person only + court crop detection, timed against each other.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import pickle
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import COURT_KEYPOINTS, StubDetector
+from trackers import PlayerTracker
+from utils import Detections, read_video_stream
+
+
+def get_masked_tracker(court_keypoints, court_margin):
+    # Only the court filter, no model
+    player_tracker = PlayerTracker.__new__(PlayerTracker)
+    player_tracker.court_margin = court_margin
+    player_tracker.set_court_keypoints(court_keypoints)
+    return player_tracker
+
+
+def compare_payload(args, court_keypoints):
+    player_list = StubDetector.from_stub('player_detections.pkl').detections_list
+    full_detections = Detections.from_list(player_list)
+    full_bytes = len(pickle.dumps(player_list))
+    chosen_players = sorted(PlayerTracker.__new__(PlayerTracker).choose_players(court_keypoints, player_list[0]))
+    frame_height, frame_width = args.frame_height, args.frame_width
+
+    print(f"{len(player_list)} frames, {len(full_detections.frame_idx)} player rows in {len(full_detections.get_track_ids())} tracks, "
+          f"{full_bytes/1e3:.1f} kB pickled, chosen players {chosen_players}")
+    print(f"{'margin':>6} {'crop':>22} {'pixels':>7} {'rows':>7} {'tracks':>7} {'kB':>8} {'chosen kept':>12}")
+    for court_margin in args.margins:
+        player_tracker = get_masked_tracker(court_keypoints, court_margin)
+        masked_list = [player_tracker.filter_court_area(player_dict) for player_dict in player_list]
+        masked_detections = Detections.from_list(masked_list)
+        x1, y1, x2, y2 = player_tracker.court_area[0]
+        x2, y2 = min(x2, frame_width), min(y2, frame_height)
+        pixels = (x2-x1)*(y2-y1) / (frame_width*frame_height)
+        chosen_kept = sorted(player_tracker.choose_players(court_keypoints, masked_list[0])) == chosen_players if len(masked_list[0]) >= 2 else False
+        print(f"{court_margin:>6.2f} {str((x1, y1, x2, y2)):>22} {pixels:>7.2f} {len(masked_detections.frame_idx):>7} "
+              f"{len(masked_detections.get_track_ids()):>7} {len(pickle.dumps(masked_list))/1e3:>8.1f} {str(chosen_kept):>12}")
+
+
+def time_detection(args, court_keypoints):
+    frames = list(read_video_stream(args.video, 0, args.frames))
+    settings = [('full frame', {}), ('person only', {'person_only': True})]
+    settings += [(f"court {court_margin:g}", {'person_only': True, 'court_margin': court_margin, 'court_keypoints': court_keypoints})
+                 for court_margin in args.margins]
+
+    print(f"\n{len(frames)} frames of {args.video}")
+    print(f"{'setting':<14} {'seconds':>9} {'fps':>8} {'speedup':>8} {'rows':>7}")
+    base_seconds = None
+    for name, options in settings:
+        player_tracker = PlayerTracker(model_path=args.player_model, **options)
+        # The first call also sets the model up, keep it out of the timings
+        player_tracker.detect_frame(frames[0])
+        player_tracker.reset_tracking()
+        start = time.perf_counter()
+        player_detections = player_tracker.detect_frames(frames, batch_size=args.batch_size)
+        seconds = time.perf_counter() - start
+        if base_seconds is None:
+            base_seconds = seconds
+        print(f"{name:<14} {seconds:>9.2f} {len(frames)/seconds:>8.2f} {base_seconds/seconds:>7.2f}x {len(player_detections.frame_idx):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--margins', type=float, nargs='+', default=[0.05, 0.1, 0.15, 0.25])
+    parser.add_argument('--court-keypoints', type=float, nargs=28, default=None)
+    parser.add_argument('--frame-width', type=int, default=1920)
+    parser.add_argument('--frame-height', type=int, default=1080)
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    court_keypoints = np.array(args.court_keypoints) if args.court_keypoints is not None else COURT_KEYPOINTS
+    compare_payload(args, court_keypoints)
+    if args.video is not None:
+        time_detection(args, court_keypoints)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Accuracy lost against detector runs saved by stride detection, CPU only, no model weights
+#
+#   python benchmarks/bench_detection_stride.py
+#   python benchmarks/bench_detection_stride.py --source generated --frames 5000 --strides 2 4 8
+#   python benchmarks/bench_detection_stride.py --video input_videos/input_video.mp4 --motion-thresholds 2 4 8
+#
+# The detections of every frame (tracker_stubs/*.pkl or generated tracks) are the ground
+# truth. Each setting keeps only the detections of the frames the StrideScheduler picks,
+# fills in the others like the trackers do and runs the rest of the analysis on them.
+# The detector is by far the slowest stage, so frames/runs is the speedup of detection.
+#   player iou / center   mean IoU and center distance (px) of the player boxes of the ground truth
+#   recall                ground truth player boxes that are still there
+#   ball center           mean center distance (px) of the ball after interpolation
+#   shots                 ground truth shot frames found within --shot-tolerance frames, and the extra ones
+#   stats                 largest difference of the final stats row (km/h or shots)
+# Motion-adaptive settings need the frames: pass --video, the video the stubs were made from.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import COURT_KEYPOINTS, StubDetector, make_tracks
+from trackers import PlayerTracker, BallTracker, StrideScheduler, FILL_METHODS, detections_from_keyframes
+from mini_court import MiniCourt
+from utils import Detections, read_video_stream
+from player_stats import get_player_stats
+
+
+def get_ground_truth(args):
+    if args.source == 'stub':
+        player_list = StubDetector.from_stub('player_detections.pkl').detections_list
+        ball_list = StubDetector.from_stub('ball_detections.pkl').detections_list
+    else:
+        player_list, ball_list = make_tracks(args.frames)
+    return player_list, ball_list
+
+
+def analyze(player_detections, ball_detections, number_of_frames):
+    # The offline analysis of main() from the raw detections to the stats
+    player_tracker = PlayerTracker.__new__(PlayerTracker)
+    ball_tracker = BallTracker.__new__(BallTracker)
+    mini_court = MiniCourt(np.zeros((1080, 1920, 3), np.uint8))
+    chosen_player_detections = player_tracker.choose_and_filter_players(COURT_KEYPOINTS, player_detections)
+    ball_detections = ball_tracker.interpolate_ball_positions(ball_detections)
+    ball_shot_frames = ball_tracker.get_ball_shot_frames(ball_detections)
+    player_mini_court_detections, ball_mini_court_detections = mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+        chosen_player_detections, ball_detections, COURT_KEYPOINTS)
+    player_stats = get_player_stats(ball_shot_frames, ball_mini_court_detections, player_mini_court_detections, mini_court, number_of_frames)
+    return ball_detections, ball_shot_frames, player_stats
+
+
+def get_centers(bboxes):
+    return np.stack([(bboxes[:, 0]+bboxes[:, 2])/2, (bboxes[:, 1]+bboxes[:, 3])/2], axis=1)
+
+
+def compare_players(truth, detections):
+    # Rows of the ground truth with the same (frame, track id) in detections
+    truth_keys = truth.frame_idx.astype(np.int64) * (1 << 32) + truth.track_id
+    keys = detections.frame_idx.astype(np.int64) * (1 << 32) + detections.track_id
+    order = np.argsort(keys)
+    positions = np.minimum(np.searchsorted(keys[order], truth_keys), max(len(keys)-1, 0))
+    found = (keys[order][positions] == truth_keys) if len(keys) else np.zeros(len(truth_keys), dtype=bool)
+    truth_bboxes = truth.bboxes[found]
+    bboxes = detections.bboxes[order][positions][found]
+
+    intersection_width = np.clip(np.minimum(truth_bboxes[:, 2], bboxes[:, 2]) - np.maximum(truth_bboxes[:, 0], bboxes[:, 0]), 0, None)
+    intersection_height = np.clip(np.minimum(truth_bboxes[:, 3], bboxes[:, 3]) - np.maximum(truth_bboxes[:, 1], bboxes[:, 1]), 0, None)
+    intersection = intersection_width * intersection_height
+    union = ((truth_bboxes[:, 2]-truth_bboxes[:, 0])*(truth_bboxes[:, 3]-truth_bboxes[:, 1]) +
+             (bboxes[:, 2]-bboxes[:, 0])*(bboxes[:, 3]-bboxes[:, 1]) - intersection)
+    iou = float(np.mean(intersection/union)) if len(union) else np.nan
+    center_error = float(np.mean(np.linalg.norm(get_centers(truth_bboxes) - get_centers(bboxes), axis=1))) if len(union) else np.nan
+    return iou, center_error, float(np.mean(found))
+
+
+def compare_shots(truth_shot_frames, shot_frames, tolerance):
+    shot_frames = np.asarray(shot_frames)
+    if len(shot_frames) == 0:
+        return 0, 0
+    matched = sum(1 for frame_num in truth_shot_frames if np.min(np.abs(shot_frames - frame_num)) <= tolerance)
+    extra = sum(1 for frame_num in shot_frames if not len(truth_shot_frames) or np.min(np.abs(np.asarray(truth_shot_frames) - frame_num)) > tolerance)
+    return matched, extra
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', choices=['stub', 'generated'], default='stub')
+    parser.add_argument('--frames', type=int, default=2_000, help='length of the generated tracks')
+    parser.add_argument('--strides', type=int, nargs='+', default=[1, 2, 3, 4, 6, 8])
+    parser.add_argument('--fill-methods', choices=FILL_METHODS, nargs='+', default=list(FILL_METHODS))
+    parser.add_argument('--video', default=None, help='frames for the motion-adaptive settings')
+    parser.add_argument('--motion-thresholds', type=float, nargs='+', default=[2.0, 4.0, 8.0])
+    parser.add_argument('--adaptive-stride', type=int, default=8, help='stride of the motion-adaptive settings')
+    parser.add_argument('--shot-tolerance', type=int, default=2)
+    args = parser.parse_args()
+
+    player_list, ball_list = get_ground_truth(args)
+    frames = None
+    if args.video is not None:
+        frames = list(read_video_stream(args.video, 0, len(player_list)))
+        player_list, ball_list = player_list[:len(frames)], ball_list[:len(frames)]
+    number_of_frames = len(player_list)
+
+    truth_players = Detections.from_list(player_list)
+    truth_ball, truth_shot_frames, truth_stats = analyze(truth_players, Detections.from_list(ball_list), number_of_frames)
+    truth_ball_centers = get_centers(truth_ball.get_track_bboxes(1))
+    truth_final_stats = np.nan_to_num(truth_stats.values[-1])
+
+    # (stride, motion threshold)
+    settings = [(stride, None) for stride in args.strides]
+    if frames is not None:
+        settings += [(args.adaptive_stride, motion_threshold) for motion_threshold in args.motion_thresholds]
+
+    print(f"{number_of_frames} frames, {len(truth_shot_frames)} shots in the ground truth")
+    print(f"{'stride':>6} {'motion':>6} {'fill':<17} {'runs':>6} {'speedup':>8} {'player iou':>10} {'center':>7} {'recall':>7} "
+          f"{'ball center':>11} {'shots':>7} {'extra':>5} {'stats':>7}")
+    for stride, motion_threshold in settings:
+        scheduler = StrideScheduler(stride, motion_threshold)
+        detection_frames = scheduler.get_detection_frames(number_of_frames, frames)
+        for fill_method in args.fill_methods:
+            player_detections = detections_from_keyframes([player_list[frame_num] for frame_num in detection_frames],
+                                                          detection_frames, number_of_frames, fill_method)
+            ball_detections = detections_from_keyframes([ball_list[frame_num] for frame_num in detection_frames],
+                                                        detection_frames, number_of_frames, fill_method)
+            iou, center_error, recall = compare_players(truth_players, player_detections)
+
+            ball_detections, ball_shot_frames, player_stats = analyze(player_detections, ball_detections, number_of_frames)
+            ball_error = np.nanmean(np.linalg.norm(get_centers(ball_detections.get_track_bboxes(1)) - truth_ball_centers, axis=1))
+            matched, extra = compare_shots(truth_shot_frames, ball_shot_frames, args.shot_tolerance)
+            stats_difference = np.max(np.abs(np.nan_to_num(player_stats.values[-1]) - truth_final_stats))
+
+            motion = '-' if motion_threshold is None else f"{motion_threshold:g}"
+            print(f"{stride:>6} {motion:>6} {fill_method:<17} {len(detection_frames):>6} {number_of_frames/len(detection_frames):>7.2f}x "
+                  f"{iou:>10.3f} {center_error:>7.2f} {recall:>7.3f} {ball_error:>11.2f} "
+                  f"{matched:>3}/{len(truth_shot_frames):<3} {extra:>5} {stats_difference:>7.2f}")
+            if stride == 1 and motion_threshold is None:
+                # Nothing is filled in, the other fill methods give the same
+                break
+
+
+if __name__ == '__main__':
+    main()
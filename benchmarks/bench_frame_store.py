@@ -0,0 +1,106 @@
+# Decoded frames held in a list (read_video) against the memory-mapped FrameStore
+#
+#   python benchmarks/bench_frame_store.py
+#   python benchmarks/bench_frame_store.py --video input_videos/input_video.mp4 --random-reads 1000
+#
+# Without --video a synthetic video is written to a temporary directory, as is the store.
+# Every setting runs in its own process so that the peak RSS is its own:
+#   list          read_video, every frame decoded into memory
+#   store create  first run: decode once into the frame file, then map it
+#   store reuse   later runs: map the existing frame file, nothing is decoded
+# load is the time until the frames can be used, sequential the time to read every frame
+# once in order, random the time per frame of --random-reads reads at random indices.
+# Peak RSS also counts the pages of the frame file that were read, but those are clean
+# file pages the OS can drop again, unlike the frames of the list.
+# Right after "store create" the file is in the OS page cache; after a reboot (or
+# dropping the caches) "store reuse" reads it from disk.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import make_tracks, write_synthetic_video
+from utils import FrameStore, read_video, get_peak_rss_bytes
+
+SETTINGS = ('list', 'store create', 'store reuse')
+
+
+def read_frames(frames, frame_nums):
+    checksum = 0
+    for frame_num in frame_nums:
+        checksum += int(frames[frame_num].sum(dtype=np.uint64))
+    return checksum
+
+
+def run_setting(args):
+    # One measured setting, printed as JSON
+    start = time.perf_counter()
+    if args.setting == 'list':
+        frames = read_video(args.video)
+    elif args.setting == 'store create':
+        frames = FrameStore.create(args.video, args.store_path)
+    else:
+        frames = FrameStore(args.store_path)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checksum = read_frames(frames, range(len(frames)))
+    sequential_seconds = time.perf_counter() - start
+
+    frame_nums = np.random.default_rng(0).integers(0, len(frames), args.random_reads)
+    start = time.perf_counter()
+    read_frames(frames, frame_nums)
+    random_seconds = time.perf_counter() - start
+    print(json.dumps({'frames': len(frames), 'load': load_seconds, 'sequential': sequential_seconds, 'random': random_seconds / args.random_reads,
+                      'peak_rss': get_peak_rss_bytes(), 'checksum': checksum}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--random-reads', type=int, default=500)
+    parser.add_argument('--setting', choices=SETTINGS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--store-path', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setting is not None:
+        run_setting(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, 'synthetic.mp4')
+            _, ball_list = make_tracks(args.frames)
+            write_synthetic_video(video_path, args.frames, args.width, args.height, ball_detections=ball_list)
+        store_path = os.path.join(tmp_dir, 'video.frames')
+
+        results = {}
+        for setting in SETTINGS:
+            command = [sys.executable, os.path.abspath(__file__), '--video', video_path, '--setting', setting,
+                       '--store-path', store_path, '--random-reads', str(args.random_reads)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results[setting] = json.loads(output.strip().splitlines()[-1])
+        store_bytes = os.path.getsize(store_path)
+
+    number_of_frames = results['list']['frames']
+    print(f"{number_of_frames} frames, frame file {store_bytes/1e6:.0f} MB")
+    print(f"{'setting':<13} {'load s':>7} {'sequential s':>13} {'random ms':>10} {'peak RSS MB':>12}")
+    for setting, result in results.items():
+        peak_rss = f"{result['peak_rss']/1e6:>12.0f}" if result['peak_rss'] is not None else f"{'-':>12}"
+        print(f"{setting:<13} {result['load']:>7.2f} {result['sequential']:>13.2f} {result['random']*1e3:>10.3f} {peak_rss}")
+    same = len({result['checksum'] for result in results.values()}) == 1
+    print(f"same frames: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# Latency and agreement with PyTorch of the inference backends for the player, ball and
+# court models
+#
+#   python export_models.py --backend onnx && python export_models.py --backend onnx --quantize dynamic
+#   python benchmarks/bench_inference_backends.py --video input_videos/input_video.mp4
+#   python benchmarks/bench_inference_backends.py --models court --settings torch onnx onnx-int8-dynamic
+#
+# Settings are <backend>[-int8-<quantization>]; a setting without its export (or runtime)
+# is skipped with the reason. Every model runs one frame at a time on --frames frames of
+# --video (a synthetic video without it), after --warmup frames. PyTorch is the reference:
+#   player/ball  share of the PyTorch boxes found with IoU >= --iou, mean IoU of those, extra boxes
+#   court        mean and max distance (px) of the 14 keypoints
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import make_tracks, write_synthetic_video
+from trackers import PlayerTracker, BallTracker
+from court_line_detector import CourtLineDetector
+from utils import read_video_stream, get_bbox_iou_matrix
+
+MODELS = ('player', 'ball', 'court')
+SETTINGS = ('torch', 'onnx', 'onnx-int8-dynamic', 'onnx-int8-static', 'openvino')
+
+
+def parse_setting(setting):
+    backend, _, quantization = setting.partition('-int8-')
+    return backend, quantization or None
+
+
+def build_model(model_name, model_path, backend, quantization):
+    if model_name == 'player':
+        return PlayerTracker(model_path=model_path, backend=backend, quantization=quantization)
+    if model_name == 'ball':
+        return BallTracker(model_path=model_path, backend=backend, quantization=quantization)
+    return CourtLineDetector(model_path, backend=backend, quantization=quantization)
+
+
+def run_model(model_name, model, frame):
+    if model_name == 'court':
+        return model.predict(frame)
+    bboxes = list(model.detect_frame(frame).values())
+    return np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+
+
+def time_model(model_name, model, frames, warmup):
+    for frame in frames[:warmup]:
+        run_model(model_name, model, frame)
+    if model_name == 'player':
+        model.reset_tracking()
+    outputs = []
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        outputs.append(run_model(model_name, model, frame))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), outputs
+
+
+def compare_boxes(reference_outputs, outputs, iou_threshold):
+    matched = 0
+    extra = 0
+    ious = []
+    for reference_bboxes, bboxes in zip(reference_outputs, outputs):
+        if len(reference_bboxes) == 0 or len(bboxes) == 0:
+            extra += len(bboxes)
+            continue
+        iou_matrix = get_bbox_iou_matrix(reference_bboxes, bboxes)
+        best_ious = iou_matrix.max(axis=1)
+        found = best_ious >= iou_threshold
+        matched += int(found.sum())
+        ious.extend(best_ious[found].tolist())
+        extra += int(np.sum(iou_matrix.max(axis=0) < iou_threshold))
+    number_of_references = sum(len(reference_bboxes) for reference_bboxes in reference_outputs)
+    recall = matched / number_of_references if number_of_references else np.nan
+    return f"{recall:.3f} found, IoU {np.mean(ious) if ious else np.nan:.3f}, {extra} extra"
+
+
+def compare_keypoints(reference_outputs, outputs):
+    distances = np.linalg.norm((np.array(outputs) - np.array(reference_outputs)).reshape(len(outputs), -1, 2), axis=2)
+    return f"{distances.mean():.2f} px mean, {distances.max():.2f} px max"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', choices=MODELS, nargs='+', default=list(MODELS))
+    parser.add_argument('--settings', nargs='+', default=list(SETTINGS))
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--court-model', default='models/keypoints_model.pth')
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=48)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--iou', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, 'synthetic.mp4')
+            _, ball_list = make_tracks(args.frames)
+            write_synthetic_video(video_path, args.frames, 1280, 720, ball_detections=ball_list)
+        frames = list(read_video_stream(video_path, 0, args.frames))
+
+    model_paths = {'player': args.player_model, 'ball': args.ball_model, 'court': args.court_model}
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, one at a time")
+    print(f"{'model':<7} {'setting':<20} {'load s':>7} {'ms/frame':>9} {'p90 ms':>7} {'speedup':>8}  agreement with torch")
+    for model_name in args.models:
+        reference_outputs = None
+        reference_latency = None
+        for setting in args.settings:
+            backend, quantization = parse_setting(setting)
+            try:
+                start = time.perf_counter()
+                model = build_model(model_name, model_paths[model_name], backend, quantization)
+                load_seconds = time.perf_counter() - start
+            except (FileNotFoundError, ImportError, ValueError) as error:
+                print(f"{model_name:<7} {setting:<20} skipped: {error}")
+                continue
+            latencies, outputs = time_model(model_name, model, frames, args.warmup)
+            latency = np.median(latencies)
+
+            if setting == 'torch':
+                reference_outputs, reference_latency = outputs, latency
+                agreement = 'reference'
+            elif reference_outputs is None:
+                agreement = '-'
+            elif model_name == 'court':
+                agreement = compare_keypoints(reference_outputs, outputs)
+            else:
+                agreement = compare_boxes(reference_outputs, outputs, args.iou)
+            speedup = f"{reference_latency/latency:>7.2f}x" if reference_latency is not None else f"{'-':>8}"
+            print(f"{model_name:<7} {setting:<20} {load_seconds:>7.2f} {latency*1e3:>9.2f} {np.percentile(latencies, 90)*1e3:>7.2f} {speedup}  {agreement}")
+
+
+if __name__ == '__main__':
+    main()
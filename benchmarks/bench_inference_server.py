@@ -0,0 +1,136 @@
+# Start up cost and per-frame latency of the models loaded in the process against the
+# models of the inference server (inference_server.py, --server in main.py)
+#
+#   python benchmarks/bench_inference_server.py
+#   python benchmarks/bench_inference_server.py --frames 60 --repeats 5 --backend onnx
+#
+# Every run is a fresh Python process, like a run of main.py, that imports the trackers,
+# builds the player tracker, ball tracker and court line detector and runs them on
+# --frames synthetic frames. process is the wall time of the whole process, import and
+# load the time to import the modules and build the models, first the first frame and
+# ms/frame the median of the others (player + ball + court). A server is started on a
+# temporary socket for the runs (not counted), unless --server points to a running one;
+# the detections of both settings are compared.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_client(args):
+    # One measured run, printed as JSON
+    start_time = time.perf_counter()
+    sys.path.append(ROOT)
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from synthetic import iter_synthetic_frames, make_tracks
+    from trackers import PlayerTracker, BallTracker
+    from court_line_detector import CourtLineDetector
+    import_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    options = {'backend': args.backend, 'quantization': args.quantize, 'server': args.server}
+    player_tracker = PlayerTracker(model_path=args.player_model, **options)
+    ball_tracker = BallTracker(model_path=args.ball_model, **options)
+    court_line_detector = CourtLineDetector(args.court_model, **options)
+    load_seconds = time.perf_counter() - start_time
+
+    _, ball_list = make_tracks(args.frames)
+    latencies = []
+    outputs = []
+    for frame in iter_synthetic_frames(args.frames, args.width, args.height, ball_detections=ball_list):
+        start_time = time.perf_counter()
+        player_dict = player_tracker.detect_frame(frame)
+        ball_dict = ball_tracker.detect_frame(frame)
+        court_keypoints = court_line_detector.predict(frame)
+        latencies.append(time.perf_counter() - start_time)
+        outputs.append([sorted(player_dict.items()), sorted(ball_dict.items()), np.asarray(court_keypoints).tolist()])
+    print(json.dumps({'import': import_seconds, 'load': load_seconds, 'first': latencies[0], 'latency': float(np.median(latencies[1:])),
+                      'torch': 'torch' in sys.modules, 'outputs': outputs}))
+
+
+def measure(args, server):
+    command = [sys.executable, os.path.abspath(__file__), '--client', '--frames', str(args.frames), '--width', str(args.width), '--height', str(args.height),
+               '--backend', args.backend, '--player-model', args.player_model, '--ball-model', args.ball_model, '--court-model', args.court_model]
+    if args.quantize is not None:
+        command += ['--quantize', args.quantize]
+    if server is not None:
+        command += ['--server', server]
+    start_time = time.perf_counter()
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    process_seconds = time.perf_counter() - start_time
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = process_seconds
+    return result
+
+
+def start_server(args, address):
+    command = [sys.executable, os.path.join(ROOT, 'inference_server.py'), '--socket', address, '--backend', args.backend,
+               '--player-model', args.player_model, '--ball-model', args.ball_model, '--court-model', args.court_model]
+    if args.quantize is not None:
+        command += ['--quantize', args.quantize]
+    server_process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    sys.path.append(ROOT)
+    from inference import is_server_running
+    # loading the models takes a while
+    while not is_server_running(address):
+        if server_process.poll() is not None:
+            raise RuntimeError("The inference server did not start")
+        time.sleep(0.2)
+    return server_process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--court-model', default='models/keypoints_model.pth')
+    parser.add_argument('--backend', default='torch')
+    parser.add_argument('--quantize', default=None)
+    parser.add_argument('--server', default=None, help='socket of a running server, one is started otherwise')
+    parser.add_argument('--client', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server_process = None
+        address = args.server
+        if address is None:
+            address = os.path.join(tmp_dir, 'inference.sock')
+            server_process = start_server(args, address)
+        try:
+            results = {}
+            for name, server in [('in process', None), ('server', address)]:
+                runs = [measure(args, server) for _ in range(args.repeats)]
+                results[name] = runs
+        finally:
+            if server_process is not None:
+                server_process.terminate()
+                server_process.wait()
+
+    print(f"{args.frames} frames of {args.width}x{args.height}, median of {args.repeats} processes, backend {args.backend}")
+    print(f"{'setting':<11} {'process s':>10} {'import s':>9} {'load s':>7} {'first ms':>9} {'ms/frame':>9} {'torch':>6}")
+    for name, runs in results.items():
+        median = {key: np.median([run[key] for run in runs]) for key in ('process', 'import', 'load', 'first', 'latency')}
+        print(f"{name:<11} {median['process']:>10.2f} {median['import']:>9.2f} {median['load']:>7.2f} {median['first']*1e3:>9.1f} "
+              f"{median['latency']*1e3:>9.1f} {str(runs[0]['torch']):>6}")
+    same = results['in process'][0]['outputs'] == results['server'][0]['outputs']
+    print(f"same detections and keypoints: {same}")
+
+
+if __name__ == '__main__':
+    main()
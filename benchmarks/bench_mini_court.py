@@ -0,0 +1,100 @@
+# MiniCourt.convert_bounding_boxes_to_mini_court_coordinates on synthetic tracks
+#
+#   python benchmarks/bench_mini_court.py --frames 100000 --reference-frames 5000
+#
+# The previous per-frame loop is kept below as the reference; it rebuilds a 70 frame
+# height window per player per frame, so it only runs on the first --reference-frames.
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import constants
+from mini_court import MiniCourt
+from utils import (Detections,
+                   get_center_of_bbox,
+                   get_foot_position,
+                   get_closest_keypoint_index,
+                   get_height_of_bbox,
+                   measure_distance)
+from synthetic import COURT_KEYPOINTS, make_tracks
+
+def reference_convert(mini_court, player_boxes, ball_boxes, original_court_key_points):
+    player_heights = {
+        1: constants.PLAYER_1_HEIGHT_METERS,
+        2: constants.PLAYER_2_HEIGHT_METERS
+    }
+    output_player_boxes= []
+    output_ball_boxes= []
+    for frame_num, player_bbox in enumerate(player_boxes):
+        ball_box = ball_boxes[frame_num][1]
+        ball_position = get_center_of_bbox(ball_box)
+        closest_player_id_to_ball = min(player_bbox.keys(), key=lambda x: measure_distance(ball_position, get_center_of_bbox(player_bbox[x])))
+        output_player_bboxes_dict = {}
+        for player_id, bbox in player_bbox.items():
+            foot_position = get_foot_position(bbox)
+            closest_key_point_index = get_closest_keypoint_index(foot_position,original_court_key_points, [0,2,12,13])
+            closest_key_point = (original_court_key_points[closest_key_point_index*2],
+                                 original_court_key_points[closest_key_point_index*2+1])
+            frame_index_min = max(0, frame_num-20)
+            frame_index_max = min(len(player_boxes), frame_num+50)
+            bboxes_heights_in_pixels = [get_height_of_bbox(player_boxes[i][player_id]) for i in range (frame_index_min,frame_index_max)]
+            max_player_height_in_pixels = max(bboxes_heights_in_pixels)
+            mini_court_player_position = mini_court.get_mini_court_coordinates(foot_position, closest_key_point, closest_key_point_index,
+                                                                               max_player_height_in_pixels, player_heights[player_id])
+            output_player_bboxes_dict[player_id] = mini_court_player_position
+            if closest_player_id_to_ball == player_id:
+                closest_key_point_index = get_closest_keypoint_index(ball_position,original_court_key_points, [0,2,12,13])
+                closest_key_point = (original_court_key_points[closest_key_point_index*2],
+                                     original_court_key_points[closest_key_point_index*2+1])
+                mini_court_player_position = mini_court.get_mini_court_coordinates(ball_position, closest_key_point, closest_key_point_index,
+                                                                                   max_player_height_in_pixels, player_heights[player_id])
+                output_ball_boxes.append({1:mini_court_player_position})
+        output_player_boxes.append(output_player_bboxes_dict)
+    return output_player_boxes, output_ball_boxes
+
+
+def max_difference(reference_positions, positions):
+    positions = positions.to_list()
+    difference = 0.0
+    for reference_dict, position_dict in zip(reference_positions, positions):
+        assert reference_dict.keys() == position_dict.keys()
+        for track_id, position in reference_dict.items():
+            difference = max(difference, float(np.max(np.abs(np.subtract(position, position_dict[track_id])))))
+    return difference
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=100_000)
+    parser.add_argument('--reference-frames', type=int, default=5_000)
+    args = parser.parse_args()
+
+    mini_court = MiniCourt(np.zeros((1080, 1920, 3), np.uint8))
+    player_list, ball_list = make_tracks(args.frames)
+
+    reference_players, reference_ball = player_list[:args.reference_frames], ball_list[:args.reference_frames]
+    start = time.perf_counter()
+    expected_players, expected_ball = reference_convert(mini_court, reference_players, reference_ball, COURT_KEYPOINTS)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    players, ball = mini_court.convert_bounding_boxes_to_mini_court_coordinates(Detections.from_list(reference_players),
+                                                                                Detections.from_list(reference_ball),
+                                                                                COURT_KEYPOINTS)
+    vectorized_seconds = time.perf_counter() - start
+    difference = max(max_difference(expected_players, players), max_difference(expected_ball, ball))
+    assert difference < 1e-6, f"vectorized positions differ from the reference loop by {difference}"
+    print(f"{args.reference_frames} frames: loop {reference_seconds:.3f}s, vectorized {vectorized_seconds:.4f}s "
+          f"({reference_seconds/vectorized_seconds:.0f}x), max difference {difference:.2e}")
+
+    player_detections, ball_detections = Detections.from_list(player_list), Detections.from_list(ball_list)
+    start = time.perf_counter()
+    mini_court.convert_bounding_boxes_to_mini_court_coordinates(player_detections, ball_detections, COURT_KEYPOINTS)
+    vectorized_seconds = time.perf_counter() - start
+    estimated_reference_seconds = reference_seconds * args.frames / args.reference_frames
+    print(f"{args.frames} frames: vectorized {vectorized_seconds:.3f}s (loop estimated at {estimated_reference_seconds:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
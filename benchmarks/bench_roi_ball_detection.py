@@ -0,0 +1,101 @@
+# Ball detection on crops around the predicted position (BallTracker roi_size) against
+# the full frame
+#
+#   python benchmarks/bench_roi_ball_detection.py --video input_videos/input_video.mp4
+#   python benchmarks/bench_roi_ball_detection.py --roi-sizes 256 320 --max-misses 2 --imgsz 640
+#
+# Without --video a synthetic video with a small ball is written to a temporary directory.
+# The full frame detections are the reference: recall is the share of frames with a
+# reference ball that the ROI run found within --match-distance pixels, extra counts the
+# balls only the ROI run found. crops is the share of frames searched on a crop.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trackers import BallTracker
+from synthetic import make_tracks, write_synthetic_video
+from utils import read_video
+
+
+def detect(ball_tracker, frames):
+    ball_tracker.reset_tracking()
+    start = time.perf_counter()
+    ball_detections = [ball_tracker.detect_frame(frame) for frame in frames]
+    return time.perf_counter() - start, ball_detections
+
+
+def get_center(ball_dict):
+    bbox = ball_dict.get(1)
+    if bbox is None:
+        return None
+    return np.array([(bbox[0]+bbox[2])/2, (bbox[1]+bbox[3])/2])
+
+
+def compare(reference_detections, ball_detections, match_distance):
+    found = 0
+    extra = 0
+    distances = []
+    for reference_dict, ball_dict in zip(reference_detections, ball_detections):
+        reference_center, center = get_center(reference_dict), get_center(ball_dict)
+        if reference_center is None:
+            extra += center is not None
+            continue
+        if center is not None:
+            distance = np.linalg.norm(reference_center - center)
+            if distance <= match_distance:
+                found += 1
+                distances.append(distance)
+            else:
+                extra += 1
+    number_of_references = sum(1 for reference_dict in reference_detections if 1 in reference_dict)
+    recall = found / number_of_references if number_of_references else np.nan
+    return recall, float(np.mean(distances)) if distances else np.nan, extra
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--conf', type=float, default=0.15)
+    parser.add_argument('--roi-sizes', type=int, nargs='+', default=[160, 320, 480])
+    parser.add_argument('--max-misses', type=int, default=3)
+    parser.add_argument('--imgsz', type=int, default=None, help='model input size of the crops, the ROI size by default')
+    parser.add_argument('--match-distance', type=float, default=10.0, help='pixels between the centers of the same ball')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, 'synthetic.mp4')
+            _, ball_list = make_tracks(args.frames)
+            write_synthetic_video(video_path, args.frames, args.width, args.height, ball_detections=ball_list)
+        frames = read_video(video_path)
+
+    ball_tracker = BallTracker(model_path=args.ball_model, conf=args.conf)
+    # The first call also sets the model up, keep it out of the timings
+    ball_tracker.detect_frame(frames[0])
+    reference_seconds, reference_detections = detect(ball_tracker, frames)
+
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, ball in {sum(1 in ball_dict for ball_dict in reference_detections)}")
+    print(f"{'roi':>6} {'imgsz':>6} {'seconds':>9} {'fps':>8} {'speedup':>8} {'crops':>6} {'recall':>7} {'center':>7} {'extra':>6}")
+    print(f"{'full':>6} {'-':>6} {reference_seconds:>9.2f} {len(frames)/reference_seconds:>8.2f} {1:>7.2f}x {0:>6.2f} {1:>7.3f} {0:>7.2f} {0:>6}")
+    for roi_size in args.roi_sizes:
+        ball_tracker = BallTracker(model_path=args.ball_model, conf=args.conf, roi_size=roi_size, roi_max_misses=args.max_misses, roi_imgsz=args.imgsz)
+        ball_tracker.detect_frame(frames[0])
+        seconds, ball_detections = detect(ball_tracker, frames)
+        recall, center_error, extra = compare(reference_detections, ball_detections, args.match_distance)
+        crops = ball_tracker.roi.crop_searches / len(frames)
+        print(f"{roi_size:>6} {ball_tracker.roi_imgsz:>6} {seconds:>9.2f} {len(frames)/seconds:>8.2f} {reference_seconds/seconds:>7.2f}x "
+              f"{crops:>6.2f} {recall:>7.3f} {center_error:>7.2f} {extra:>6}")
+
+
+if __name__ == '__main__':
+    main()
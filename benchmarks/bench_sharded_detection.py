@@ -0,0 +1,58 @@
+# Wall time of player + ball detection with ShardedDetector for different shard counts
+#
+#   python benchmarks/bench_sharded_detection.py --video input_videos/input_video.mp4 --shards 1 2 4 8
+#
+# Without --video a synthetic video of the given length and resolution is written to a
+# temporary directory. Times include starting the processes and loading the models in
+# each of them, as in a real run. The number of player tracks after stitching is printed
+# as a sanity check: it should stay close to the single shard run.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trackers import PlayerTracker, BallTracker, ShardedDetector
+from synthetic import write_synthetic_video
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=480)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--overlap', type=int, default=48)
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, 'synthetic.mp4')
+            write_synthetic_video(video_path, args.frames, args.width, args.height)
+
+        player_tracker = PlayerTracker(model_path=args.player_model)
+        ball_tracker = BallTracker(model_path=args.ball_model)
+
+        print(f"{'shards':>6} {'seconds':>9} {'fps':>8} {'speedup':>8} {'player tracks':>14}")
+        base_seconds = None
+        for number_of_shards in args.shards:
+            sharded_detector = ShardedDetector(player_tracker, ball_tracker, number_of_shards,
+                                               overlap=args.overlap, batch_size=args.batch_size)
+            start = time.perf_counter()
+            player_detections, ball_detections = sharded_detector.detect(video_path)
+            seconds = time.perf_counter() - start
+            if base_seconds is None:
+                base_seconds = seconds
+            fps = len(ball_detections) / seconds
+            print(f"{number_of_shards:>6} {seconds:>9.2f} {fps:>8.2f} {base_seconds/seconds:>7.2f}x {len(player_detections.get_track_ids()):>14}")
+
+
+if __name__ == '__main__':
+    main()
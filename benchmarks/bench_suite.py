@@ -0,0 +1,238 @@
+# Benchmark suite of the analysis pipeline on synthetic inputs, CPU only, no model weights
+# and no network needed.
+#
+#   python benchmarks/bench_suite.py                      # compare with the stored baseline
+#   python benchmarks/bench_suite.py --update-baseline    # store this run as the baseline
+#   python benchmarks/bench_suite.py --source stub --frames 50000 --width 1920 --height 1080
+#
+# Detections come from a StubDetector replaying tracker_stubs/*.pkl (--source stub) or
+# generated tracks (--source generated). Every stage is timed (best of --repeat runs) and
+# a small summary of its result is kept. Both are compared with the baseline stored for
+# the same settings in suite_baseline.json: a stage fails when its result differs beyond
+# the tolerance or when it got more than --time-tolerance slower. The live shot detection
+# is also checked to match the offline one exactly, on this ball track and on the stub's.
+# Exit code 1 on failure.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import COURT_KEYPOINTS, StubDetector, make_tracks
+from trackers import PlayerTracker, BallTracker, OnlineShotDetector
+from trackers.online_ball_tracker import RollingMean
+from mini_court import MiniCourt
+from utils import VideoWriter, read_video_stream, draw_player_stats
+from player_stats import get_player_stats
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite_baseline.json')
+
+# Absolute tolerance of the result summaries; pixel statistics depend on the OpenCV build
+RESULT_TOLERANCES = {
+    'video.read': 1.0,
+    'draw_player_stats': 1.0,
+    'draw_mini_court': 1.0,
+}
+DEFAULT_RESULT_TOLERANCE = 1e-6
+
+
+def time_stage(function, repeat):
+    # Best wall time of `repeat` runs and the result of the last one
+    best_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    return best_seconds, result
+
+
+def make_frames(number_of_frames, width, height):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return [background.copy() for _ in range(number_of_frames)]
+
+
+def get_detectors(source, number_of_frames):
+    if source == 'stub':
+        return StubDetector.from_stub('player_detections.pkl'), StubDetector.from_stub('ball_detections.pkl')
+    player_list, ball_list = make_tracks(number_of_frames)
+    return StubDetector(player_list), StubDetector(ball_list)
+
+
+def check_online_shot_frames(ball_tracker, ball_detections):
+    # {check: passed} of the live mode against the offline analysis of the same raw ball
+    # track (NaN where the ball was missed): RollingMean against pandas' rolling mean of
+    # get_ball_shot_frames and the OnlineShotDetector shot frames against
+    # get_ball_shot_frames, both exactly
+    bboxes = ball_detections.get_track_bboxes(1)
+    mid_y = (bboxes[:, 1] + bboxes[:, 3])/2
+    rolling_mean = RollingMean(5)
+    online_means = np.array([rolling_mean.add(value) for value in mid_y])
+    pandas_means = pd.Series(mid_y).rolling(window=5, min_periods=1, center=False).mean().to_numpy()
+
+    ball_detections = ball_tracker.interpolate_ball_positions(ball_detections)
+    shot_detector = OnlineShotDetector()
+    online_shot_frames = [shot_detector.add(bbox) for bbox in ball_detections.get_track_bboxes(1)]
+    return {'rolling_mean': np.array_equal(online_means, pandas_means, equal_nan=True),
+            'online_shot_frames': [frame_num for frame_num in online_shot_frames if frame_num is not None] == ball_tracker.get_ball_shot_frames(ball_detections)}
+
+
+def run_suite(args, tmp_dir):
+    # {stage: (seconds, summary as a list of floats)}
+    stages = {}
+
+    def run_stage(name, function, summarize):
+        seconds, result = time_stage(function, args.repeat)
+        stages[name] = (seconds, [float(value) for value in summarize(result)])
+        return result
+
+    # Video I/O on a short synthetic clip
+    video_path = os.path.join(tmp_dir, 'synthetic.avi')
+    video_frames = make_frames(args.video_frames, args.width, args.height)
+
+    def write_video():
+        with VideoWriter(video_path) as video_writer:
+            for frame in video_frames:
+                video_writer.write(frame)
+        return len(video_frames)
+    run_stage('video.write', write_video, lambda number_of_frames: [number_of_frames])
+
+    def read_video():
+        number_of_frames = 0
+        pixel_sum = 0.0
+        for frame in read_video_stream(video_path):
+            number_of_frames += 1
+            pixel_sum += float(frame.mean())
+        return number_of_frames, pixel_sum / max(number_of_frames, 1)
+    run_stage('video.read', read_video, lambda result: result)
+
+    # Analysis on detection tracks of --frames frames; the trackers are never given a model
+    player_tracker = PlayerTracker.__new__(PlayerTracker)
+    ball_tracker = BallTracker.__new__(BallTracker)
+    mini_court = MiniCourt(np.zeros((1080, 1920, 3), np.uint8))
+
+    def detect():
+        player_detector, ball_detector = get_detectors(args.source, args.frames)
+        return player_detector.get_detections(args.frames), ball_detector.get_detections(args.frames)
+    player_detections, ball_detections = run_stage('stub_detection', detect,
+                                                    lambda result: [len(result[0].frame_idx), len(result[1].frame_idx)])
+
+    stub_ball_detector = StubDetector.from_stub('ball_detections.pkl')
+    checks = {}
+    for track_name, track in [(args.source, ball_detections), ('stub', stub_ball_detector.get_detections(len(stub_ball_detector.detections_list)))]:
+        for name, passed in check_online_shot_frames(ball_tracker, track).items():
+            checks[f"{name} ({track_name} ball track)"] = passed
+
+    player_detections = run_stage('choose_and_filter_players',
+                                  lambda: player_tracker.choose_and_filter_players(COURT_KEYPOINTS, player_detections),
+                                  lambda result: list(result.get_track_ids()) + [len(result.frame_idx)])
+
+    ball_detections = run_stage('interpolate_ball_positions',
+                                lambda: ball_tracker.interpolate_ball_positions(ball_detections),
+                                lambda result: [np.nansum(result.bboxes), len(result.frame_idx)])
+
+    ball_shot_frames = run_stage('get_ball_shot_frames',
+                                 lambda: ball_tracker.get_ball_shot_frames(ball_detections),
+                                 lambda result: [len(result)] + result[:50])
+
+    player_mini_court_detections, ball_mini_court_detections = run_stage(
+        'mini_court.convert',
+        lambda: mini_court.convert_bounding_boxes_to_mini_court_coordinates(player_detections, ball_detections, COURT_KEYPOINTS),
+        lambda result: list(np.mean(result[0].bboxes, axis=0)) + list(np.mean(result[1].bboxes, axis=0)) + [len(result[0].frame_idx), len(result[1].frame_idx)])
+
+    player_stats = run_stage('player_stats',
+                             lambda: get_player_stats(ball_shot_frames, ball_mini_court_detections, player_mini_court_detections, mini_court, args.frames),
+                             lambda result: np.nan_to_num(result.to_dataframe().iloc[-1].to_numpy(dtype=float), nan=-1.0))
+    player_stats_data_df = player_stats.to_dataframe()
+
+    # Drawing on --draw-frames frames
+    draw_frames = make_frames(args.draw_frames, args.width, args.height)
+    run_stage('draw_player_stats',
+              lambda: draw_player_stats([frame.copy() for frame in draw_frames], player_stats_data_df.iloc[:args.draw_frames]),
+              lambda result: [np.mean([frame.mean() for frame in result])])
+    run_stage('draw_mini_court',
+              lambda: mini_court.draw_mini_court([frame.copy() for frame in draw_frames]),
+              lambda result: [np.mean([frame.mean() for frame in result])])
+
+    return stages, checks
+
+
+def get_config(args):
+    return {'source': args.source, 'frames': args.frames, 'video_frames': args.video_frames,
+            'draw_frames': args.draw_frames, 'width': args.width, 'height': args.height}
+
+
+def get_config_key(config):
+    return ','.join(f"{name}={value}" for name, value in config.items())
+
+
+def load_baselines():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', choices=['generated', 'stub'], default='generated')
+    parser.add_argument('--frames', type=int, default=20_000, help='length of the detection tracks')
+    parser.add_argument('--video-frames', type=int, default=48, help='length of the synthetic video for the I/O stages')
+    parser.add_argument('--draw-frames', type=int, default=48, help='frames drawn by the drawing stages')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='allowed slowdown against the baseline, 0.5 = 50%%')
+    parser.add_argument('--min-time-difference', type=float, default=0.005, help='slowdowns below this many seconds are ignored')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    config = get_config(args)
+    config_key = get_config_key(config)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stages, checks = run_suite(args, tmp_dir)
+
+    baselines = load_baselines()
+    if args.update_baseline:
+        baselines[config_key] = {'config': config,
+                                 'stages': {name: {'seconds': seconds, 'result': result} for name, (seconds, result) in stages.items()}}
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=1)
+        print(f"baseline stored for {config_key}")
+
+    baseline = baselines.get(config_key)
+    if baseline is None:
+        print(f"no baseline for {config_key}, run with --update-baseline to store one")
+
+    failed = False
+    print(f"{'stage':<28}{'seconds':>10}{'baseline':>10}{'ratio':>8}  {'result':<8}")
+    for name, (seconds, result) in stages.items():
+        baseline_stage = baseline['stages'].get(name) if baseline is not None else None
+        if baseline_stage is None:
+            print(f"{name:<28}{seconds:>10.4f}{'-':>10}{'-':>8}  {'-':<8}")
+            continue
+
+        tolerance = RESULT_TOLERANCES.get(name, DEFAULT_RESULT_TOLERANCE)
+        baseline_result = baseline_stage['result']
+        result_ok = len(result) == len(baseline_result) and np.allclose(result, baseline_result, rtol=0, atol=tolerance)
+        baseline_seconds = baseline_stage['seconds']
+        slower = seconds > baseline_seconds * (1 + args.time_tolerance) and seconds - baseline_seconds > args.min_time_difference
+        status = ('ok' if result_ok else 'MISMATCH') + (' SLOWER' if slower else '')
+        failed = failed or not result_ok or slower
+        print(f"{name:<28}{seconds:>10.4f}{baseline_seconds:>10.4f}{seconds/baseline_seconds:>7.2f}x  {status:<8}")
+
+    for name, passed in checks.items():
+        failed = failed or not passed
+        print(f"live = offline, {name}: {'ok' if passed else 'MISMATCH'}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
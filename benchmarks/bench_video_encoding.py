@@ -0,0 +1,79 @@
+# Encode throughput and output size of the cv2 MJPG writer against ffmpeg H.264/HEVC
+#
+#   python benchmarks/bench_video_encoding.py --video input_videos/input_video.mp4 --frames 240
+#
+# Without --video, synthetic court-like frames are used. Frames are decoded up front so only
+# encoding is timed. "write fps" counts the time the caller spends in write(), which is
+# what the pipeline waits for; "total fps" also includes finishing the file in release().
+# The ffmpeg rows are skipped when ffmpeg is not installed.
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import argparse
+import itertools
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from synthetic import iter_synthetic_frames
+from utils import VideoWriter, read_video_stream, is_ffmpeg_available
+
+# (name, output file extension, VideoWriter options)
+CONFIGS = [
+    ('cv2 MJPG', '.avi', {'encoder': 'cv2'}),
+    ('cv2 MJPG background', '.avi', {'encoder': 'cv2', 'background': True}),
+    ('ffmpeg h264 ultrafast', '.mp4', {'encoder': 'ffmpeg', 'codec': 'h264', 'preset': 'ultrafast'}),
+    ('ffmpeg h264 veryfast', '.mp4', {'encoder': 'ffmpeg', 'codec': 'h264', 'preset': 'veryfast'}),
+    ('ffmpeg h264 veryfast background', '.mp4', {'encoder': 'ffmpeg', 'codec': 'h264', 'preset': 'veryfast', 'background': True}),
+    ('ffmpeg h264 medium', '.mp4', {'encoder': 'ffmpeg', 'codec': 'h264', 'preset': 'medium'}),
+    ('ffmpeg hevc veryfast', '.mp4', {'encoder': 'ffmpeg', 'codec': 'hevc', 'preset': 'veryfast'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--crf', type=int, default=23)
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.video is not None:
+        frames = list(itertools.islice(read_video_stream(args.video), args.frames))
+    else:
+        frames = list(iter_synthetic_frames(args.frames, args.width, args.height))
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height}")
+
+    ffmpeg_available = is_ffmpeg_available()
+    if not ffmpeg_available:
+        print("ffmpeg not found, only the cv2 rows are run")
+
+    print(f"{'encoder':<34}{'write fps':>10}{'total fps':>10}{'MB':>9}{'size':>8}")
+    mjpg_size = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, extension, options in CONFIGS:
+            if options['encoder'] == 'ffmpeg':
+                if not ffmpeg_available:
+                    continue
+                options = dict(options, crf=args.crf, threads=args.threads)
+            output_video_path = os.path.join(tmp_dir, name.replace(' ', '_') + extension)
+
+            start = time.perf_counter()
+            video_writer = VideoWriter(output_video_path, fps=24, **options)
+            for frame in frames:
+                video_writer.write(frame)
+            write_seconds = time.perf_counter() - start
+            video_writer.release()
+            total_seconds = time.perf_counter() - start
+
+            size = os.path.getsize(output_video_path)
+            if mjpg_size is None:
+                mjpg_size = size
+            print(f"{name:<34}{len(frames)/write_seconds:>10.1f}{len(frames)/total_seconds:>10.1f}{size/(1<<20):>9.2f}{size/mjpg_size:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Synthetic inputs shared by the benchmarks: court keypoints, player/ball tracks, videos,
+# and a stub detector that stands in for the YOLO trackers without any model weights.
+import os
+import sys
+import cv2
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils import Detections, read_stub
+
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_stubs')
+
+# Plausible keypoints of a 1920x1080 broadcast view (14 x, y pairs)
+COURT_KEYPOINTS = np.array([560,300, 1360,300, 330,900, 1600,900, 650,300, 450,900, 1270,300,
+                            1480,900, 620,420, 1300,420, 480,760, 1450,760, 960,420, 960,760], dtype=float)
+
+
+def make_tracks(number_of_frames, seed=0):
+    # Player 1 near the bottom baseline, player 2 near the top one, both wandering
+    # left and right; the ball goes back and forth between them
+    rng = np.random.default_rng(seed)
+    t = np.arange(number_of_frames)
+    player_detections = []
+    ball_detections = []
+    for frame_num in range(number_of_frames):
+        x1 = 900 + 300*np.sin(t[frame_num]/50) + rng.normal(0, 3)
+        x2 = 950 + 200*np.sin(t[frame_num]/70) + rng.normal(0, 3)
+        height1 = 180 + rng.normal(0, 5)
+        height2 = 110 + rng.normal(0, 5)
+        player_detections.append({1: [x1, 900-height1, x1+80, 900.0],
+                                  2: [x2, 290-height2, x2+50, 290.0]})
+        ball_y = 300 + 600*abs(np.sin(t[frame_num]/40))
+        ball_detections.append({1: [x2, ball_y, x2+10, ball_y+10]})
+    return player_detections, ball_detections
+
+
+def iter_synthetic_frames(number_of_frames, width, height, ball_detections=None):
+    # Court-like frames: flat colours, lines, a little sensor noise and two moving
+    # blobs, so that consecutive frames differ and compress roughly like real footage.
+    # ball_detections ({1: bbox} per frame in 1920x1080 coordinates, e.g. from
+    # make_tracks) adds a small yellow ball.
+    rng = np.random.default_rng(0)
+    background = np.full((height, width, 3), (60, 120, 50), dtype=np.uint8)
+    cv2.rectangle(background, (width//6, height//6), (width*5//6, height*5//6), (150, 90, 60), -1)
+    cv2.rectangle(background, (width//6, height//6), (width*5//6, height*5//6), (255, 255, 255), 3)
+    cv2.line(background, (width//6, height//2), (width*5//6, height//2), (255, 255, 255), 3)
+    background = cv2.add(background, rng.integers(0, 8, background.shape, dtype=np.uint8))
+    for frame_num in range(number_of_frames):
+        frame = background.copy()
+        x = (frame_num * 7) % (width - 80)
+        cv2.rectangle(frame, (x, height//4), (x+60, height//4+160), (30, 30, 200), -1)
+        cv2.rectangle(frame, (width-x-60, height//2), (width-x, height//2+160), (200, 30, 30), -1)
+        ball_bbox = ball_detections[frame_num % len(ball_detections)].get(1) if ball_detections else None
+        if ball_bbox is not None:
+            center = (int((ball_bbox[0]+ball_bbox[2])/2 * width/1920), int((ball_bbox[1]+ball_bbox[3])/2 * height/1080))
+            cv2.circle(frame, center, max(width//240, 2), (40, 230, 230), -1)
+        yield frame
+
+
+def write_synthetic_video(video_path, number_of_frames, width, height, fourcc='mp4v', ball_detections=None):
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*fourcc), 24, (width, height))
+    for frame in iter_synthetic_frames(number_of_frames, width, height, ball_detections):
+        writer.write(frame)
+    writer.release()
+
+
+class StubDetector:
+    # Stands in for PlayerTracker/BallTracker.detect_frames: replays per-frame detections
+    # (a tracker_stubs/*.pkl file or generated boxes) in a loop, continuing from where the
+    # previous call stopped, so it works for any number of frames.
+    def __init__(self, detections_list):
+        self.detections_list = detections_list
+        self.position = 0
+
+    @classmethod
+    def from_stub(cls, stub_name):
+        return cls(read_stub(os.path.join(STUBS_DIR, stub_name)))
+
+    def get_detections(self, number_of_frames):
+        detections = []
+        for _ in range(number_of_frames):
+            detections.append(self.detections_list[self.position % len(self.detections_list)])
+            self.position += 1
+        return Detections.from_list(detections)
+
+    def detect_frames(self, frames, batch_size=1):
+        return self.get_detections(len(frames))
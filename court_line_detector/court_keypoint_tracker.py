@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import profile_stage
+
+
+class CourtKeypointTracker:
+    # Per-frame court keypoints without running the keypoint model on every frame.
+    # The detector runs on the first frame, again when the frame differs enough from
+    # the one the keypoints were detected on (camera cut, pan or zoom), and every
+    # redetect_interval frames if set. Other frames reuse the cached keypoints.
+    def __init__(self, court_line_detector, redetect_interval=None, scene_change_threshold=20.0, thumbnail_size=(64, 36)):
+        self.court_line_detector = court_line_detector
+        self.redetect_interval = redetect_interval
+        # Mean absolute difference of grayscale thumbnails (0-255) that counts as a new scene
+        self.scene_change_threshold = scene_change_threshold
+        self.thumbnail_size = thumbnail_size
+
+        self.keypoints = None
+        self.reference_thumbnail = None
+        self.frames_since_detection = 0
+
+        self.detector_runs = 0
+        self.skipped_runs = 0
+        self.scene_changes = 0
+
+    def get_thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def is_scene_change(self, thumbnail):
+        return float(np.mean(np.abs(thumbnail - self.reference_thumbnail))) > self.scene_change_threshold
+
+    def update(self, frame):
+        thumbnail = self.get_thumbnail(frame)
+
+        redetect = self.keypoints is None
+        if not redetect and self.redetect_interval is not None and self.frames_since_detection >= self.redetect_interval:
+            redetect = True
+        if not redetect and self.is_scene_change(thumbnail):
+            self.scene_changes += 1
+            redetect = True
+
+        if redetect:
+            self.keypoints = self.court_line_detector.predict(frame)
+            self.reference_thumbnail = thumbnail
+            self.frames_since_detection = 0
+            self.detector_runs += 1
+        else:
+            self.skipped_runs += 1
+        self.frames_since_detection += 1
+
+        return self.keypoints
+
+    def track_frames(self, frames):
+        # (number_of_frames, 28) keypoints, one row per frame
+        with profile_stage('court_keypoint_tracker.track', frames=len(frames)):
+            return np.array([self.update(frame) for frame in frames], dtype=np.float64).reshape(-1, 28)
+
+    def get_counters(self):
+        return {
+            'detector_runs': self.detector_runs,
+            'skipped_runs': self.skipped_runs,
+            'scene_changes': self.scene_changes,
+        }
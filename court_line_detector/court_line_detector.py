@@ -1,35 +1,89 @@
-import torch
-import torchvision.transforms as transforms
 import cv2
-from torchvision import models
 import numpy as np
+import sys
+sys.path.append('../')
+from utils import profile_stage, get_writable_frame
+from inference import BackendMixin, check_backend, load_onnx_model, RemoteCourtModel
 
-class CourtLineDetector:
-    def __init__(self, model_path):
-        self.model = models.resnet50(pretrained=True)
-        self.model.fc = torch.nn.Linear(self.model.fc.in_features, 14*2) 
-        self.model.load_state_dict(torch.load(model_path, map_location='cpu'))
-        self.transform = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+class CourtLineDetector(BackendMixin):
+    def __init__(self, model_path, backend='torch', quantization=None, threads=None, server=None):
+        check_backend(backend, quantization, yolo=False)
+        self.model_path = model_path
+        self.init_backend(backend, quantization, server)
+        if server is not None:
+            self.model = RemoteCourtModel(server, model_path, backend, quantization)
+        elif backend == 'torch':
+            self.model = self.load_torch_model(model_path)
+        else:
+            self.model = load_onnx_model(model_path, backend, quantization, threads)
 
-    def predict(self, image):
+        self.input_size = 224
+        # ImageNet normalization on 0-255 pixel values
+        self.mean = np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255
+        self.std = np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255
+        # Reused between calls, grown when a bigger batch comes in
+        self.input_buffer = np.empty((0, self.input_size, self.input_size, 3), dtype=np.float32)
+
+    def load_torch_model(self, model_path):
+        import torch
+        from torchvision import models
+        # No ImageNet download: every weight is overwritten by the checkpoint below
+        try:
+            model = models.resnet50(weights=None)
+        except TypeError:
+            # torchvision < 0.13
+            model = models.resnet50(pretrained=False)
+        model.fc = torch.nn.Linear(model.fc.in_features, 14*2)
+        model.load_state_dict(torch.load(model_path, map_location='cpu'))
+        return model.to(memory_format=torch.channels_last).eval()
+
+    def preprocess_batch(self, images):
+        # (N, input_size, input_size, 3) normalized RGB, a view of a buffer reused by the next call
+        if len(self.input_buffer) < len(images):
+            self.input_buffer = np.empty((len(images), self.input_size, self.input_size, 3), dtype=np.float32)
+        batch = self.input_buffer[:len(images)]
+
+        for i, image in enumerate(images):
+            resized = cv2.resize(image, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+            # BGR -> RGB and mean subtraction written straight into the batch buffer
+            np.subtract(resized[:, :, ::-1], self.mean, out=batch[i])
+        batch /= self.std
+        return batch
+
+    def get_model_input(self, batch):
+        if self.server is not None:
+            # NHWC as it is, the server lays it out for its backend
+            return batch
+        if self.backend == 'torch':
+            import torch
+            # NHWC memory viewed as NCHW is the channels_last layout, so there is no copy
+            return torch.from_numpy(batch).permute(0, 3, 1, 2)
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
 
-    
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image_tensor = self.transform(image_rgb).unsqueeze(0)
-        with torch.no_grad():
-            outputs = self.model(image_tensor)
-        keypoints = outputs.squeeze().cpu().numpy()
-        original_h, original_w = image.shape[:2]
-        keypoints[::2] *= original_w / 224.0
-        keypoints[1::2] *= original_h / 224.0
+    def run_model(self, model_input):
+        if self.backend == 'torch' and self.server is None:
+            import torch
+            with torch.inference_mode():
+                return self.model(model_input).cpu().numpy()
+        return self.model(model_input)
+
+    def predict_batch(self, images):
+        # (N, 28) keypoints in the pixel coordinates of each image
+        with profile_stage('court_line_detector.preprocess', frames=len(images)):
+            model_input = self.get_model_input(self.preprocess_batch(images))
+        with profile_stage('court_line_detector.predict', frames=len(images)):
+            keypoints = self.run_model(model_input)
+
+        for i, image in enumerate(images):
+            original_h, original_w = image.shape[:2]
+            keypoints[i, ::2] *= original_w / float(self.input_size)
+            keypoints[i, 1::2] *= original_h / float(self.input_size)
 
         return keypoints
 
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
     def draw_keypoints(self, image, keypoints):
         # Plot keypoints on the image
         for i in range(0, len(keypoints), 2):
@@ -38,10 +92,13 @@ class CourtLineDetector:
             cv2.putText(image, str(i//2), (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
             cv2.circle(image, (x, y), 5, (0, 0, 255), -1)
         return image
-    
+
     def draw_keypoints_on_video(self, video_frames, keypoints):
+        # keypoints: one set for the whole video or one row per frame
+        keypoints = np.asarray(keypoints)
         output_video_frames = []
-        for frame in video_frames:
-            frame = self.draw_keypoints(frame, keypoints)
+        for frame_num, frame in enumerate(video_frames):
+            frame_keypoints = keypoints[frame_num] if keypoints.ndim == 2 else keypoints
+            frame = self.draw_keypoints(get_writable_frame(frame), frame_keypoints)
             output_video_frames.append(frame)
-        return output_video_frames
\ No newline at end of file
+        return output_video_frames
@@ -0,0 +1,51 @@
+# Export the player, ball and court models for the CPU inference backends.
+#
+#   python export_models.py --backend onnx
+#   python export_models.py --backend onnx --quantize dynamic
+#   python export_models.py --backend onnx --quantize static --calibration-video input_videos/input_video.mp4
+#   python export_models.py --backend openvino --models player ball
+#
+# Exports go to models/exported/, where PlayerTracker, BallTracker and CourtLineDetector
+# look for them when built with backend=... (main.py --backend, --quantize). YOLO models
+# are exported by ultralytics with dynamic input shapes; the court ResNet is exported to
+# ONNX, which OpenVINO reads as well. INT8 models are quantized with ONNX Runtime, static
+# quantization calibrates the activations on frames spread over --calibration-video.
+import argparse
+import time
+from inference import BACKENDS, QUANTIZATIONS, EXPORT_DIR, export_yolo_model, export_court_model, get_calibration_frames
+
+MODELS = ('player', 'ball', 'court')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=[backend for backend in BACKENDS if backend != 'torch'], default='onnx')
+    parser.add_argument('--quantize', choices=QUANTIZATIONS, default=None, help='also write an INT8 model')
+    parser.add_argument('--models', choices=MODELS, nargs='+', default=list(MODELS))
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--court-model', default='models/keypoints_model.pth')
+    parser.add_argument('--imgsz', type=int, default=640, help='YOLO input size')
+    parser.add_argument('--calibration-video', default=None, help='frames for static quantization')
+    parser.add_argument('--calibration-frames', type=int, default=32)
+    parser.add_argument('--export-dir', default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    if args.quantize == 'static' and args.calibration_video is None:
+        parser.error('--quantize static needs --calibration-video')
+    calibration_frames = None
+    if args.calibration_video is not None:
+        calibration_frames = get_calibration_frames(args.calibration_video, args.calibration_frames)
+
+    model_paths = {'player': args.player_model, 'ball': args.ball_model, 'court': args.court_model}
+    for model_name in args.models:
+        start_time = time.perf_counter()
+        if model_name == 'court':
+            exported_model_path = export_court_model(model_paths[model_name], args.backend, args.quantize, calibration_frames, args.export_dir)
+        else:
+            exported_model_path = export_yolo_model(model_paths[model_name], args.backend, args.quantize, calibration_frames, args.imgsz, args.export_dir)
+        print(f"{model_name}: {exported_model_path} in {time.perf_counter()-start_time:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+from .backends import BACKENDS, QUANTIZATIONS, EXPORT_DIR, BackendMixin, check_backend, get_exported_model_path, load_yolo_model, load_onnx_model, has_batched_tracking, reset_yolo_tracking, OnnxRuntimeModel, OpenVinoModel
+from .export import export_yolo_model, export_court_model, quantize_onnx_model, get_calibration_frames, letterbox
+from .client import DEFAULT_SOCKET, InferenceClient, RemoteYoloModel, RemoteCourtModel, get_model_key, is_server_running
+from .server import InferenceServer, ModelPool
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import re
+from .client import RemoteYoloModel
+
+# torch runs the original weights; onnx and openvino run models exported with export_models.py
+BACKENDS = ('torch', 'onnx', 'openvino')
+# INT8 quantization of the exported ONNX models: dynamic quantizes the weights ahead of
+# time and the activations on the fly, static the activations too, from calibration frames
+QUANTIZATIONS = ('dynamic', 'static')
+EXPORT_DIR = os.path.join('models', 'exported')
+
+
+def check_backend(backend, quantization=None, yolo=True):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if quantization is not None and quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization}, expected one of {QUANTIZATIONS}")
+    if quantization is not None and backend == 'torch':
+        raise ValueError("INT8 quantization needs an exported model, use the onnx backend")
+    if quantization is not None and backend == 'openvino' and yolo:
+        # ultralytics exports OpenVINO YOLO models in FP32 only here
+        raise ValueError("INT8 YOLO models run on the onnx backend")
+
+
+class BackendMixin:
+    # Where the model of PlayerTracker, BallTracker and CourtLineDetector runs: torch runs
+    # the original weights, onnx/openvino the model exported by export_models.py (INT8
+    # with quantization). With the socket of an inference server (inference_server.py)
+    # the model runs in that server and nothing is loaded here.
+    def init_backend(self, backend='torch', quantization=None, server=None):
+        self.backend = backend
+        self.quantization = quantization
+        self.server = server
+
+    def get_backend_options(self):
+        return {'backend': self.backend, 'quantization': self.quantization, 'server': self.server}
+
+    def get_backend_params(self):
+        # Nothing for torch, so the cache keys of the PyTorch models stay as they were;
+        # an exported model does not give exactly the same boxes. The server runs the
+        # same models, it does not change the key.
+        return {'backend': self.backend, 'quantization': self.quantization} if self.backend != 'torch' else {}
+
+
+def get_model_name(model_path):
+    return os.path.splitext(os.path.basename(os.path.normpath(model_path)))[0]
+
+
+def get_exported_model_path(model_path, backend, quantization=None, yolo=True, export_dir=EXPORT_DIR):
+    # models/exported/<name>[_int8_<quantization>].onnx, or the <name>_openvino_model
+    # directory ultralytics loads for OpenVINO. OpenVINO reads the ONNX of the other models.
+    name = get_model_name(model_path)
+    if quantization is not None:
+        name += f'_int8_{quantization}'
+    if backend == 'openvino' and yolo:
+        return os.path.join(export_dir, f'{name}_openvino_model')
+    return os.path.join(export_dir, f'{name}.onnx')
+
+
+def get_export_command(backend, quantization=None):
+    command = f"python export_models.py --backend {backend}"
+    if quantization is not None:
+        command += f" --quantize {quantization}"
+    return command
+
+
+def require_exported_model(model_path, backend, quantization=None, yolo=True, export_dir=EXPORT_DIR):
+    exported_model_path = get_exported_model_path(model_path, backend, quantization, yolo, export_dir)
+    if not os.path.exists(exported_model_path):
+        raise FileNotFoundError(f"{exported_model_path} not found, export it with: {get_export_command(backend, quantization)}")
+    return exported_model_path
+
+
+def load_yolo_model(model_path, backend='torch', quantization=None, export_dir=EXPORT_DIR, server=None):
+    # ultralytics runs exported models itself (ONNX Runtime, OpenVINO), with the same
+    # predict/track API, pre and post processing as the PyTorch weights
+    check_backend(backend, quantization, yolo=True)
+    if server is not None:
+        # the model of the inference server listening on this socket
+        return RemoteYoloModel(server, model_path, backend, quantization)
+    from ultralytics import YOLO
+    if backend == 'torch':
+        return YOLO(model_path)
+    # exports do not always record the task
+    return YOLO(require_exported_model(model_path, backend, quantization, True, export_dir), task='detect')
+
+
+def has_batched_tracking(model):
+    # ultralytics>=8.1 tracks a list of images with a single tracker, older versions give
+    # every image of the list its own tracker, which breaks the track ids of a batch
+    if isinstance(model, RemoteYoloModel):
+        return model.batched_tracking
+    import ultralytics
+    version = tuple(int(part) for part in re.findall(r'\d+', getattr(ultralytics, '__version__', '0'))[:2])
+    return version >= (8, 1)
+
+
+def reset_yolo_tracking(model):
+    # Forget the tracks of earlier frames, ultralytics keeps them on the predictor
+    if isinstance(model, RemoteYoloModel):
+        model.reset_tracking()
+        return
+    predictor = getattr(model, 'predictor', None)
+    for tracker in getattr(predictor, 'trackers', None) or []:
+        if hasattr(tracker, 'reset'):
+            tracker.reset()
+
+
+class OnnxRuntimeModel:
+    # Exported model on ONNX Runtime's CPU provider, called with an NCHW float32 batch
+    def __init__(self, model_path, threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("onnxruntime is not installed: pip install onnxruntime")
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, session_options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoModel:
+    # Exported ONNX model compiled by OpenVINO for the CPU, same call as OnnxRuntimeModel
+    def __init__(self, model_path, threads=None):
+        try:
+            import openvino
+        except ImportError:
+            raise ImportError("openvino is not installed: pip install openvino")
+        config = {'INFERENCE_NUM_THREADS': threads} if threads else {}
+        self.model = openvino.Core().compile_model(model_path, 'CPU', config)
+
+    def __call__(self, batch):
+        # the output memory is reused by the next call
+        return self.model(batch)[0].copy()
+
+
+def load_onnx_model(model_path, backend='onnx', quantization=None, threads=None, export_dir=EXPORT_DIR):
+    # Exported version of a plain (non YOLO) model
+    check_backend(backend, quantization, yolo=False)
+    exported_model_path = require_exported_model(model_path, backend, quantization, False, export_dir)
+    if backend == 'openvino':
+        return OpenVinoModel(exported_model_path, threads)
+    return OnnxRuntimeModel(exported_model_path, threads)
@@ -0,0 +1,174 @@
+import os
+import tempfile
+import weakref
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+# Unix socket of the inference server (python inference_server.py)
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'tennis_inference.sock')
+# Arrays start on cache line boundaries in the shared memory
+ALIGNMENT = 64
+
+
+def get_model_key(kind, model_path, backend='torch', quantization=None):
+    # Weight files by absolute path, the server may run from another directory; names
+    # like yolov8x that ultralytics downloads stay as they are
+    if os.path.exists(model_path):
+        model_path = os.path.abspath(model_path)
+    return (kind, model_path, backend, quantization)
+
+
+def get_authkey_path(address):
+    return f"{address}.key"
+
+
+def read_authkey(address):
+    # Key the server keeps next to its socket, None when there is none
+    try:
+        with open(get_authkey_path(address), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def is_server_running(address=DEFAULT_SOCKET):
+    # Only whether something accepts connections on the socket, no key needed
+    try:
+        Client(address, family='AF_UNIX').close()
+    except OSError:
+        return False
+    return True
+
+
+def close_shared_memory(shared_memory, unlink=False):
+    try:
+        shared_memory.close()
+    except BufferError:
+        # a view is still alive somewhere, the mapping goes away with it
+        pass
+    if unlink:
+        try:
+            shared_memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedFrames:
+    # Shared memory block owned by one client that the images of a request are copied
+    # into, so the server reads them in place instead of receiving them pickled over the
+    # socket. Grown (replaced by a bigger block) when a request does not fit.
+    def __init__(self):
+        self.shared_memory = None
+
+    def write(self, arrays):
+        # ({'name':, 'layout': [(offset, shape, dtype), ...]}) describing the arrays for the server
+        layout = []
+        size = 0
+        for array in arrays:
+            layout.append((size, array.shape, array.dtype.str))
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        if self.shared_memory is None or self.shared_memory.size < size:
+            old_size = self.shared_memory.size if self.shared_memory is not None else 0
+            self.close()
+            self.shared_memory = SharedMemory(create=True, size=max(size, 2*old_size, ALIGNMENT))
+        for array, (offset, shape, dtype) in zip(arrays, layout):
+            np.ndarray(shape, dtype, buffer=self.shared_memory.buf, offset=offset)[...] = array
+        return {'name': self.shared_memory.name, 'layout': layout}
+
+    def close(self):
+        if self.shared_memory is not None:
+            close_shared_memory(self.shared_memory, unlink=True)
+            self.shared_memory = None
+
+
+def close_client(connection, frames):
+    connection.close()
+    frames.close()
+
+
+class InferenceClient:
+    # One connection to the inference server and its shared memory. The server gives
+    # every connection its own instance of the models it uses, so tracking state is
+    # never shared with another client.
+    def __init__(self, address=DEFAULT_SOCKET):
+        self.address = address
+        authkey = read_authkey(address)
+        if authkey is None:
+            raise ConnectionError(f"No inference server at {address} (no key at {get_authkey_path(address)}), start one with: python inference_server.py --socket {address}")
+        try:
+            self.connection = Client(address, family='AF_UNIX', authkey=authkey)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise ConnectionError(f"No inference server at {address}, start one with: python inference_server.py --socket {address}")
+        except AuthenticationError:
+            raise ConnectionError(f"The inference server at {address} did not accept the key {get_authkey_path(address)}")
+        self.frames = SharedFrames()
+        self.finalizer = weakref.finalize(self, close_client, self.connection, self.frames)
+
+    def call(self, method, *args, arrays=None):
+        if arrays is not None:
+            args += (self.frames.write(arrays),)
+        self.connection.send((method, args))
+        status, value = self.connection.recv()
+        if status == 'error':
+            raise value
+        return value
+
+    def close(self):
+        self.finalizer()
+
+
+class RemoteBoxes:
+    # One box of a RemoteResults, with the fields of ultralytics' Boxes as numpy arrays
+    def __init__(self, xyxy, cls, conf, id):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+        self.id = id
+
+
+class RemoteResults:
+    # What the trackers read from an ultralytics Results: names and the boxes
+    def __init__(self, names, xyxy, cls, conf, ids):
+        self.names = names
+        self.boxes = [RemoteBoxes(xyxy[i:i+1], cls[i:i+1], conf[i:i+1], ids[i:i+1] if ids is not None else None) for i in range(len(xyxy))]
+
+
+class RemoteYoloModel:
+    # Stands in for a YOLO model loaded by the inference server: predict and track take
+    # the same arguments and return results with the same boxes, without importing
+    # ultralytics or torch in this process
+    def __init__(self, address, model_path, backend='torch', quantization=None):
+        self.model_key = get_model_key('yolo', model_path, backend, quantization)
+        self.client = InferenceClient(address)
+        model_info = self.client.call('load', self.model_key)
+        self.names = model_info['names']
+        # whether the server's ultralytics tracks a list of images with one tracker
+        self.batched_tracking = model_info['batched_tracking']
+
+    def predict(self, source, **kwargs):
+        return self.run('predict', source, kwargs)
+
+    def track(self, source, **kwargs):
+        return self.run('track', source, kwargs)
+
+    def run(self, method, source, kwargs):
+        images = source if isinstance(source, list) else [source]
+        results_batch = self.client.call('yolo', self.model_key, method, kwargs, arrays=images)
+        return [RemoteResults(self.names, *results) for results in results_batch]
+
+    def reset_tracking(self):
+        self.client.call('reset_tracking', self.model_key)
+
+
+class RemoteCourtModel:
+    # Court keypoint model of the inference server, called with the NHWC batch of
+    # CourtLineDetector.preprocess_batch
+    def __init__(self, address, model_path, backend='torch', quantization=None):
+        self.model_key = get_model_key('court', model_path, backend, quantization)
+        self.client = InferenceClient(address)
+        self.client.call('load', self.model_key)
+
+    def __call__(self, batch):
+        return self.client.call('court', self.model_key, arrays=[batch])
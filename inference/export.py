@@ -0,0 +1,120 @@
+import inspect
+import os
+import shutil
+import sys
+import cv2
+import numpy as np
+sys.path.append('../')
+from utils import read_video_stream, get_video_frame_count
+from .backends import EXPORT_DIR, check_backend, get_exported_model_path
+
+
+def replace_path(source_path, destination_path):
+    # Move a file or directory, replacing an older export
+    if os.path.isdir(destination_path):
+        shutil.rmtree(destination_path)
+    elif os.path.exists(destination_path):
+        os.remove(destination_path)
+    shutil.move(str(source_path), destination_path)
+
+
+def get_calibration_frames(video_path, number_of_frames=32):
+    # Frames spread evenly over the video
+    step = max(get_video_frame_count(video_path) // number_of_frames, 1)
+    return [frame for frame_num, frame in enumerate(read_video_stream(video_path)) if frame_num % step == 0][:number_of_frames]
+
+
+def letterbox(image, imgsz=640):
+    # The YOLO input ultralytics makes of a frame: resized to fit imgsz x imgsz, padded
+    # with gray, RGB, 0-1, (1, 3, imgsz, imgsz)
+    height, width = image.shape[:2]
+    scale = min(imgsz/height, imgsz/width)
+    resized_width, resized_height = round(width*scale), round(height*scale)
+    resized = cv2.resize(image, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    top, left = (imgsz - resized_height)//2, (imgsz - resized_width)//2
+    padded = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    padded[top:top+resized_height, left:left+resized_width] = resized
+    return (padded[:, :, ::-1].transpose(2, 0, 1)[None] / 255).astype(np.float32)
+
+
+def quantize_onnx_model(onnx_path, quantized_path, quantization, calibration_batches=None):
+    # INT8 copy of an FP32 ONNX model. Static quantization measures the activation ranges
+    # on calibration_batches, inputs of the model as it is called.
+    try:
+        import onnxruntime
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    except ImportError:
+        raise ImportError("onnxruntime is not installed: pip install onnxruntime")
+
+    if quantization == 'dynamic':
+        # ONNX Runtime's CPU ConvInteger takes unsigned weights
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+        return quantized_path
+    if quantization != 'static':
+        raise ValueError(f"Unknown quantization {quantization}")
+    if not calibration_batches:
+        raise ValueError("Static quantization needs calibration frames, pass a calibration video")
+
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class CalibrationBatches(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(calibration_batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    quantize_static(onnx_path, quantized_path, CalibrationBatches(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def export_yolo_model(model_path, backend='onnx', quantization=None, calibration_frames=None, imgsz=640, export_dir=EXPORT_DIR):
+    # Dynamic input shapes: batches and the ball ROI crops differ from 1 x imgsz x imgsz
+    check_backend(backend, quantization, yolo=True)
+    if backend == 'torch':
+        raise ValueError("The torch backend runs the weights as they are")
+    from ultralytics import YOLO
+    os.makedirs(export_dir, exist_ok=True)
+    exported_model_path = get_exported_model_path(model_path, backend, quantization, True, export_dir)
+
+    if backend == 'openvino':
+        replace_path(YOLO(model_path).export(format='openvino', imgsz=imgsz, dynamic=True), exported_model_path)
+        return exported_model_path
+
+    onnx_path = get_exported_model_path(model_path, 'onnx', None, True, export_dir)
+    if quantization is None or not os.path.exists(onnx_path):
+        replace_path(YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True), onnx_path)
+    if quantization is not None:
+        calibration_batches = [letterbox(frame, imgsz) for frame in calibration_frames or []]
+        quantize_onnx_model(onnx_path, exported_model_path, quantization, calibration_batches)
+    return exported_model_path
+
+
+def export_court_model(model_path, backend='onnx', quantization=None, calibration_frames=None, export_dir=EXPORT_DIR):
+    # The keypoint ResNet as ONNX with a dynamic batch size; OpenVINO runs the same file
+    check_backend(backend, quantization, yolo=False)
+    if backend == 'torch':
+        raise ValueError("The torch backend runs the weights as they are")
+    import torch
+    from court_line_detector import CourtLineDetector
+    os.makedirs(export_dir, exist_ok=True)
+    court_line_detector = CourtLineDetector(model_path)
+    onnx_path = get_exported_model_path(model_path, 'onnx', None, False, export_dir)
+    exported_model_path = get_exported_model_path(model_path, backend, quantization, False, export_dir)
+
+    if quantization is None or not os.path.exists(onnx_path):
+        export_kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            # the TorchScript exporter, the dynamo one needs onnxscript
+            export_kwargs['dynamo'] = False
+        dummy_input = torch.zeros(1, 3, court_line_detector.input_size, court_line_detector.input_size)
+        torch.onnx.export(court_line_detector.model, dummy_input, onnx_path, input_names=['images'], output_names=['keypoints'],
+                          dynamic_axes={'images': {0: 'batch'}, 'keypoints': {0: 'batch'}}, opset_version=17, **export_kwargs)
+    if quantization is not None:
+        # copies, preprocess_batch reuses its buffer
+        calibration_batches = [np.ascontiguousarray(court_line_detector.preprocess_batch([frame]).transpose(0, 3, 1, 2))
+                               for frame in calibration_frames or []]
+        quantize_onnx_model(onnx_path, exported_model_path, quantization, calibration_batches)
+    return exported_model_path
@@ -0,0 +1,235 @@
+import os
+import sys
+import threading
+import time
+import numpy as np
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Listener
+from multiprocessing.shared_memory import SharedMemory
+sys.path.append('../')
+from .backends import load_yolo_model, has_batched_tracking, reset_yolo_tracking
+from .client import DEFAULT_SOCKET, close_shared_memory, get_authkey_path, is_server_running, read_authkey
+
+# Requests a client may send, methods of ClientSession
+METHODS = ('load', 'yolo', 'reset_tracking', 'court', 'status')
+WARMUP_SHAPE = (640, 640, 3)
+AUTHKEY_SIZE = 32
+
+
+def attach_shared_memory(name):
+    # The client owns the block and unlinks it, the resource tracker of this process must not
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13
+        shared_memory = SharedMemory(name=name)
+        resource_tracker.unregister(shared_memory._name, 'shared_memory')
+        return shared_memory
+
+
+def load_model(model_key):
+    # Model ready to run, after one call on a black frame that sets it up
+    kind, model_path, backend, quantization = model_key
+    if kind == 'yolo':
+        model = load_yolo_model(model_path, backend, quantization)
+        model.predict(np.zeros(WARMUP_SHAPE, dtype=np.uint8))
+        return model
+    if kind == 'court':
+        from court_line_detector import CourtLineDetector
+        court_line_detector = CourtLineDetector(model_path, backend, quantization)
+        court_line_detector.predict(np.zeros(WARMUP_SHAPE, dtype=np.uint8))
+        return court_line_detector
+    raise ValueError(f"Unknown model kind {kind}")
+
+
+def load_or_create_authkey(address):
+    # The key at <socket>.key, made on the first start and kept for later ones. Writing
+    # another key there beforehand configures the server with that one; either way the
+    # file must belong to this user and be readable by it only.
+    path = get_authkey_path(address)
+    authkey = read_authkey(address)
+    if authkey is None:
+        authkey = os.urandom(AUTHKEY_SIZE)
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+            f.write(authkey)
+    else:
+        stat = os.stat(path)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise RuntimeError(f"{path} must belong to this user and be readable by it only (chmod 600 {path})")
+    if not authkey:
+        raise RuntimeError(f"{path} is empty")
+    return authkey
+
+
+def get_results_arrays(results):
+    # (xyxy, cls, conf, ids) of the boxes of an ultralytics Results, ids None without tracking
+    boxes = list(results.boxes)
+    xyxy = np.array([box.xyxy.tolist()[0] for box in boxes], dtype=np.float64).reshape(-1, 4)
+    cls = np.array([box.cls.tolist()[0] for box in boxes], dtype=np.float64)
+    conf = np.array([box.conf.tolist()[0] for box in boxes], dtype=np.float64)
+    ids = None
+    if boxes and boxes[0].id is not None:
+        ids = np.array([box.id.tolist()[0] for box in boxes], dtype=np.float64)
+    return xyxy, cls, conf, ids
+
+
+class ModelPool:
+    # Loaded, warmed up models by (kind, model_path, backend, quantization) that no
+    # connection uses. A connection takes its own instance of every model it asks for and
+    # gives them back when it closes, so the tracks of the player model are never shared
+    # between clients. When every instance is taken another one is loaded.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.free_models = {}
+        self.instances = {}
+
+    def load(self, model_key):
+        start_time = time.perf_counter()
+        model = load_model(model_key)
+        with self.lock:
+            self.instances[model_key] = self.instances.get(model_key, 0) + 1
+        print(f"Loaded {model_key[0]} model {model_key[1]} ({model_key[2]}) in {time.perf_counter()-start_time:.1f}s")
+        return model
+
+    def preload(self, model_key, instances=1):
+        for _ in range(instances):
+            self.release(model_key, self.load(model_key))
+
+    def acquire(self, model_key):
+        with self.lock:
+            free_models = self.free_models.get(model_key)
+            if free_models:
+                return free_models.pop()
+        return self.load(model_key)
+
+    def release(self, model_key, model):
+        with self.lock:
+            self.free_models.setdefault(model_key, []).append(model)
+
+    def get_status(self):
+        # (model_key, instances, instances not in use)
+        with self.lock:
+            return [(model_key, instances, len(self.free_models.get(model_key, []))) for model_key, instances in self.instances.items()]
+
+
+class ClientSession:
+    # State of one connection: the models it took from the pool and the client's shared memory
+    def __init__(self, pool):
+        self.pool = pool
+        self.models = {}
+        self.shared_memory = None
+
+    def get_model(self, model_key):
+        model_key = tuple(model_key)
+        if model_key not in self.models:
+            model = self.pool.acquire(model_key)
+            if model_key[0] == 'yolo':
+                # no tracks of the previous client
+                reset_yolo_tracking(model)
+            self.models[model_key] = model
+        return self.models[model_key]
+
+    def get_arrays(self, frames):
+        # Views of the arrays the client wrote to its shared memory, no copy
+        if self.shared_memory is None or self.shared_memory.name != frames['name']:
+            # the client grew its block
+            self.close_shared_memory()
+            self.shared_memory = attach_shared_memory(frames['name'])
+        return [np.ndarray(shape, dtype, buffer=self.shared_memory.buf, offset=offset) for offset, shape, dtype in frames['layout']]
+
+    def load(self, model_key):
+        model = self.get_model(model_key)
+        if model_key[0] != 'yolo':
+            return None
+        return {'names': dict(model.names), 'batched_tracking': has_batched_tracking(model)}
+
+    def yolo(self, model_key, method, kwargs, frames):
+        if method not in ('predict', 'track'):
+            raise ValueError(f"Unknown YOLO method {method}")
+        model = self.get_model(model_key)
+        images = self.get_arrays(frames)
+        if method == 'track' and len(images) > 1 and not has_batched_tracking(model):
+            # one image at a time, a list would get one tracker per image
+            results_batch = [model.track(image, **kwargs)[0] for image in images]
+        else:
+            results_batch = getattr(model, method)(images, **kwargs)
+        return [get_results_arrays(results) for results in results_batch]
+
+    def reset_tracking(self, model_key):
+        reset_yolo_tracking(self.get_model(model_key))
+
+    def court(self, model_key, frames):
+        # keypoints of a preprocessed NHWC batch, in model input coordinates
+        court_line_detector = self.get_model(model_key)
+        batch, = self.get_arrays(frames)
+        return court_line_detector.run_model(court_line_detector.get_model_input(batch))
+
+    def status(self):
+        return self.pool.get_status()
+
+    def close_shared_memory(self):
+        if self.shared_memory is not None:
+            close_shared_memory(self.shared_memory)
+            self.shared_memory = None
+
+    def close(self):
+        for model_key, model in self.models.items():
+            self.pool.release(model_key, model)
+        self.models = {}
+        self.close_shared_memory()
+
+
+class InferenceServer:
+    # Serves the models of a ModelPool on a Unix socket, one thread per connection
+    def __init__(self, address=DEFAULT_SOCKET, pool=None):
+        self.address = address
+        self.pool = pool if pool is not None else ModelPool()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            if is_server_running(self.address):
+                raise RuntimeError(f"An inference server is already running at {self.address}")
+            # left over from a server that did not shut down
+            os.remove(self.address)
+        authkey = load_or_create_authkey(self.address)
+        # only this user may connect, and a client has to prove it has the key before
+        # anything it sends is unpickled
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family='AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(old_umask)
+        print(f"Inference server listening on {self.address}")
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError):
+                    # wrong key, or a client that only checked the server is there (is_server_running)
+                    continue
+                threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def handle_connection(self, connection):
+        session = ClientSession(self.pool)
+        try:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, ConnectionResetError):
+                    break
+                try:
+                    if method not in METHODS:
+                        raise ValueError(f"Unknown request {method}")
+                    response = ('ok', getattr(session, method)(*args))
+                except Exception as error:
+                    response = ('error', error)
+                try:
+                    connection.send(response)
+                except Exception as error:
+                    # e.g. an exception that does not pickle
+                    connection.send(('error', RuntimeError(f"{method}: could not send {response[1]!r}: {error}")))
+        finally:
+            session.close()
+            connection.close()
@@ -0,0 +1,69 @@
+# Inference server: loads the player, ball and court models once, runs them once on a
+# black frame and keeps serving them on a Unix socket to main.py and batch_runner.py
+# started with --server. Those then load no weights and do not import torch or
+# ultralytics; frames reach the server through shared memory.
+#
+#   python inference_server.py
+#   python inference_server.py --backend onnx --quantize dynamic --instances 2
+#   python main.py --server
+#   python inference_server.py --status
+#
+# Every client connection gets its own instance of each model, so player tracks are never
+# mixed; --instances preloads that many of each for clients running at the same time
+# (batch_runner.py --workers, --shards). Other models or backends a client asks for are
+# loaded on first use and kept. Run it from the repository root, relative model paths
+# and models/exported/ are looked up from there.
+#
+# Only the user that started the server can use it. The socket and the key next to it
+# (<socket>.key, random, made on the first start) are private to that user, and a client
+# has to prove it has the key before the server unpickles anything it sends. Whoever
+# can read the key can make the server load any model file this user can read, and
+# loading PyTorch weights runs code from them, so never share the key or loosen its
+# permissions; put your own key in <socket>.key before the first start to choose it.
+import argparse
+import signal
+import sys
+from inference import BACKENDS, QUANTIZATIONS, DEFAULT_SOCKET, InferenceServer, InferenceClient, ModelPool, get_model_key
+
+MODELS = ('player', 'ball', 'court')
+
+
+def print_status(address):
+    client = InferenceClient(address)
+    for (kind, model_path, backend, quantization), instances, free_instances in client.call('status'):
+        print(f"{kind:<6} {model_path} ({backend}{', int8 ' + quantization if quantization else ''}): {instances} loaded, {instances-free_instances} in use")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--models', choices=MODELS, nargs='+', default=list(MODELS), help='models to load at start')
+    parser.add_argument('--player-model', default='yolov8x')
+    parser.add_argument('--ball-model', default='models/yolo5_last.pt')
+    parser.add_argument('--court-model', default='models/keypoints_model.pth')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--quantize', choices=QUANTIZATIONS, default=None)
+    parser.add_argument('--instances', type=int, default=1, help='instances of each model loaded at start')
+    parser.add_argument('--status', action='store_true', help='print the models of the running server and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.socket)
+        return
+
+    model_paths = {'player': args.player_model, 'ball': args.ball_model, 'court': args.court_model}
+    pool = ModelPool()
+    for model_name in args.models:
+        kind = 'court' if model_name == 'court' else 'yolo'
+        pool.preload(get_model_key(kind, model_paths[model_name], args.backend, args.quantize), args.instances)
+    # kill/terminate also closes the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        InferenceServer(args.socket, pool).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
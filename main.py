@@ -1,148 +1,589 @@
-from utils import (read_video, 
+from utils import (read_video,
                    save_video,
-                   measure_distance,
-                   draw_player_stats,
-                   convert_pixel_distance_to_meters
+                   read_video_stream,
+                   iter_frame_windows,
+                   VideoWriter,
+                   DetectionCache,
+                   PipelineExecutor,
+                   PipelineStage,
+                   profiler,
+                   timed,
+                   run_with_profilers,
+                   Detections,
+                   OverlayRenderer,
+                   draw_player_stats_on_frame,
+                   get_video_fps,
+                   FrameStore,
+                   get_output_video_path,
+                   ENCODERS
                    )
-import constants
-from trackers import PlayerTracker,BallTracker
-from court_line_detector import CourtLineDetector
+from trackers import PlayerTracker,BallTracker,ShardedDetector,OnlineBallTrack,OnlineShotDetector,FILL_METHODS
+from court_line_detector import CourtLineDetector, CourtKeypointTracker
 from mini_court import MiniCourt
+from inference import BACKENDS, QUANTIZATIONS, DEFAULT_SOCKET
+from player_stats import get_player_stats, LivePlayerStats
+import argparse
+import sys
+import itertools
+from collections import deque
 import cv2
-import pandas as pd
-from copy import deepcopy
+import numpy as np
 
 
-def main():
-    # Read Video
-    input_video_path = "input_videos/input_video.mp4"
-    video_frames = read_video(input_video_path)
-
-    # Detect Players and Ball
-    player_tracker = PlayerTracker(model_path='yolov8x')
-    ball_tracker = BallTracker(model_path='models/yolo5_last.pt')
-
-    player_detections = player_tracker.detect_frames(video_frames,
-                                                     read_from_stub=True,
-                                                     stub_path="tracker_stubs/player_detections.pkl"
-                                                     )
-    ball_detections = ball_tracker.detect_frames(video_frames,
-                                                     read_from_stub=True,
-                                                     stub_path="tracker_stubs/ball_detections.pkl"
-                                                     )
+def draw_frame_number(frame, frame_num):
+    cv2.putText(frame, f"Frame: {frame_num}",(10,30),cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    return frame
+
+
+def build_overlay_renderer(player_tracker,
+                           player_detections,
+                           ball_tracker,
+                           ball_detections,
+                           court_line_detector,
+                           court_keypoints,
+                           mini_court,
+                           player_mini_court_detections,
+                           ball_mini_court_detections,
+                           player_stats):
+    # Every drawer registers as a layer; the layers are drawn in this order on each frame
+    court_keypoints = np.asarray(court_keypoints)
+
+    renderer = OverlayRenderer()
+    renderer.add_layer('player_bboxes', lambda frame, frame_num: player_tracker.draw_bboxes_on_frame(frame, *player_detections.get_frame(frame_num)))
+    renderer.add_layer('ball_bboxes', lambda frame, frame_num: ball_tracker.draw_bboxes_on_frame(frame, *ball_detections.get_frame(frame_num)))
+    renderer.add_layer('court_keypoints', lambda frame, frame_num: court_line_detector.draw_keypoints(frame, court_keypoints[frame_num] if court_keypoints.ndim == 2 else court_keypoints))
+    renderer.add_layer('mini_court', lambda frame, frame_num: mini_court.draw_mini_court_on_frame(frame))
+    renderer.add_layer('mini_court_players', lambda frame, frame_num: mini_court.draw_points_on_mini_court_frame(frame, player_mini_court_detections.get_frame(frame_num)[1]))
+    renderer.add_layer('mini_court_ball', lambda frame, frame_num: mini_court.draw_points_on_mini_court_frame(frame, ball_mini_court_detections.get_frame(frame_num)[1], color=(0,255,255)))
+    renderer.add_layer('player_stats', lambda frame, frame_num: draw_player_stats_on_frame(frame, player_stats[frame_num]))
+    renderer.add_layer('frame_number', draw_frame_number)
+    return renderer
+
+
+@timed('analyze_video')
+def analyze_video(first_frame,
+                  player_tracker,
+                  player_detections,
+                  ball_tracker,
+                  ball_detections,
+                  court_line_detector,
+                  court_keypoints,
+                  projection_mode='player_height',
+                  fps=24):
+    # Everything between detection and drawing; returns the renderer for the output video and the player stats
     ball_detections = ball_tracker.interpolate_ball_positions(ball_detections)
-    
-    
-    # Court Line Detector model
-    court_model_path = "models/keypoints_model.pth"
-    court_line_detector = CourtLineDetector(court_model_path)
-    court_keypoints = court_line_detector.predict(video_frames[0])
 
     # choose players
     player_detections = player_tracker.choose_and_filter_players(court_keypoints, player_detections)
 
     # MiniCourt
-    mini_court = MiniCourt(video_frames[0]) 
+    mini_court = MiniCourt(first_frame, projection_mode=projection_mode)
 
     # Detect ball shots
     ball_shot_frames= ball_tracker.get_ball_shot_frames(ball_detections)
 
     # Convert positions to mini court positions
-    player_mini_court_detections, ball_mini_court_detections = mini_court.convert_bounding_boxes_to_mini_court_coordinates(player_detections, 
+    player_mini_court_detections, ball_mini_court_detections = mini_court.convert_bounding_boxes_to_mini_court_coordinates(player_detections,
                                                                                                           ball_detections,
                                                                                                           court_keypoints)
 
-    player_stats_data = [{
-        'frame_num':0,
-        'player_1_number_of_shots':0,
-        'player_1_total_shot_speed':0,
-        'player_1_last_shot_speed':0,
-        'player_1_total_player_speed':0,
-        'player_1_last_player_speed':0,
-
-        'player_2_number_of_shots':0,
-        'player_2_total_shot_speed':0,
-        'player_2_last_shot_speed':0,
-        'player_2_total_player_speed':0,
-        'player_2_last_player_speed':0,
-    } ]
-    
-    for ball_shot_ind in range(len(ball_shot_frames)-1):
-        start_frame = ball_shot_frames[ball_shot_ind]
-        end_frame = ball_shot_frames[ball_shot_ind+1]
-        ball_shot_time_in_seconds = (end_frame-start_frame)/24 # 24fps
-
-        # Get distance covered by the ball
-        distance_covered_by_ball_pixels = measure_distance(ball_mini_court_detections[start_frame][1],
-                                                           ball_mini_court_detections[end_frame][1])
-        distance_covered_by_ball_meters = convert_pixel_distance_to_meters( distance_covered_by_ball_pixels,
-                                                                           constants.DOUBLE_LINE_WIDTH,
-                                                                           mini_court.get_width_of_mini_court()
-                                                                           ) 
-
-        # Speed of the ball shot in km/h
-        speed_of_ball_shot = distance_covered_by_ball_meters/ball_shot_time_in_seconds * 3.6
-
-        # player who the ball
-        player_positions = player_mini_court_detections[start_frame]
-        player_shot_ball = min( player_positions.keys(), key=lambda player_id: measure_distance(player_positions[player_id],
-                                                                                                 ball_mini_court_detections[start_frame][1]))
-
-        # opponent player speed
-        opponent_player_id = 1 if player_shot_ball == 2 else 2
-        distance_covered_by_opponent_pixels = measure_distance(player_mini_court_detections[start_frame][opponent_player_id],
-                                                                player_mini_court_detections[end_frame][opponent_player_id])
-        distance_covered_by_opponent_meters = convert_pixel_distance_to_meters( distance_covered_by_opponent_pixels,
-                                                                           constants.DOUBLE_LINE_WIDTH,
-                                                                           mini_court.get_width_of_mini_court()
-                                                                           ) 
-
-        speed_of_opponent = distance_covered_by_opponent_meters/ball_shot_time_in_seconds * 3.6
-
-        current_player_stats= deepcopy(player_stats_data[-1])
-        current_player_stats['frame_num'] = start_frame
-        current_player_stats[f'player_{player_shot_ball}_number_of_shots'] += 1
-        current_player_stats[f'player_{player_shot_ball}_total_shot_speed'] += speed_of_ball_shot
-        current_player_stats[f'player_{player_shot_ball}_last_shot_speed'] = speed_of_ball_shot
-
-        current_player_stats[f'player_{opponent_player_id}_total_player_speed'] += speed_of_opponent
-        current_player_stats[f'player_{opponent_player_id}_last_player_speed'] = speed_of_opponent
-
-        player_stats_data.append(current_player_stats)
-
-    player_stats_data_df = pd.DataFrame(player_stats_data)
-    frames_df = pd.DataFrame({'frame_num': list(range(len(video_frames)))})
-    player_stats_data_df = pd.merge(frames_df, player_stats_data_df, on='frame_num', how='left')
-    player_stats_data_df = player_stats_data_df.ffill()
-
-    player_stats_data_df['player_1_average_shot_speed'] = player_stats_data_df['player_1_total_shot_speed']/player_stats_data_df['player_1_number_of_shots']
-    player_stats_data_df['player_2_average_shot_speed'] = player_stats_data_df['player_2_total_shot_speed']/player_stats_data_df['player_2_number_of_shots']
-    player_stats_data_df['player_1_average_player_speed'] = player_stats_data_df['player_1_total_player_speed']/player_stats_data_df['player_2_number_of_shots']
-    player_stats_data_df['player_2_average_player_speed'] = player_stats_data_df['player_2_total_player_speed']/player_stats_data_df['player_1_number_of_shots']
-
-
-
-    # Draw output
-    ## Draw Player Bounding Boxes
-    output_video_frames= player_tracker.draw_bboxes(video_frames, player_detections)
-    output_video_frames= ball_tracker.draw_bboxes(output_video_frames, ball_detections)
-
-    ## Draw court Keypoints
-    output_video_frames  = court_line_detector.draw_keypoints_on_video(output_video_frames, court_keypoints)
-
-    # Draw Mini Court
-    output_video_frames = mini_court.draw_mini_court(output_video_frames)
-    output_video_frames = mini_court.draw_points_on_mini_court(output_video_frames,player_mini_court_detections)
-    output_video_frames = mini_court.draw_points_on_mini_court(output_video_frames,ball_mini_court_detections, color=(0,255,255))    
-
-    # Draw Player Stats
-    output_video_frames = draw_player_stats(output_video_frames,player_stats_data_df)
-
-    ## Draw frame number on top left corner
-    for i, frame in enumerate(output_video_frames):
-        cv2.putText(frame, f"Frame: {i}",(10,30),cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-    save_video(output_video_frames, "output_videos/output_video.avi")
+    player_stats = get_player_stats(ball_shot_frames,
+                                    ball_mini_court_detections,
+                                    player_mini_court_detections,
+                                    mini_court,
+                                    len(player_detections),
+                                    fps=fps)
+
+    # Draw output: all layers in one pass per frame
+    overlay_renderer = build_overlay_renderer(player_tracker,
+                                              player_detections,
+                                              ball_tracker,
+                                              ball_detections,
+                                              court_line_detector,
+                                              court_keypoints,
+                                              mini_court,
+                                              player_mini_court_detections,
+                                              ball_mini_court_detections,
+                                              player_stats)
+    return overlay_renderer, player_stats.to_dataframe()
+
+
+def build_trackers(tracker_options=None, player_model_path='yolov8x', ball_model_path='models/yolo5_last.pt', court_model_path='models/keypoints_model.pth'):
+    # tracker_options: {'player': {...}, 'ball': {...}, 'court': {...}} keyword arguments of
+    # the trackers and the court line detector (inference backend, stride settings,
+    # court-masked players, ball ROI search)
+    tracker_options = tracker_options or {}
+    player_tracker = PlayerTracker(model_path=player_model_path, **tracker_options.get('player', {}))
+    ball_tracker = BallTracker(model_path=ball_model_path, **tracker_options.get('ball', {}))
+    court_line_detector = CourtLineDetector(court_model_path, **tracker_options.get('court', {}))
+    return player_tracker, ball_tracker, court_line_detector
+
+
+def get_main_output_video_path(encoder_options=None):
+    # output_videos/output_video.mp4 with ffmpeg, .avi with cv2
+    return get_output_video_path("output_videos", (encoder_options or {}).get('encoder', 'cv2'))
+
+
+def set_court_area(player_tracker, court_line_detector, first_frame):
+    # Court-masked player detection needs the court keypoints before the players
+    if player_tracker.uses_court_area():
+        player_tracker.set_court_keypoints(court_line_detector.predict(first_frame))
+
+
+def detect_and_analyze(input_video_path,
+                       first_frame,
+                       player_tracker,
+                       ball_tracker,
+                       court_line_detector,
+                       detect,
+                       detection_cache=None,
+                       batch_size=1,
+                       projection_mode='player_height',
+                       track_court_keypoints=False,
+                       court_redetect_interval=None,
+                       shards=1,
+                       shard_overlap=48,
+                       frame_store=None):
+    # Detections from the cache (or the shards), the rest from
+    # detect(detect_players, detect_ball, court_keypoint_tracker), which runs what is
+    # asked for over the whole video and returns (player_detections, ball_detections,
+    # court_keypoints), None for what was not asked; then the analysis of analyze_video.
+    # Returns the renderer, the player stats and the number of frames.
+    fps = get_video_fps(input_video_path)
+    set_court_area(player_tracker, court_line_detector, first_frame)
+
+    # Detections are cached per video, model weights and inference parameters
+    if detection_cache is None:
+        detection_cache = DetectionCache("tracker_cache")
+
+    if shards > 1:
+        # Detection split over one process per shard of the video
+        sharded_detector = ShardedDetector(player_tracker, ball_tracker, shards, overlap=shard_overlap, batch_size=batch_size)
+        player_detections, ball_detections = sharded_detector.detect(input_video_path, cache=detection_cache, frame_store=frame_store)
+    else:
+        player_cache_key = player_tracker.get_cache_key(detection_cache, input_video_path)
+        ball_cache_key = ball_tracker.get_cache_key(detection_cache, input_video_path)
+        player_detections = detection_cache.load(player_cache_key)
+        ball_detections = detection_cache.load(ball_cache_key)
+
+    court_keypoint_tracker = None
+    if track_court_keypoints:
+        # One row of keypoints per frame, the model only reruns on scene changes
+        court_keypoint_tracker = CourtKeypointTracker(court_line_detector, redetect_interval=court_redetect_interval)
+
+    detect_players = player_detections is None
+    detect_ball = ball_detections is None
+    if detect_players or detect_ball or court_keypoint_tracker is not None:
+        detected_players, detected_ball, court_keypoints = detect(detect_players, detect_ball, court_keypoint_tracker)
+        if detect_players:
+            player_detections = detected_players
+            detection_cache.save(player_cache_key, player_detections)
+        if detect_ball:
+            ball_detections = detected_ball
+            detection_cache.save(ball_cache_key, ball_detections)
+
+    if court_keypoint_tracker is not None:
+        print(f"Court keypoints: {court_keypoint_tracker.get_counters()}")
+    else:
+        court_keypoints = court_line_detector.predict(first_frame)
+
+    overlay_renderer, player_stats_data_df = analyze_video(first_frame,
+                                                           player_tracker,
+                                                           player_detections,
+                                                           ball_tracker,
+                                                           ball_detections,
+                                                           court_line_detector,
+                                                           court_keypoints,
+                                                           projection_mode=projection_mode,
+                                                           fps=fps)
+    return overlay_renderer, player_stats_data_df, len(player_detections)
+
+
+def main(batch_size=1, projection_mode='player_height', track_court_keypoints=False, court_redetect_interval=None, shards=1, shard_overlap=48, encoder_options=None, tracker_options=None,
+         frame_store=False):
+    # Read Video
+    input_video_path = "input_videos/input_video.mp4"
+    if frame_store:
+        # Decoded once into frame_store/ and memory-mapped, later runs skip decoding
+        video_frames = FrameStore.from_video(input_video_path)
+    else:
+        video_frames = read_video(input_video_path)
+    fps = get_video_fps(input_video_path)
+
+    # Detect Players and Ball, Court Line Detector model
+    player_tracker, ball_tracker, court_line_detector = build_trackers(tracker_options)
+
+    def detect(detect_players, detect_ball, court_keypoint_tracker):
+        # Every frame is in memory, each model goes over all of them
+        player_detections = player_tracker.detect_frames(video_frames, batch_size=batch_size) if detect_players else None
+        ball_detections = ball_tracker.detect_frames(video_frames, batch_size=batch_size) if detect_ball else None
+        court_keypoints = court_keypoint_tracker.track_frames(video_frames) if court_keypoint_tracker is not None else None
+        return player_detections, ball_detections, court_keypoints
+
+    overlay_renderer, player_stats_data_df, _ = detect_and_analyze(input_video_path,
+                                                                   video_frames[0],
+                                                                   player_tracker,
+                                                                   ball_tracker,
+                                                                   court_line_detector,
+                                                                   detect,
+                                                                   batch_size=batch_size,
+                                                                   projection_mode=projection_mode,
+                                                                   track_court_keypoints=track_court_keypoints,
+                                                                   court_redetect_interval=court_redetect_interval,
+                                                                   shards=shards,
+                                                                   shard_overlap=shard_overlap,
+                                                                   frame_store=video_frames if frame_store else None)
+    save_video(overlay_renderer.render(video_frames), get_main_output_video_path(encoder_options), fps=fps, **(encoder_options or {}))
+
+
+def process_video_streaming(input_video_path,
+                            output_video_path,
+                            player_tracker,
+                            ball_tracker,
+                            court_line_detector,
+                            detection_cache=None,
+                            window_size=32,
+                            batch_size=1,
+                            projection_mode='player_height',
+                            track_court_keypoints=False,
+                            court_redetect_interval=None,
+                            shards=1,
+                            shard_overlap=48,
+                            encoder_options=None):
+    # Same analysis as main() but frames are never all held in memory:
+    # the video is decoded once for detection (window_size frames at a time)
+    # and once more for drawing, and each drawn frame goes straight to the writer.
+    # Models are passed in so that they can be loaded once for many videos.
+    # Returns the player stats, one row per frame.
+    fps = get_video_fps(input_video_path)
+
+    # The first frame is needed for the court keypoints and the mini court layout
+    first_frame = next(read_video_stream(input_video_path), None)
+    if first_frame is None:
+        raise ValueError(f"Could not read any frame from {input_video_path}")
+
+    # Track ids and the ball search of a previous video must not carry over
+    player_tracker.reset_tracking()
+    ball_tracker.reset_tracking()
+
+    def detect(detect_players, detect_ball, court_keypoint_tracker):
+        # Decode once and feed the trackers that missed the cache window by window
+        player_detections_windows = []
+        ball_detections_windows = []
+        court_keypoints_windows = []
+        for frames_window in iter_frame_windows(read_video_stream(input_video_path), window_size):
+            if detect_players:
+                player_detections_windows.append(player_tracker.detect_frames(frames_window, batch_size=batch_size))
+            if detect_ball:
+                ball_detections_windows.append(ball_tracker.detect_frames(frames_window, batch_size=batch_size))
+            if court_keypoint_tracker is not None:
+                court_keypoints_windows.append(court_keypoint_tracker.track_frames(frames_window))
+        return (Detections.concatenate(player_detections_windows) if detect_players else None,
+                Detections.concatenate(ball_detections_windows) if detect_ball else None,
+                np.concatenate(court_keypoints_windows) if court_keypoint_tracker is not None else None)
+
+    overlay_renderer, player_stats_data_df, number_of_frames = detect_and_analyze(input_video_path,
+                                                                                  first_frame,
+                                                                                  player_tracker,
+                                                                                  ball_tracker,
+                                                                                  court_line_detector,
+                                                                                  detect,
+                                                                                  detection_cache=detection_cache,
+                                                                                  batch_size=batch_size,
+                                                                                  projection_mode=projection_mode,
+                                                                                  track_court_keypoints=track_court_keypoints,
+                                                                                  court_redetect_interval=court_redetect_interval,
+                                                                                  shards=shards,
+                                                                                  shard_overlap=shard_overlap)
+    del first_frame
+
+    # Draw output one frame at a time
+    frames = itertools.islice(read_video_stream(input_video_path), number_of_frames)
+    save_video(overlay_renderer.render(frames), output_video_path, fps=fps, **(encoder_options or {}))
+
+    return player_stats_data_df
+
+
+def main_streaming(window_size=32, batch_size=1, projection_mode='player_height', track_court_keypoints=False, court_redetect_interval=None, shards=1, shard_overlap=48, encoder_options=None, tracker_options=None):
+    player_tracker, ball_tracker, court_line_detector = build_trackers(tracker_options)
+
+    process_video_streaming("input_videos/input_video.mp4",
+                            get_main_output_video_path(encoder_options),
+                            player_tracker,
+                            ball_tracker,
+                            court_line_detector,
+                            window_size=window_size,
+                            batch_size=batch_size,
+                            projection_mode=projection_mode,
+                            track_court_keypoints=track_court_keypoints,
+                            court_redetect_interval=court_redetect_interval,
+                            shards=shards,
+                            shard_overlap=shard_overlap,
+                            encoder_options=encoder_options)
+
+
+def main_pipelined(window_size=32, batch_size=1, render_workers=4, queue_size=8, projection_mode='player_height', track_court_keypoints=False, court_redetect_interval=None, shards=1, shard_overlap=48, encoder_options=None, tracker_options=None):
+    # Streaming analysis with the stages overlapped in threads (OpenCV decode/encode/drawing
+    # and torch inference release the GIL):
+    #   detection: decode -> player inference -> ball inference -> court keypoints -> collect
+    #   drawing:   decode -> render (render_workers threads) -> encode
+    # Shot detection and stats need the whole ball track, so drawing starts after detection.
+    input_video_path = "input_videos/input_video.mp4"
+    output_video_path = get_main_output_video_path(encoder_options)
+
+    first_frame = next(read_video_stream(input_video_path))
+    fps = get_video_fps(input_video_path)
+
+    player_tracker, ball_tracker, court_line_detector = build_trackers(tracker_options)
+
+    def detect(detect_players, detect_ball, court_keypoint_tracker):
+        # Trackers keep state between windows, so every detection stage is ordered with one worker
+        detection_stages = []
+        if detect_players:
+            def detect_player_window(window):
+                window['player_detections'] = player_tracker.detect_frames(window['frames'], batch_size=batch_size)
+                return window
+            detection_stages.append(PipelineStage('player_inference', detect_player_window, ordered=True))
+        if detect_ball:
+            def detect_ball_window(window):
+                window['ball_detections'] = ball_tracker.detect_frames(window['frames'], batch_size=batch_size)
+                return window
+            detection_stages.append(PipelineStage('ball_inference', detect_ball_window, ordered=True))
+        if court_keypoint_tracker is not None:
+            def track_court(window):
+                window['court_keypoints'] = court_keypoint_tracker.track_frames(window['frames'])
+                return window
+            detection_stages.append(PipelineStage('court_keypoints', track_court, ordered=True))
+
+        windows = []
+        def collect(window):
+            # Frames are not needed any more once every stage has seen them
+            del window['frames']
+            windows.append(window)
+
+        detection_executor = PipelineExecutor(detection_stages, queue_size=queue_size)
+        frames_windows = ({'frames': frames_window} for frames_window in iter_frame_windows(read_video_stream(input_video_path), window_size))
+        detection_executor.run(frames_windows, collect, sink_name='collect')
+        print(detection_executor.format_metrics())
+        return (Detections.concatenate([window['player_detections'] for window in windows]) if detect_players else None,
+                Detections.concatenate([window['ball_detections'] for window in windows]) if detect_ball else None,
+                np.concatenate([window['court_keypoints'] for window in windows]) if court_keypoint_tracker is not None else None)
+
+    overlay_renderer, player_stats_data_df, number_of_frames = detect_and_analyze(input_video_path,
+                                                                                  first_frame,
+                                                                                  player_tracker,
+                                                                                  ball_tracker,
+                                                                                  court_line_detector,
+                                                                                  detect,
+                                                                                  batch_size=batch_size,
+                                                                                  projection_mode=projection_mode,
+                                                                                  track_court_keypoints=track_court_keypoints,
+                                                                                  court_redetect_interval=court_redetect_interval,
+                                                                                  shards=shards,
+                                                                                  shard_overlap=shard_overlap)
+    del first_frame
+
+    # Frames are drawn independently, in any order; the encoder gets them back in order
+    render_stage = PipelineStage('render', lambda numbered_frame: overlay_renderer.render_frame(numbered_frame[1], numbered_frame[0]), workers=render_workers)
+    render_executor = PipelineExecutor([render_stage], queue_size=queue_size)
+    frames = enumerate(itertools.islice(read_video_stream(input_video_path), number_of_frames))
+    with VideoWriter(output_video_path, fps=fps, **(encoder_options or {})) as video_writer:
+        render_executor.run(frames, video_writer.write)
+    print(render_executor.format_metrics())
+
+
+def process_video_live(input_video_path,
+                       output_video_path,
+                       player_tracker,
+                       ball_tracker,
+                       court_line_detector,
+                       max_ball_gap=10,
+                       encoder_options=None):
+    # Frame by frame analysis as for a live feed, nothing waits for the end of the video:
+    # the ball track fills gaps with at most max_ball_gap frames of lookahead, shots are
+    # detected online and the stats are updated as they come, O(1) per frame.
+    # Latency: each frame is drawn and written max_ball_gap frames after it was read; a
+    # hit is detected OnlineShotDetector.latency frames after that and its speeds show
+    # once the next hit is detected. Positions are projected with the homography since
+    # the player height projection looks 50 frames ahead.
+    # Returns the shot frames.
+    fps = get_video_fps(input_video_path)
+    player_tracker.reset_tracking()
+    ball_tracker.reset_tracking()
+    ball_track = OnlineBallTrack(max_gap=max_ball_gap)
+    shot_detector = OnlineShotDetector()
+    # (frame, chosen player detections) of the frames whose ball position is not final yet
+    waiting_frames = deque()
+    shot_frames = []
+    # What the overlay layers draw on the current frame
+    live_frame = {}
+
+    court_keypoints = None
+    chosen_players = None
+    with VideoWriter(output_video_path, fps=fps, **(encoder_options or {})) as video_writer:
+        def write_frame(frame_num, ball_bbox):
+            frame, player_dict = waiting_frames.popleft()
+            player_ids = np.array(list(player_dict.keys()), dtype=np.int32)
+            player_bboxes = np.array(list(player_dict.values()), dtype=np.float64).reshape(-1, 4)
+
+            # Players from their foot position, the ball from its center
+            foot_positions = np.stack([np.trunc((player_bboxes[:, 0] + player_bboxes[:, 2])/2), player_bboxes[:, 3]], axis=1)
+            player_positions = mini_court.project_points(foot_positions, None, court_keypoints)
+            ball_position = None
+            if not np.isnan(ball_bbox).any():
+                ball_center = np.trunc((ball_bbox[0:2] + ball_bbox[2:4])/2)
+                ball_position = mini_court.project_points(ball_center[None], None, court_keypoints)[0]
+
+            live_player_stats.add_frame(dict(zip(player_ids.tolist(), player_positions.tolist())),
+                                        ball_position.tolist() if ball_position is not None else None)
+            shot_frame = shot_detector.add(ball_bbox)
+            if shot_frame is not None:
+                shot_frames.append(shot_frame)
+                live_player_stats.add_shot(shot_frame)
+
+            live_frame.update(player_ids=player_ids,
+                              player_bboxes=player_bboxes,
+                              ball_bboxes=ball_bbox[None] if ball_position is not None else np.zeros((0, 4)),
+                              player_positions=player_positions,
+                              ball_positions=ball_position[None] if ball_position is not None else np.zeros((0, 2)),
+                              player_stats=live_player_stats.get_row())
+            video_writer.write(overlay_renderer.render_frame(frame, frame_num))
+
+        for frame in read_video_stream(input_video_path):
+            if court_keypoints is None:
+                court_keypoints = court_line_detector.predict(frame)
+                if player_tracker.uses_court_area():
+                    player_tracker.set_court_keypoints(court_keypoints)
+                mini_court = MiniCourt(frame, projection_mode='homography')
+                live_player_stats = LivePlayerStats(mini_court.get_width_of_mini_court(), fps=fps, history=shot_detector.latency+1)
+                overlay_renderer = OverlayRenderer()
+                overlay_renderer.add_layer('player_bboxes', lambda frame, frame_num: player_tracker.draw_bboxes_on_frame(frame, live_frame['player_ids'], live_frame['player_bboxes']))
+                overlay_renderer.add_layer('ball_bboxes', lambda frame, frame_num: ball_tracker.draw_bboxes_on_frame(frame, np.ones(len(live_frame['ball_bboxes']), dtype=np.int32), live_frame['ball_bboxes']))
+                overlay_renderer.add_layer('court_keypoints', lambda frame, frame_num: court_line_detector.draw_keypoints(frame, court_keypoints))
+                overlay_renderer.add_layer('mini_court', lambda frame, frame_num: mini_court.draw_mini_court_on_frame(frame))
+                overlay_renderer.add_layer('mini_court_players', lambda frame, frame_num: mini_court.draw_points_on_mini_court_frame(frame, live_frame['player_positions']))
+                overlay_renderer.add_layer('mini_court_ball', lambda frame, frame_num: mini_court.draw_points_on_mini_court_frame(frame, live_frame['ball_positions'], color=(0,255,255)))
+                overlay_renderer.add_layer('player_stats', lambda frame, frame_num: draw_player_stats_on_frame(frame, live_frame['player_stats']))
+                overlay_renderer.add_layer('frame_number', draw_frame_number)
+
+            player_dict = player_tracker.detect_frame(frame)
+            if chosen_players is None or len(chosen_players) < 2:
+                # Players are chosen on the first frame, or the first one with both of them
+                chosen_players = player_tracker.choose_players(court_keypoints, player_dict)
+            waiting_frames.append((frame, {track_id: bbox for track_id, bbox in player_dict.items() if track_id in chosen_players}))
+
+            for frame_num, ball_bbox in ball_track.add(ball_tracker.detect_frame(frame).get(1)):
+                write_frame(frame_num, ball_bbox)
+        for frame_num, ball_bbox in ball_track.flush():
+            write_frame(frame_num, ball_bbox)
+
+    if court_keypoints is None:
+        raise ValueError(f"Could not read any frame from {input_video_path}")
+    return shot_frames
+
+
+def main_live(max_ball_gap=10, encoder_options=None, tracker_options=None):
+    player_tracker, ball_tracker, court_line_detector = build_trackers(tracker_options)
+
+    process_video_live("input_videos/input_video.mp4",
+                       get_main_output_video_path(encoder_options),
+                       player_tracker,
+                       ball_tracker,
+                       court_line_detector,
+                       max_ball_gap=max_ball_gap,
+                       encoder_options=encoder_options)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stream', action='store_true', help='stream frames instead of loading the whole video into memory')
+    parser.add_argument('--window-size', type=int, default=32, help='number of decoded frames held at once in streaming mode')
+    parser.add_argument('--batch-size', type=int, default=1, help='number of frames sent to the detection models per call')
+    parser.add_argument('--projection', choices=MiniCourt.PROJECTION_MODES, default='player_height', help='how positions are mapped onto the mini court')
+    parser.add_argument('--track-court-keypoints', action='store_true', help='keypoints for every frame, re-detected on scene changes')
+    parser.add_argument('--court-redetect-interval', type=int, default=None, help='also re-detect the court keypoints every K frames')
+    parser.add_argument('--pipeline', action='store_true', help='stream with decode, inference, drawing and encoding running in parallel threads')
+    parser.add_argument('--live', action='store_true', help='analyze frame by frame as for a live feed: online ball track, shot detection and stats with a fixed latency')
+    parser.add_argument('--max-ball-gap', type=int, default=10, help='live mode: longest ball gap filled by interpolation, also the drawing latency in frames')
+    parser.add_argument('--render-workers', type=int, default=4, help='drawing threads in pipeline mode')
+    parser.add_argument('--queue-size', type=int, default=8, help='items buffered between two pipeline stages')
+    parser.add_argument('--frame-store', action='store_true', help='decode the video once into a memory-mapped frame file in frame_store/ (reused by later runs) instead of a list in memory')
+    parser.add_argument('--shards', type=int, default=1, help='split player and ball detection over this many processes, each on a time range of the video')
+    parser.add_argument('--shard-overlap', type=int, default=48, help='frames shared by consecutive shards, used to stitch the player track ids')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help='run the player, ball and court models in PyTorch or exported (python export_models.py) with ONNX Runtime or OpenVINO')
+    parser.add_argument('--quantize', choices=QUANTIZATIONS, default=None, help='use the INT8 export of the models (onnx backend, and openvino for the court model)')
+    parser.add_argument('--server', nargs='?', const=DEFAULT_SOCKET, default=None, help=f'run the models in the inference server (python inference_server.py) listening on this socket, {DEFAULT_SOCKET} by default')
+    parser.add_argument('--detection-stride', type=int, default=1, help='run the player detector on every K-th frame and interpolate the others')
+    parser.add_argument('--ball-detection-stride', type=int, default=None, help='stride of the ball detector, --detection-stride by default')
+    parser.add_argument('--motion-threshold', type=float, default=None, help='with a stride, also detect when the frame changed by more than this (mean absolute difference, 0-255)')
+    parser.add_argument('--stride-fill', choices=FILL_METHODS, default='linear', help='how boxes of the skipped frames are filled in')
+    parser.add_argument('--person-only', action='store_true', help='ask the player model for people only instead of every class')
+    parser.add_argument('--court-margin', type=float, default=None, help='detect players on a crop of the court only, dropping people further outside the court than this fraction of its width (e.g. 0.15)')
+    parser.add_argument('--ball-roi-size', type=int, default=None, help='search the ball in a crop of this size around its predicted position instead of the whole frame')
+    parser.add_argument('--ball-roi-max-misses', type=int, default=3, help='search the whole frame again after this many frames without the ball')
+    parser.add_argument('--ball-roi-imgsz', type=int, default=None, help='model input size for the crops (multiple of 32), larger than --ball-roi-size upscales them')
+    parser.add_argument('--encoder', choices=ENCODERS, default='auto', help='ffmpeg compresses the output (H.264/HEVC), cv2 writes MJPG; auto uses ffmpeg when it is installed')
+    parser.add_argument('--codec', default='h264', help='ffmpeg encoder: h264, hevc, h264_nvenc, hevc_nvenc, h264_qsv, ... ')
+    parser.add_argument('--crf', type=int, default=23, help='ffmpeg quality, lower is better and bigger')
+    parser.add_argument('--preset', default='veryfast', help='ffmpeg speed/size trade off (x264 preset names)')
+    parser.add_argument('--encoder-threads', type=int, default=0, help='ffmpeg encoder threads, 0 lets ffmpeg decide')
+    parser.add_argument('--profile-report', default=None, help='write wall time, fps and calls per stage and the peak RSS as JSON to this path')
+    parser.add_argument('--cprofile', default=None, help='dump cProfile stats to this path (python -m pstats)')
+    parser.add_argument('--pyinstrument', default=None, help='write a pyinstrument HTML report to this path (needs pyinstrument)')
+    args = parser.parse_args()
+
+    # Output frames are encoded on a background thread
+    encoder_options = {'encoder': args.encoder, 'codec': args.codec, 'crf': args.crf, 'preset': args.preset,
+                       'threads': args.encoder_threads, 'background': True}
+
+    ball_detection_stride = args.detection_stride if args.ball_detection_stride is None else args.ball_detection_stride
+    tracker_options = {'player': {'stride': args.detection_stride, 'motion_threshold': args.motion_threshold, 'fill_method': args.stride_fill,
+                                 'person_only': args.person_only, 'court_margin': args.court_margin},
+                      'ball': {'stride': ball_detection_stride, 'motion_threshold': args.motion_threshold, 'fill_method': args.stride_fill,
+                               'roi_size': args.ball_roi_size, 'roi_max_misses': args.ball_roi_max_misses, 'roi_imgsz': args.ball_roi_imgsz}}
+    tracker_options['court'] = {}
+    for model_options in tracker_options.values():
+        model_options.update(backend=args.backend, quantization=args.quantize, server=args.server)
+
+    def run():
+        if args.live:
+            main_live(max_ball_gap=args.max_ball_gap, encoder_options=encoder_options, tracker_options=tracker_options)
+        elif args.pipeline:
+            main_pipelined(window_size=args.window_size,
+                           batch_size=args.batch_size,
+                           render_workers=args.render_workers,
+                           queue_size=args.queue_size,
+                           projection_mode=args.projection,
+                           track_court_keypoints=args.track_court_keypoints,
+                           court_redetect_interval=args.court_redetect_interval,
+                           shards=args.shards,
+                           shard_overlap=args.shard_overlap,
+                           encoder_options=encoder_options,
+                           tracker_options=tracker_options)
+        elif args.stream:
+            main_streaming(window_size=args.window_size,
+                           batch_size=args.batch_size,
+                           projection_mode=args.projection,
+                           track_court_keypoints=args.track_court_keypoints,
+                           court_redetect_interval=args.court_redetect_interval,
+                           shards=args.shards,
+                           shard_overlap=args.shard_overlap,
+                           encoder_options=encoder_options,
+                           tracker_options=tracker_options)
+        else:
+            main(batch_size=args.batch_size,
+                 projection_mode=args.projection,
+                 track_court_keypoints=args.track_court_keypoints,
+                 court_redetect_interval=args.court_redetect_interval,
+                 shards=args.shards,
+                 shard_overlap=args.shard_overlap,
+                 encoder_options=encoder_options,
+                 tracker_options=tracker_options,
+                 frame_store=args.frame_store)
+
+    # Wall time in the report starts here, not at import
+    profiler.reset()
+    run_with_profilers(run, cprofile_path=args.cprofile, pyinstrument_path=args.pyinstrument)
+
+    if args.profile_report is not None:
+        profiler.save_report(args.profile_report, argv=sys.argv)
+        print(profiler.format_report())
\ No newline at end of file
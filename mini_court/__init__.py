@@ -1 +1,2 @@
-from .mini_court import MiniCourt
\ No newline at end of file
+from .mini_court import MiniCourt
+from .court_projection import CourtProjector
\ No newline at end of file
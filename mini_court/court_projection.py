@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+
+class CourtProjector:
+    # Maps image points onto the mini court with a homography fitted from the 14 court
+    # keypoints to the mini court drawing keypoints. The matrix is cached and only
+    # refitted when the court keypoints change; points are mapped in bulk with one
+    # matrix multiply per set of keypoints.
+    def __init__(self, drawing_key_points, ransac_reprojection_threshold=5.0):
+        self.drawing_key_points = np.asarray(drawing_key_points, dtype=np.float64).reshape(-1, 2)
+        self.ransac_reprojection_threshold = ransac_reprojection_threshold
+        self.court_key_points = None
+        self.homography = None
+        self.number_of_fits = 0
+
+    def get_homography(self, court_key_points):
+        court_key_points = np.asarray(court_key_points, dtype=np.float64).reshape(-1, 2)
+        if self.homography is None or not np.array_equal(court_key_points, self.court_key_points):
+            # RANSAC so that a single badly detected keypoint does not skew the whole court
+            homography, _ = cv2.findHomography(court_key_points,
+                                               self.drawing_key_points,
+                                               cv2.RANSAC,
+                                               self.ransac_reprojection_threshold)
+            if homography is None:
+                raise ValueError("Could not fit a homography to the court keypoints")
+            self.homography = homography
+            self.court_key_points = court_key_points
+            self.number_of_fits += 1
+        return self.homography
+
+    def project_points(self, points, court_key_points):
+        # (N, 2) image points -> (N, 2) mini court points
+        homography = self.get_homography(court_key_points)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        projected = points @ homography[:, :2].T + homography[:, 2]
+        return projected[:, :2] / projected[:, 2:3]
+
+    def project_points_per_frame(self, points, frame_idx, court_key_points_per_frame):
+        # Points of many frames at once with (number_of_frames, 28) keypoints, frame_idx sorted.
+        # Consecutive frames with the same keypoints share one homography.
+        court_key_points_per_frame = np.asarray(court_key_points_per_frame, dtype=np.float64)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        frame_idx = np.asarray(frame_idx)
+        projected = np.empty_like(points)
+
+        keypoints_changed = np.any(court_key_points_per_frame[1:] != court_key_points_per_frame[:-1], axis=1)
+        run_starts = np.concatenate(([0], np.flatnonzero(keypoints_changed) + 1, [len(court_key_points_per_frame)]))
+        row_starts = np.searchsorted(frame_idx, run_starts)
+        for run_index in range(len(run_starts) - 1):
+            start, end = row_starts[run_index], row_starts[run_index+1]
+            if start == end:
+                continue
+            projected[start:end] = self.project_points(points[start:end], court_key_points_per_frame[run_starts[run_index]])
+        return projected
@@ -3,19 +3,38 @@ import numpy as np
 import sys
 sys.path.append('../')
 import constants
+from .court_projection import CourtProjector
 from utils import (
     convert_meters_to_pixel_distance,
     convert_pixel_distance_to_meters,
     get_foot_position,
     get_closest_keypoint_index,
+    get_closest_keypoint_indices,
+    get_keypoints_at_indices,
     get_height_of_bbox,
     measure_xy_distance,
     get_center_of_bbox,
-    measure_distance
+    measure_distance,
+    Detections,
+    as_detections,
+    sliding_window_max,
+    get_writable_frame,
+    Sprite,
+    SpriteCache,
+    blend_rectangle,
+    timed
 )
 
 class MiniCourt():
-    def __init__(self,frame):
+    # projection_mode:
+    #   'player_height' scales the offset from the closest court keypoint by the player bbox height
+    #   'homography'    maps positions with a homography fitted on all 14 court keypoints
+    PROJECTION_MODES = ('player_height', 'homography')
+
+    def __init__(self,frame, projection_mode='player_height'):
+        if projection_mode not in self.PROJECTION_MODES:
+            raise ValueError(f"Unknown projection mode {projection_mode!r}, expected one of {self.PROJECTION_MODES}")
+        self.projection_mode = projection_mode
         self.drawing_rectangle_width = 250
         self.drawing_rectangle_height = 500
         self.buffer = 50
@@ -26,6 +45,9 @@ class MiniCourt():
         self.set_court_drawing_key_points()
         self.set_court_lines()
 
+        self.court_projector = CourtProjector(self.drawing_key_points)
+        self.sprite_cache = SpriteCache()
+
 
     def convert_meters_to_pixels(self, meters):
         return convert_meters_to_pixel_distance(meters,
@@ -109,6 +131,11 @@ class MiniCourt():
         self.start_y = self.end_y - self.drawing_rectangle_height
 
     def draw_court(self,frame):
+        # Court lines never change: drawn once per frame size and pasted afterwards
+        court_sprite = self.sprite_cache.get(('court', frame.shape), lambda: Sprite.from_drawing(frame.shape, self.draw_court_lines))
+        return court_sprite.paste(frame)
+
+    def draw_court_lines(self,frame):
         for i in range(0, len(self.drawing_key_points),2):
             x = int(self.drawing_key_points[i])
             y = int(self.drawing_key_points[i+1])
@@ -128,24 +155,22 @@ class MiniCourt():
         return frame
 
     def draw_background_rectangle(self,frame):
-        shapes = np.zeros_like(frame,np.uint8)
-        # Draw the rectangle
-        cv2.rectangle(shapes, (self.start_x, self.start_y), (self.end_x, self.end_y), (255, 255, 255), cv2.FILLED)
-        out = frame.copy()
+        # Blended in place, only the rectangle is touched
         alpha=0.5
-        mask = shapes.astype(bool)
-        out[mask] = cv2.addWeighted(frame, alpha, shapes, 1 - alpha, 0)[mask]
-
-        return out
+        return blend_rectangle(frame, self.start_x, self.start_y, self.end_x, self.end_y, (255, 255, 255), alpha)
 
     def draw_mini_court(self,frames):
         output_frames = []
         for frame in frames:
-            frame = self.draw_background_rectangle(frame)
-            frame = self.draw_court(frame)
+            frame = self.draw_mini_court_on_frame(get_writable_frame(frame))
             output_frames.append(frame)
         return output_frames
 
+    def draw_mini_court_on_frame(self,frame):
+        frame = self.draw_background_rectangle(frame)
+        frame = self.draw_court(frame)
+        return frame
+
     def get_start_point_of_mini_court(self):
         return (self.court_start_x,self.court_start_y)
     def get_width_of_mini_court(self):
@@ -186,66 +211,142 @@ class MiniCourt():
 
         return  mini_court_player_position
 
+    def get_mini_court_coordinates_array(self,
+                                         object_positions,
+                                         closest_key_points,
+                                         closest_key_point_indices,
+                                         player_heights_in_pixels,
+                                         player_heights_in_meters
+                                         ):
+        # get_mini_court_coordinates for (N, 2) arrays of positions and keypoints
+        distance_from_keypoint_pixels = np.abs(object_positions - closest_key_points)
+
+        # Conver pixel distance to meters
+        distance_from_keypoint_meters = convert_pixel_distance_to_meters(distance_from_keypoint_pixels,
+                                                                         player_heights_in_meters[:, None],
+                                                                         player_heights_in_pixels[:, None]
+                                                                         )
+
+        # Convert to mini court coordinates
+        mini_court_distance_pixels = self.convert_meters_to_pixels(distance_from_keypoint_meters)
+        drawing_key_points = np.asarray(self.drawing_key_points, dtype=np.float64).reshape(-1, 2)
+
+        return drawing_key_points[closest_key_point_indices] + mini_court_distance_pixels
+
+    @timed('mini_court.convert')
     def convert_bounding_boxes_to_mini_court_coordinates(self,player_boxes, ball_boxes, original_court_key_points ):
+        if self.projection_mode == 'homography':
+            return self.convert_bounding_boxes_to_mini_court_coordinates_with_homography(player_boxes, ball_boxes, original_court_key_points)
+
         player_heights = {
             1: constants.PLAYER_1_HEIGHT_METERS,
             2: constants.PLAYER_2_HEIGHT_METERS
         }
+        key_point_indices = [0,2,12,13]
+
+        player_boxes = as_detections(player_boxes)
+        ball_bboxes = as_detections(ball_boxes).get_track_bboxes(1)
+        number_of_frames = len(player_boxes)
+        # Court keypoints are either one set for the whole video or one row per frame
+        original_court_key_points = np.asarray(original_court_key_points, dtype=np.float64)
+        per_frame_key_points = original_court_key_points.ndim == 2
+
+        # One row per player detection
+        frame_idx = player_boxes.frame_idx
+        player_ids = player_boxes.track_id
+        bboxes = player_boxes.bboxes
+
+        # Player height in pixels: max bbox height over frames [frame_num-20, frame_num+50)
+        max_player_heights_in_pixels = np.empty(len(frame_idx))
+        player_heights_in_meters = np.empty(len(frame_idx))
+        for player_id in player_boxes.get_track_ids().tolist():
+            player_rows = player_ids == player_id
+            player_bbox_heights = get_height_of_bbox(player_boxes.get_track_bboxes(player_id).T)
+            max_player_heights_in_pixels[player_rows] = sliding_window_max(player_bbox_heights, 20, 50)[frame_idx[player_rows]]
+            player_heights_in_meters[player_rows] = player_heights[player_id]
 
-        output_player_boxes= []
-        output_ball_boxes= []
-
-        for frame_num, player_bbox in enumerate(player_boxes):
-            ball_box = ball_boxes[frame_num][1]
-            ball_position = get_center_of_bbox(ball_box)
-            closest_player_id_to_ball = min(player_bbox.keys(), key=lambda x: measure_distance(ball_position, get_center_of_bbox(player_bbox[x])))
-
-            output_player_bboxes_dict = {}
-            for player_id, bbox in player_bbox.items():
-                foot_position = get_foot_position(bbox)
-
-                # Get The closest keypoint in pixels
-                closest_key_point_index = get_closest_keypoint_index(foot_position,original_court_key_points, [0,2,12,13])
-                closest_key_point = (original_court_key_points[closest_key_point_index*2], 
-                                     original_court_key_points[closest_key_point_index*2+1])
-
-                # Get Player height in pixels
-                frame_index_min = max(0, frame_num-20)
-                frame_index_max = min(len(player_boxes), frame_num+50)
-                bboxes_heights_in_pixels = [get_height_of_bbox(player_boxes[i][player_id]) for i in range (frame_index_min,frame_index_max)]
-                max_player_height_in_pixels = max(bboxes_heights_in_pixels)
-
-                mini_court_player_position = self.get_mini_court_coordinates(foot_position,
-                                                                            closest_key_point, 
-                                                                            closest_key_point_index, 
-                                                                            max_player_height_in_pixels,
-                                                                            player_heights[player_id]
-                                                                            )
-                
-                output_player_bboxes_dict[player_id] = mini_court_player_position
-
-                if closest_player_id_to_ball == player_id:
-                    # Get The closest keypoint in pixels
-                    closest_key_point_index = get_closest_keypoint_index(ball_position,original_court_key_points, [0,2,12,13])
-                    closest_key_point = (original_court_key_points[closest_key_point_index*2], 
-                                        original_court_key_points[closest_key_point_index*2+1])
-                    
-                    mini_court_player_position = self.get_mini_court_coordinates(ball_position,
-                                                                            closest_key_point, 
-                                                                            closest_key_point_index, 
-                                                                            max_player_height_in_pixels,
-                                                                            player_heights[player_id]
-                                                                            )
-                    output_ball_boxes.append({1:mini_court_player_position})
-            output_player_boxes.append(output_player_bboxes_dict)
+        # Players are projected from their foot position
+        foot_positions = np.stack([np.trunc((bboxes[:, 0] + bboxes[:, 2])/2), bboxes[:, 3]], axis=1)
+        player_key_points = original_court_key_points[frame_idx] if per_frame_key_points else original_court_key_points
+        closest_key_point_indices = get_closest_keypoint_indices(foot_positions, player_key_points, key_point_indices)
+        closest_key_points = get_keypoints_at_indices(player_key_points, closest_key_point_indices)
+        player_positions = self.get_mini_court_coordinates_array(foot_positions,
+                                                                 closest_key_points,
+                                                                 closest_key_point_indices,
+                                                                 max_player_heights_in_pixels,
+                                                                 player_heights_in_meters
+                                                                 )
+
+        # The ball is projected with the height of the player closest to it in each frame
+        ball_centers = np.trunc((ball_bboxes[:, 0:2] + ball_bboxes[:, 2:4])/2)
+        player_centers = np.trunc((bboxes[:, 0:2] + bboxes[:, 2:4])/2)
+        ball_distances = np.sum((ball_centers[frame_idx] - player_centers)**2, axis=1)**0.5
+
+        frames_with_players = np.unique(frame_idx)
+        min_ball_distances = np.minimum.reduceat(ball_distances, player_boxes.frame_offsets[frames_with_players]) if len(frame_idx) else ball_distances
+        closest_rows = np.flatnonzero(ball_distances == min_ball_distances[np.searchsorted(frames_with_players, frame_idx)])
+        # first player of the frame on ties, like min() over the frame dict
+        _, first_rows = np.unique(frame_idx[closest_rows], return_index=True)
+        closest_rows = closest_rows[first_rows]
+
+        ball_frame_idx = frame_idx[closest_rows]
+        ball_positions = ball_centers[ball_frame_idx]
+        ball_frame_key_points = original_court_key_points[ball_frame_idx] if per_frame_key_points else original_court_key_points
+        ball_key_point_indices = get_closest_keypoint_indices(ball_positions, ball_frame_key_points, key_point_indices)
+        ball_key_points = get_keypoints_at_indices(ball_frame_key_points, ball_key_point_indices)
+        ball_positions = self.get_mini_court_coordinates_array(ball_positions,
+                                                               ball_key_points,
+                                                               ball_key_point_indices,
+                                                               max_player_heights_in_pixels[closest_rows],
+                                                               player_heights_in_meters[closest_rows]
+                                                               )
+
+        output_player_boxes = Detections(frame_idx, player_ids, player_positions, number_of_frames, width=2)
+        output_ball_boxes = Detections(ball_frame_idx, np.ones(len(ball_frame_idx)), ball_positions, number_of_frames, width=2)
+
+        return output_player_boxes , output_ball_boxes
+
+    def project_points(self, points, frame_idx, court_key_points):
+        # Homography projection with one set of keypoints or one row of keypoints per frame
+        court_key_points = np.asarray(court_key_points, dtype=np.float64)
+        if court_key_points.ndim == 2:
+            return self.court_projector.project_points_per_frame(points, frame_idx, court_key_points)
+        return self.court_projector.project_points(points, court_key_points)
+
+    def convert_bounding_boxes_to_mini_court_coordinates_with_homography(self,player_boxes, ball_boxes, original_court_key_points):
+        player_boxes = as_detections(player_boxes)
+        ball_boxes = as_detections(ball_boxes)
+        number_of_frames = len(player_boxes)
+
+        # Players are projected from their foot position
+        bboxes = player_boxes.bboxes
+        foot_positions = np.stack([np.trunc((bboxes[:, 0] + bboxes[:, 2])/2), bboxes[:, 3]], axis=1)
+        player_positions = self.project_points(foot_positions, player_boxes.frame_idx, original_court_key_points)
+
+        # Ball centers of the frames where the ball position is known
+        ball_frame_idx, ball_bboxes = ball_boxes.get_track(1)
+        known_ball = ~np.isnan(ball_bboxes).any(axis=1)
+        ball_frame_idx, ball_bboxes = ball_frame_idx[known_ball], ball_bboxes[known_ball]
+        ball_centers = np.trunc((ball_bboxes[:, 0:2] + ball_bboxes[:, 2:4])/2)
+        ball_positions = self.project_points(ball_centers, ball_frame_idx, original_court_key_points)
+
+        output_player_boxes = Detections(player_boxes.frame_idx, player_boxes.track_id, player_positions, number_of_frames, width=2)
+        output_ball_boxes = Detections(ball_frame_idx, np.ones(len(ball_frame_idx)), ball_positions, number_of_frames, width=2)
 
         return output_player_boxes , output_ball_boxes
     
     def draw_points_on_mini_court(self,frames,postions, color=(0,255,0)):
+        postions = as_detections(postions, width=2)
+        output_frames = []
         for frame_num, frame in enumerate(frames):
-            for _, position in postions[frame_num].items():
-                x,y = position
-                x= int(x)
-                y= int(y)
-                cv2.circle(frame, (x,y), 5, color, -1)
-        return frames
\ No newline at end of file
+            output_frames.append(self.draw_points_on_mini_court_frame(get_writable_frame(frame), postions.get_frame(frame_num)[1], color))
+        return output_frames
+
+    def draw_points_on_mini_court_frame(self,frame,positions, color=(0,255,0)):
+        # positions: (N, 2) array of mini court x, y
+        for position in positions:
+            x,y = position
+            x= int(x)
+            y= int(y)
+            cv2.circle(frame, (x,y), 5, color, -1)
+        return frame
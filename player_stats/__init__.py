@@ -0,0 +1 @@
+from .player_stats import PlayerStats, PLAYER_STATS_COLUMNS, get_player_stats, LivePlayerStats
\ No newline at end of file
@@ -0,0 +1,191 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append('../')
+import constants
+from utils import convert_pixel_distance_to_meters, measure_distance, as_detections, timed
+
+PLAYER_IDS = (1, 2)
+
+PLAYER_STATS_COLUMNS = [
+    'player_1_number_of_shots',
+    'player_1_total_shot_speed',
+    'player_1_last_shot_speed',
+    'player_1_total_player_speed',
+    'player_1_last_player_speed',
+
+    'player_2_number_of_shots',
+    'player_2_total_shot_speed',
+    'player_2_last_shot_speed',
+    'player_2_total_player_speed',
+    'player_2_last_player_speed',
+
+    'player_1_average_shot_speed',
+    'player_2_average_shot_speed',
+    'player_1_average_player_speed',
+    'player_2_average_player_speed',
+]
+
+
+class PlayerStats:
+    # Stats shown on every frame as one (number_of_frames, len(PLAYER_STATS_COLUMNS)) float64
+    # array, row i holds the stats after the last shot that started at or before frame i.
+    # Indexing with a frame number returns the {column: value} row the drawer expects.
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, frame_num):
+        return dict(zip(PLAYER_STATS_COLUMNS, self.values[frame_num].tolist()))
+
+    def to_dataframe(self):
+        # The frame_num + stats columns table main.py used to build with pandas
+        player_stats_data_df = pd.DataFrame(self.values, columns=PLAYER_STATS_COLUMNS)
+        player_stats_data_df.insert(0, 'frame_num', np.arange(len(self.values)))
+        return player_stats_data_df
+
+
+def forward_fill_last(values, mask):
+    # values[j] for the last j <= i where mask[j], 0 before the first one
+    last_index = np.maximum.accumulate(np.where(mask, np.arange(len(values)), -1)) if len(values) else np.zeros(0, dtype=int)
+    return np.where(last_index >= 0, values[np.maximum(last_index, 0)], 0.0)
+
+
+def set_averages(stats):
+    # Average columns of one stats row or of an array of rows, in place.
+    # Each player's speed is averaged over the shots of the other player.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats[..., 10] = stats[..., 1]/stats[..., 0]
+        stats[..., 11] = stats[..., 6]/stats[..., 5]
+        stats[..., 12] = stats[..., 3]/stats[..., 5]
+        stats[..., 13] = stats[..., 8]/stats[..., 0]
+
+
+def get_speeds_km_h(start_positions, end_positions, seconds, mini_court_width):
+    # Same operation order as measure_distance and convert_pixel_distance_to_meters
+    distance_pixels = ((start_positions[:, 0]-end_positions[:, 0])**2 + (start_positions[:, 1]-end_positions[:, 1])**2)**0.5
+    distance_meters = convert_pixel_distance_to_meters(distance_pixels, constants.DOUBLE_LINE_WIDTH, mini_court_width)
+    return distance_meters/seconds * 3.6
+
+
+@timed('player_stats')
+def get_player_stats(ball_shot_frames, ball_mini_court_detections, player_mini_court_detections, mini_court, number_of_frames, fps=24):
+    # Every shot runs from a shot frame to the next one: the ball speed goes to the player
+    # closest to the ball when it was hit, the distance the opponent covered meanwhile to
+    # the opponent. Columns are computed per shot and expanded to frames with one lookup.
+    ball_mini_court_detections = as_detections(ball_mini_court_detections, width=2)
+    player_mini_court_detections = as_detections(player_mini_court_detections, width=2)
+
+    shot_frames = np.asarray(ball_shot_frames, dtype=np.int64)
+    shot_frames = shot_frames[shot_frames < min(number_of_frames, len(ball_mini_court_detections))]
+    start_frames = shot_frames[:-1]
+    end_frames = shot_frames[1:]
+    seconds = (end_frames-start_frames)/fps
+    mini_court_width = mini_court.get_width_of_mini_court()
+
+    # Dense (number_of_frames, 2) positions, NaN where missing
+    ball_positions = ball_mini_court_detections.get_track_bboxes(1)
+    player_positions = np.stack([player_mini_court_detections.get_track_bboxes(player_id) for player_id in PLAYER_IDS])
+
+    shot_speeds = get_speeds_km_h(ball_positions[start_frames], ball_positions[end_frames], seconds, mini_court_width)
+
+    # Player who hit the ball is the one closest to it
+    ball_distances = ((player_positions[:, start_frames, 0]-ball_positions[start_frames, 0])**2 +
+                      (player_positions[:, start_frames, 1]-ball_positions[start_frames, 1])**2)**0.5
+    ball_distances = np.where(np.isnan(ball_distances), np.inf, ball_distances)
+    # on a tie the first player of the frame, like min() over the frame dict
+    first_players = np.zeros(len(start_frames), dtype=int)
+    if len(player_mini_court_detections.track_id):
+        first_rows = np.minimum(player_mini_court_detections.frame_offsets[start_frames], len(player_mini_court_detections.track_id)-1)
+        first_players = (player_mini_court_detections.track_id[first_rows] == PLAYER_IDS[1]).astype(int)
+    hitters = np.where(ball_distances[0] < ball_distances[1], 0, np.where(ball_distances[1] < ball_distances[0], 1, first_players))
+    opponents = 1 - hitters
+
+    # Shots without a ball or any player position are left out
+    valid_shots = np.isfinite(ball_distances.min(axis=0)) & ~np.isnan(shot_speeds)
+    start_frames, hitters, opponents = start_frames[valid_shots], hitters[valid_shots], opponents[valid_shots]
+    shot_speeds, seconds, end_frames = shot_speeds[valid_shots], seconds[valid_shots], end_frames[valid_shots]
+
+    opponent_speeds = get_speeds_km_h(player_positions[opponents, start_frames], player_positions[opponents, end_frames], seconds, mini_court_width)
+    known_opponent_speeds = ~np.isnan(opponent_speeds)
+
+    # One row per shot plus the row of zeros before the first shot
+    shot_stats = np.zeros((len(start_frames)+1, len(PLAYER_STATS_COLUMNS)))
+    for player_index in range(len(PLAYER_IDS)):
+        hit = hitters == player_index
+        ran = (opponents == player_index) & known_opponent_speeds
+        columns = slice(player_index*5, player_index*5+5)
+        shot_stats[1:, columns] = np.stack([np.cumsum(hit),
+                                            np.cumsum(np.where(hit, shot_speeds, 0.0)),
+                                            forward_fill_last(shot_speeds, hit),
+                                            np.cumsum(np.where(ran, opponent_speeds, 0.0)),
+                                            forward_fill_last(opponent_speeds, ran)], axis=1)
+
+    set_averages(shot_stats)
+
+    # Row of the last shot started at or before each frame
+    frame_shots = np.searchsorted(start_frames, np.arange(number_of_frames), side='right')
+    return PlayerStats(shot_stats[frame_shots])
+
+
+class LivePlayerStats:
+    # get_player_stats for live feeds with O(1) work per frame. Positions come in one
+    # frame at a time and shots as the online shot detector reports them, a few frames
+    # late: the last `history` frames are kept so the positions at the shot frame can
+    # still be looked up. A shot's speeds need the next shot, so the stats row changes
+    # when the next shot is reported.
+    def __init__(self, mini_court_width, fps=24, history=64):
+        self.mini_court_width = mini_court_width
+        self.fps = fps
+        # (player positions {player_id: (x, y)}, ball position (x, y) or None) per frame
+        self.frames = deque(maxlen=history)
+        self.number_of_frames = 0
+        self.last_shot = None
+        self.values = np.zeros(len(PLAYER_STATS_COLUMNS))
+        set_averages(self.values)
+
+    def add_frame(self, player_positions, ball_position):
+        self.frames.append((player_positions, ball_position))
+        self.number_of_frames += 1
+
+    def add_shot(self, frame_num):
+        frame_index = frame_num - (self.number_of_frames - len(self.frames))
+        if not 0 <= frame_index < len(self.frames):
+            raise ValueError(f"Shot frame {frame_num} is not in the last {len(self.frames)} frames, increase history")
+        shot = (frame_num,) + self.frames[frame_index]
+        if self.last_shot is not None:
+            self.add_shot_stats(self.last_shot, shot)
+        self.last_shot = shot
+
+    def add_shot_stats(self, start_shot, end_shot):
+        start_frame, start_player_positions, start_ball_position = start_shot
+        end_frame, end_player_positions, end_ball_position = end_shot
+        start_player_positions = {player_id: position for player_id, position in start_player_positions.items() if player_id in PLAYER_IDS}
+        # Shots without a ball or any player position are left out, like get_player_stats
+        if start_ball_position is None or end_ball_position is None or not start_player_positions:
+            return
+        seconds = (end_frame-start_frame)/self.fps
+        shot_speed = get_speeds_km_h(np.array([start_ball_position]), np.array([end_ball_position]), seconds, self.mini_court_width)[0]
+
+        player_shot_ball = min(start_player_positions.keys(), key=lambda player_id: measure_distance(start_player_positions[player_id], start_ball_position))
+        hitter_columns = PLAYER_IDS.index(player_shot_ball)*5
+        self.values[hitter_columns] += 1
+        self.values[hitter_columns+1] += shot_speed
+        self.values[hitter_columns+2] = shot_speed
+
+        opponent_player_id = 1 if player_shot_ball == 2 else 2
+        if opponent_player_id in start_player_positions and opponent_player_id in end_player_positions:
+            opponent_speed = get_speeds_km_h(np.array([start_player_positions[opponent_player_id]]),
+                                             np.array([end_player_positions[opponent_player_id]]),
+                                             seconds, self.mini_court_width)[0]
+            opponent_columns = PLAYER_IDS.index(opponent_player_id)*5
+            self.values[opponent_columns+3] += opponent_speed
+            self.values[opponent_columns+4] = opponent_speed
+        set_averages(self.values)
+
+    def get_row(self):
+        # Current stats in the {column: value} form draw_player_stats_on_frame takes
+        return dict(zip(PLAYER_STATS_COLUMNS, self.values.tolist()))
@@ -1,2 +1,6 @@
 from .player_tracker import PlayerTracker
-from .ball_tracker import BallTracker
\ No newline at end of file
+from .ball_tracker import BallTracker
+from .sharded_detector import ShardedDetector
+from .online_ball_tracker import OnlineBallTrack, OnlineShotDetector
+from .frame_stride import StrideScheduler, FILL_METHODS, fill_skipped_frames, detections_from_keyframes
+from .ball_roi import BallROI
\ No newline at end of file
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class BallROI:
+    # Where the ball model looks in the next frame. The ball moves little from one frame
+    # to the next, so once it was found the model only gets a size x size crop around
+    # the position predicted from the last two detections (constant velocity). After
+    # max_misses frames in a row without the ball the whole frame is searched again,
+    # until it is found. Frames must come in order, one update() per frame.
+    def __init__(self, size=320, max_misses=3):
+        self.size = size
+        self.max_misses = max_misses
+        self.reset()
+
+    def reset(self):
+        # (frame_num, center) of the last two detections
+        self.centers = []
+        self.frame_num = 0
+        self.misses = 0
+        self.crop_searches = 0
+        self.full_searches = 0
+
+    def predict_center(self):
+        last_frame_num, last_center = self.centers[-1]
+        if len(self.centers) < 2:
+            return last_center
+        previous_frame_num, previous_center = self.centers[-2]
+        velocity = (last_center - previous_center) / (last_frame_num - previous_frame_num)
+        return last_center + velocity*(self.frame_num - last_frame_num)
+
+    def get_crop(self, frame_shape):
+        # (x1, y1, x2, y2) to search in the next frame, None for the whole frame
+        height, width = frame_shape[:2]
+        if not self.centers or self.misses >= self.max_misses or (self.size >= width and self.size >= height):
+            self.full_searches += 1
+            return None
+        self.crop_searches += 1
+        center_x, center_y = self.predict_center()
+        # Shifted to stay inside the frame
+        x1 = int(round(min(max(center_x - self.size/2, 0), max(width - self.size, 0))))
+        y1 = int(round(min(max(center_y - self.size/2, 0), max(height - self.size, 0))))
+        return x1, y1, min(x1 + self.size, width), min(y1 + self.size, height)
+
+    def update(self, bbox):
+        # Ball box of the frame just searched in frame coordinates, None when not found
+        if bbox is None:
+            self.misses += 1
+        else:
+            center = np.array([(bbox[0]+bbox[2])/2, (bbox[1]+bbox[3])/2])
+            if self.misses >= self.max_misses:
+                # Found again by a full search, the old velocity says nothing anymore
+                self.centers = []
+            self.centers = self.centers[-1:] + [(self.frame_num, center)]
+            self.misses = 0
+        self.frame_num += 1
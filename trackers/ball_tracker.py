@@ -1,79 +1,177 @@
-from ultralytics import YOLO 
 import cv2
-import pickle
 import pandas as pd
-
-class BallTracker:
-    def __init__(self,model_path):
-        self.model = YOLO(model_path)
-
+import numpy as np
+import sys
+sys.path.append('../')
+from .frame_stride import FrameStrideMixin, detections_from_keyframes
+from .ball_roi import BallROI
+from inference import BackendMixin, load_yolo_model
+from utils import read_stub, save_stub, iter_frame_windows, Detections, as_detections, profile_stage, timed, get_writable_frame
+
+class BallTracker(BackendMixin, FrameStrideMixin):
+    def __init__(self,model_path, conf=0.15, stride=1, motion_threshold=None, fill_method='linear', roi_size=None, roi_max_misses=3, roi_imgsz=None,
+                 backend='torch', quantization=None, server=None):
+        self.model_path = model_path
+        self.conf = conf
+        self.init_backend(backend, quantization, server)
+        self.model = load_yolo_model(model_path, backend, quantization, server=server)
+        self.init_stride(stride, motion_threshold, fill_method)
+        # With roi_size, search a roi_size crop around the predicted ball position, run
+        # at roi_imgsz (roi_size by default, larger for a higher effective resolution)
+        self.roi = BallROI(roi_size, roi_max_misses) if roi_size is not None else None
+        self.roi_imgsz = roi_imgsz if roi_imgsz is not None else roi_size
+
+    @timed('ball_tracker.interpolate')
     def interpolate_ball_positions(self, ball_positions):
-        ball_positions = [x.get(1,[]) for x in ball_positions]
-        # convert the list into pandas dataframe
-        df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
+        ball_positions = as_detections(ball_positions)
+        # convert the ball track into pandas dataframe, NaN where the ball was not detected
+        df_ball_positions = pd.DataFrame(ball_positions.get_track_bboxes(1),columns=['x1','y1','x2','y2'])
 
         # interpolate the missing values
         df_ball_positions = df_ball_positions.interpolate()
         df_ball_positions = df_ball_positions.bfill()
 
-        ball_positions = [{1:x} for x in df_ball_positions.to_numpy().tolist()]
+        number_of_frames = len(df_ball_positions)
+        ball_positions = Detections(np.arange(number_of_frames), np.ones(number_of_frames), df_ball_positions.to_numpy(), number_of_frames)
 
         return ball_positions
 
+    @timed('ball_tracker.shot_frames')
     def get_ball_shot_frames(self,ball_positions):
-        ball_positions = [x.get(1,[]) for x in ball_positions]
-        # convert the list into pandas dataframe
-        df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
-
-        df_ball_positions['ball_hit'] = 0
+        ball_positions = as_detections(ball_positions)
+        # convert the ball track into pandas dataframe
+        df_ball_positions = pd.DataFrame(ball_positions.get_track_bboxes(1),columns=['x1','y1','x2','y2'])
 
         df_ball_positions['mid_y'] = (df_ball_positions['y1'] + df_ball_positions['y2'])/2
         df_ball_positions['mid_y_rolling_mean'] = df_ball_positions['mid_y'].rolling(window=5, min_periods=1, center=False).mean()
         df_ball_positions['delta_y'] = df_ball_positions['mid_y_rolling_mean'].diff()
-        minimum_change_frames_for_hit = 25
-        for i in range(1,len(df_ball_positions)- int(minimum_change_frames_for_hit*1.2) ):
-            negative_position_change = df_ball_positions['delta_y'].iloc[i] >0 and df_ball_positions['delta_y'].iloc[i+1] <0
-            positive_position_change = df_ball_positions['delta_y'].iloc[i] <0 and df_ball_positions['delta_y'].iloc[i+1] >0
-
-            if negative_position_change or positive_position_change:
-                change_count = 0 
-                for change_frame in range(i+1, i+int(minimum_change_frames_for_hit*1.2)+1):
-                    negative_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] >0 and df_ball_positions['delta_y'].iloc[change_frame] <0
-                    positive_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] <0 and df_ball_positions['delta_y'].iloc[change_frame] >0
-
-                    if negative_position_change and negative_position_change_following_frame:
-                        change_count+=1
-                    elif positive_position_change and positive_position_change_following_frame:
-                        change_count+=1
-            
-                if change_count>minimum_change_frames_for_hit-1:
-                    df_ball_positions['ball_hit'].iloc[i] = 1
-
-        frame_nums_with_ball_hits = df_ball_positions[df_ball_positions['ball_hit']==1].index.tolist()
+
+        return self.get_ball_shot_frames_from_delta_y(df_ball_positions['delta_y'].to_numpy())
+
+    def get_ball_shot_frames_from_delta_y(self, delta_y, minimum_change_frames_for_hit=25):
+        # A frame i is a hit when the ball changes vertical direction between i and i+1
+        # and the new direction holds for at least minimum_change_frames_for_hit of the
+        # following int(minimum_change_frames_for_hit*1.2) frames.
+        # The window counts come from cumulative sums, so this is O(n) in NumPy.
+        change_window = int(minimum_change_frames_for_hit*1.2)
+        number_of_frames = len(delta_y)
+        last_frame = number_of_frames - change_window
+        if last_frame <= 1:
+            return []
+
+        # NaN compares False, same as in the DataFrame comparisons
+        with np.errstate(invalid='ignore'):
+            moving_down = delta_y > 0
+            moving_up = delta_y < 0
+
+        # count of frames moving up/down in delta_y[i+1 : i+change_window+1]
+        moving_up_cumsum = np.concatenate(([0], np.cumsum(moving_up)))
+        moving_down_cumsum = np.concatenate(([0], np.cumsum(moving_down)))
+        frames = np.arange(1, last_frame)
+        moving_up_count = moving_up_cumsum[frames+change_window+1] - moving_up_cumsum[frames+1]
+        moving_down_count = moving_down_cumsum[frames+change_window+1] - moving_down_cumsum[frames+1]
+
+        negative_position_change = moving_down[frames] & moving_up[frames+1]
+        positive_position_change = moving_up[frames] & moving_down[frames+1]
+
+        ball_hit = (negative_position_change & (moving_up_count > minimum_change_frames_for_hit-1)) | \
+                   (positive_position_change & (moving_down_count > minimum_change_frames_for_hit-1))
+
+        frame_nums_with_ball_hits = frames[ball_hit].tolist()
 
         return frame_nums_with_ball_hits
 
-    def detect_frames(self,frames, read_from_stub=False, stub_path=None):
+    def get_inference_params(self):
+        # Everything besides the video and the weights that changes the detections
+        return dict({'tracker': 'ball', 'mode': 'predict', 'conf': self.conf}, **self.get_backend_params(), **self.get_stride_params(), **self.get_roi_params())
+
+    def get_options(self):
+        # Keyword arguments that rebuild this tracker, e.g. in another process
+        return dict({'conf': self.conf}, **self.get_backend_options(), **self.get_stride_options(), **self.get_roi_options())
+
+    def get_roi_options(self):
+        if self.roi is None:
+            return {'roi_size': None}
+        return {'roi_size': self.roi.size, 'roi_max_misses': self.roi.max_misses, 'roi_imgsz': self.roi_imgsz}
+
+    def get_roi_params(self):
+        return self.get_roi_options() if self.roi is not None else {}
+
+    def get_cache_key(self, cache, video_path):
+        return cache.get_key(video_path, self.model_path, self.get_inference_params())
+
+    def detect_frames(self,frames, read_from_stub=False, stub_path=None, batch_size=1, cache=None, video_path=None):
         ball_detections = []
 
         if read_from_stub and stub_path is not None:
-            with open(stub_path, 'rb') as f:
-                ball_detections = pickle.load(f)
-            return ball_detections
+            return as_detections(read_stub(stub_path))
+
+        use_cache = cache is not None and video_path is not None
+        if use_cache:
+            cache_key = self.get_cache_key(cache, video_path)
+            cached_detections = cache.load(cache_key)
+            if cached_detections is not None:
+                return cached_detections
+
+        with profile_stage('ball_tracker.detect', frames=len(frames)):
+            # With a stride only some of the frames go through the model
+            detection_frames = self.stride_scheduler.get_detection_frames(len(frames), frames)
+            if self.stride_scheduler.is_enabled():
+                frames_to_detect = [frames[frame_num] for frame_num in detection_frames]
+            else:
+                frames_to_detect = frames
+            # Each ROI crop depends on the detection before, so that mode goes frame by frame
+            if batch_size > 1 and self.roi is None:
+                for frames_batch in iter_frame_windows(frames_to_detect, batch_size):
+                    ball_detections.extend(self.detect_batch(frames_batch))
+            else:
+                for frame in frames_to_detect:
+                    player_dict = self.detect_frame(frame)
+                    ball_detections.append(player_dict)
+
+        if self.stride_scheduler.is_enabled():
+            # The skipped frames get boxes from the detected frames around them
+            ball_detections = detections_from_keyframes(ball_detections, detection_frames, len(frames), self.fill_method).to_list()
 
-        for frame in frames:
-            player_dict = self.detect_frame(frame)
-            ball_detections.append(player_dict)
-        
         if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(ball_detections, f)
+            save_stub(ball_detections, stub_path)
+
+        ball_detections = Detections.from_list(ball_detections)
+
+        if use_cache:
+            cache.save(cache_key, ball_detections)
         
         return ball_detections
 
     def detect_frame(self,frame):
-        results = self.model.predict(frame,conf=0.15)[0]
+        if self.roi is not None:
+            return self.detect_frame_roi(frame)
+        results = self.model.predict(frame,conf=self.conf)[0]
+        return self.get_ball_dict(results)
+
+    def detect_frame_roi(self, frame):
+        crop = self.roi.get_crop(frame.shape)
+        if crop is None:
+            ball_dict = self.get_ball_dict(self.model.predict(frame,conf=self.conf)[0])
+        else:
+            x1, y1, x2, y2 = crop
+            results = self.model.predict(np.ascontiguousarray(frame[y1:y2, x1:x2]),conf=self.conf,imgsz=self.roi_imgsz)[0]
+            # crop to frame coordinates
+            ball_dict = {track_id: [bbox[0]+x1, bbox[1]+y1, bbox[2]+x1, bbox[3]+y1] for track_id, bbox in self.get_ball_dict(results).items()}
+        self.roi.update(ball_dict.get(1))
+        return ball_dict
+
+    def reset_tracking(self):
+        # The ROI search starts over, e.g. on another video
+        if self.roi is not None:
+            self.roi.reset()
 
+    def detect_batch(self,frames):
+        # One model call for the whole batch
+        results_batch = self.model.predict(list(frames),conf=self.conf)
+        return [self.get_ball_dict(results) for results in results_batch]
+
+    def get_ball_dict(self,results):
         ball_dict = {}
         for box in results.boxes:
             result = box.xyxy.tolist()[0]
@@ -82,16 +180,21 @@ class BallTracker:
         return ball_dict
 
     def draw_bboxes(self,video_frames, player_detections):
+        player_detections = as_detections(player_detections)
         output_video_frames = []
-        for frame, ball_dict in zip(video_frames, player_detections):
-            # Draw Bounding Boxes
-            for track_id, bbox in ball_dict.items():
-                x1, y1, x2, y2 = bbox
-                cv2.putText(frame, f"Ball ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 2)
+        for frame, frame_num in zip(video_frames, range(len(player_detections))):
+            frame = self.draw_bboxes_on_frame(get_writable_frame(frame), *player_detections.get_frame(frame_num))
             output_video_frames.append(frame)
         
         return output_video_frames
 
+    def draw_bboxes_on_frame(self, frame, track_ids, bboxes):
+        # Draw Bounding Boxes
+        for track_id, bbox in zip(track_ids, bboxes):
+            x1, y1, x2, y2 = bbox
+            cv2.putText(frame, f"Ball ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 2)
+        return frame
+
 
     
\ No newline at end of file
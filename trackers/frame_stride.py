@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import Detections
+
+FILL_METHODS = ('linear', 'constant_velocity')
+
+
+class StrideScheduler:
+    # Which frames the detector runs on: the first frame of every call, then every
+    # `stride` frames. With motion_threshold set, also earlier when the frame differs
+    # enough from the last detected one: mean absolute difference of grayscale
+    # thumbnails (0-255), as for the court keypoint scene changes.
+    def __init__(self, stride=1, motion_threshold=None, thumbnail_size=(64, 36)):
+        self.stride = stride
+        self.motion_threshold = motion_threshold
+        self.thumbnail_size = thumbnail_size
+
+    def is_enabled(self):
+        return self.stride > 1 or self.motion_threshold is not None
+
+    def get_thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def get_detection_frames(self, number_of_frames, frames=None):
+        # Sorted frame numbers to detect; frames are only looked at with motion_threshold
+        if self.motion_threshold is None:
+            return np.arange(0, number_of_frames, max(self.stride, 1))
+
+        detection_frames = []
+        reference_thumbnail = None
+        for frame_num in range(number_of_frames):
+            thumbnail = self.get_thumbnail(frames[frame_num])
+            detect = reference_thumbnail is None or frame_num - detection_frames[-1] >= self.stride
+            if not detect:
+                detect = float(np.mean(np.abs(thumbnail - reference_thumbnail))) > self.motion_threshold
+            if detect:
+                detection_frames.append(frame_num)
+                reference_thumbnail = thumbnail
+        return np.array(detection_frames, dtype=np.int64)
+
+
+class FrameStrideMixin:
+    # Stride settings shared by PlayerTracker and BallTracker: detect every stride-th
+    # frame (or on motion) and fill in the others with fill_method
+    def init_stride(self, stride=1, motion_threshold=None, fill_method='linear'):
+        self.stride_scheduler = StrideScheduler(stride, motion_threshold)
+        self.fill_method = fill_method
+
+    def get_stride_options(self):
+        return {'stride': self.stride_scheduler.stride, 'motion_threshold': self.stride_scheduler.motion_threshold, 'fill_method': self.fill_method}
+
+    def get_stride_params(self):
+        # Nothing without a stride: detecting every frame gives the detections cached
+        # before strides existed, those entries stay valid
+        return self.get_stride_options() if self.stride_scheduler.is_enabled() else {}
+
+
+def fill_skipped_frames(detections, detection_frames, method='linear'):
+    # Boxes for the frames the detector skipped, per track:
+    #   linear            between two detected frames that both have the track, the box
+    #                     moves linearly from one to the other; otherwise (the track is
+    #                     lost at the next detected frame, or after the last one) it keeps
+    #                     the velocity it had between the previous two detected frames
+    #   constant_velocity always the latter, which only looks back (usable live)
+    # A track with a single detected frame so far stays where it is. detections holds
+    # the rows of the detected frames only.
+    if method not in FILL_METHODS:
+        raise ValueError(f"Unknown fill method {method}, expected one of {FILL_METHODS}")
+    detection_frames = np.asarray(detection_frames, dtype=np.int64)
+    number_of_frames = detections.number_of_frames
+    number_of_keyframes = len(detection_frames)
+
+    frame_idx = [detections.frame_idx]
+    track_id = [detections.track_id]
+    bboxes = [detections.bboxes]
+    for detection_id in detections.get_track_ids().tolist():
+        track_frames, track_bboxes = detections.get_track(detection_id)
+        # Box at every detected frame, NaN where the track was not detected
+        keyframe_indices = np.searchsorted(detection_frames, track_frames)
+        keyframe_bboxes = np.full((number_of_keyframes, detections.width), np.nan)
+        keyframe_bboxes[keyframe_indices] = track_bboxes
+
+        # Skipped frames from the first detection of the track to the next detected frame after its last one
+        first_keyframe, last_keyframe = keyframe_indices[0], keyframe_indices[-1]
+        end_frame = detection_frames[last_keyframe+1] if last_keyframe+1 < number_of_keyframes else number_of_frames
+        frames = np.arange(detection_frames[first_keyframe], end_frame)
+        previous_keyframes = np.searchsorted(detection_frames, frames, side='right') - 1
+        skipped = detection_frames[previous_keyframes] != frames
+        frames, previous_keyframes = frames[skipped], previous_keyframes[skipped]
+        start_bboxes = keyframe_bboxes[previous_keyframes]
+        known = ~np.isnan(start_bboxes[:, 0])
+        frames, previous_keyframes, start_bboxes = frames[known], previous_keyframes[known], start_bboxes[known]
+        if len(frames) == 0:
+            continue
+        frames_after_keyframe = (frames - detection_frames[previous_keyframes])[:, None]
+
+        # Constant velocity from the two detected frames before, zero without an earlier one
+        before_keyframes = np.maximum(previous_keyframes-1, 0)
+        velocities = (start_bboxes - keyframe_bboxes[before_keyframes]) / np.maximum(detection_frames[previous_keyframes] - detection_frames[before_keyframes], 1)[:, None]
+        velocities[np.isnan(velocities)] = 0.0
+        filled_bboxes = start_bboxes + velocities*frames_after_keyframe
+
+        if method == 'linear':
+            next_keyframes = np.minimum(previous_keyframes+1, number_of_keyframes-1)
+            end_bboxes = keyframe_bboxes[next_keyframes]
+            between = (next_keyframes > previous_keyframes) & ~np.isnan(end_bboxes[:, 0])
+            fractions = frames_after_keyframe / np.maximum(detection_frames[next_keyframes] - detection_frames[previous_keyframes], 1)[:, None]
+            filled_bboxes[between] = (start_bboxes + (end_bboxes - start_bboxes)*fractions)[between]
+
+        frame_idx.append(frames)
+        track_id.append(np.full(len(frames), detection_id))
+        bboxes.append(filled_bboxes)
+
+    return Detections(np.concatenate(frame_idx), np.concatenate(track_id), np.concatenate(bboxes), number_of_frames, width=detections.width)
+
+
+def detections_from_keyframes(keyframe_detections, detection_frames, number_of_frames, method='linear'):
+    # keyframe_detections: {track_id: bbox} of each detected frame -> Detections of every frame
+    frame_idx = []
+    track_id = []
+    bboxes = []
+    for frame_num, detection_dict in zip(detection_frames, keyframe_detections):
+        for detection_id, bbox in detection_dict.items():
+            frame_idx.append(frame_num)
+            track_id.append(detection_id)
+            bboxes.append(bbox)
+    detections = Detections(frame_idx, track_id, bboxes, number_of_frames)
+    return fill_skipped_frames(detections, detection_frames, method)
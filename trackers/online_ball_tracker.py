@@ -0,0 +1,188 @@
+from collections import deque
+import numpy as np
+
+
+class RollingMean:
+    # Mean of the last `window` values with NaNs skipped, updated one value at a time
+    # exactly like pandas' rolling(window, min_periods=1).mean() (Kahan compensated
+    # running sum, constant windows return the value itself), so the online shot frames
+    # match get_ball_shot_frames. Follows roll_mean of pandas/_libs/window/aggregations.pyx
+    # as of pandas 3.0; benchmarks/bench_suite.py checks it against rolling().mean().
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.number_of_values = 0
+        self.sum = 0.0
+        self.negative_count = 0
+        self.add_compensation = 0.0
+        self.remove_compensation = 0.0
+        self.same_value_count = 0
+        self.previous_value = None
+
+    def add(self, value):
+        if self.previous_value is None:
+            self.previous_value = value
+        self.values.append(value)
+
+        if len(self.values) > self.window:
+            removed_value = self.values.popleft()
+            if removed_value == removed_value:
+                self.number_of_values -= 1
+                y = -removed_value - self.remove_compensation
+                t = self.sum + y
+                self.remove_compensation = t - self.sum - y
+                self.sum = t
+                if removed_value < 0:
+                    self.negative_count -= 1
+
+        if value == value:
+            self.number_of_values += 1
+            y = value - self.add_compensation
+            t = self.sum + y
+            self.add_compensation = t - self.sum - y
+            self.sum = t
+            if value < 0:
+                self.negative_count += 1
+            self.same_value_count = self.same_value_count + 1 if value == self.previous_value else 1
+            self.previous_value = value
+
+        if self.number_of_values == 0:
+            return np.nan
+        mean = self.sum / self.number_of_values
+        if self.same_value_count >= self.number_of_values:
+            return self.previous_value
+        if self.negative_count == 0 and mean < 0:
+            return 0.0
+        if self.negative_count == self.number_of_values and mean > 0:
+            return 0.0
+        return mean
+
+
+class OnlineBallTrack:
+    # Ball track of a live feed, built one detection at a time. A frame without a
+    # detection waits for the next one: a gap of up to max_gap frames is filled by linear
+    # interpolation and frames before the first detection get its box, like
+    # BallTracker.interpolate_ball_positions. Every frame comes out exactly max_gap
+    # frames after it went in (latency); in a longer gap the last position is held until
+    # the ball shows up again, and the track interpolates from there.
+    def __init__(self, max_gap=10):
+        self.max_gap = max_gap
+        # [frame_num, bbox or None] of the frames not out yet
+        self.pending = deque()
+        self.number_of_frames = 0
+        self.last_frame_num = None
+        self.last_bbox = None
+
+    @property
+    def latency(self):
+        return self.max_gap
+
+    def add(self, bbox):
+        # bbox of the next frame (x1, y1, x2, y2) or None when the ball was not detected.
+        # Returns the (frame_num, bbox) that are final now, bbox is NaN before the first detection.
+        frame_num = self.number_of_frames
+        self.number_of_frames += 1
+        if bbox is not None:
+            bbox = np.asarray(bbox, dtype=np.float64)
+            self.fill_gap(frame_num, bbox)
+            self.last_frame_num, self.last_bbox = frame_num, bbox
+        self.pending.append([frame_num, bbox])
+
+        output = []
+        while len(self.pending) > self.max_gap:
+            output.append(self.pop())
+        return output
+
+    def flush(self):
+        # End of the feed: the frames still waiting, a gap at the end keeps the last position
+        output = []
+        while self.pending:
+            output.append(self.pop())
+        return output
+
+    def fill_gap(self, frame_num, bbox):
+        # The pending frames without a box are the last ones, all after last_frame_num
+        gap = []
+        for entry in reversed(self.pending):
+            if entry[1] is not None:
+                break
+            gap.append(entry)
+        if not gap:
+            return
+
+        if self.last_bbox is None:
+            for entry in gap:
+                entry[1] = bbox
+            return
+        gap_frames = np.array([entry[0] for entry in gap])
+        gap_bboxes = np.stack([np.interp(gap_frames, (self.last_frame_num, frame_num), (self.last_bbox[i], bbox[i]))
+                               for i in range(len(bbox))], axis=1)
+        for entry, gap_bbox in zip(gap, gap_bboxes):
+            entry[1] = gap_bbox
+
+    def pop(self):
+        frame_num, bbox = self.pending.popleft()
+        if bbox is None:
+            if self.last_bbox is None:
+                return frame_num, np.full(4, np.nan)
+            # Gap longer than max_gap: hold the last position and interpolate from here later
+            bbox = self.last_bbox
+            self.last_frame_num = frame_num
+        return frame_num, bbox
+
+
+class OnlineShotDetector:
+    # BallTracker.get_ball_shot_frames one ball box at a time, O(1) per frame. A frame is
+    # a hit when the ball changes vertical direction and keeps the new one for most of
+    # the next change_window = int(minimum_change_frames_for_hit*1.2) frames, so a hit
+    # is reported when the frame change_window frames after it comes in (latency).
+    def __init__(self, minimum_change_frames_for_hit=25):
+        self.minimum_change_frames_for_hit = minimum_change_frames_for_hit
+        self.change_window = int(minimum_change_frames_for_hit*1.2)
+        self.rolling_mean = RollingMean(5)
+        self.previous_mean = np.nan
+        # (moving_up, moving_down) of the last change_window+1 frames and their counts
+        self.directions = deque()
+        self.moving_up_count = 0
+        self.moving_down_count = 0
+        self.number_of_frames = 0
+
+    @property
+    def latency(self):
+        return self.change_window
+
+    def add(self, bbox):
+        # Ball box (x1, y1, x2, y2) of the next frame, NaN when unknown.
+        # Returns the frame number of the hit decided with this frame or None.
+        mid_y = (bbox[1] + bbox[3])/2
+        mean = self.rolling_mean.add(mid_y)
+        delta_y = mean - self.previous_mean
+        self.previous_mean = mean
+        # NaN compares False
+        moving_up = bool(delta_y < 0)
+        moving_down = bool(delta_y > 0)
+
+        self.directions.append((moving_up, moving_down))
+        self.moving_up_count += moving_up
+        self.moving_down_count += moving_down
+        self.number_of_frames += 1
+        if len(self.directions) > self.change_window+1:
+            removed_up, removed_down = self.directions.popleft()
+            self.moving_up_count -= removed_up
+            self.moving_down_count -= removed_down
+        if len(self.directions) < self.change_window+1:
+            return None
+
+        frame_num = self.number_of_frames - 1 - self.change_window
+        if frame_num < 1:
+            return None
+
+        # counts over the change_window frames after frame_num
+        up, down = self.directions[0]
+        next_up, next_down = self.directions[1]
+        moving_up_count = self.moving_up_count - up
+        moving_down_count = self.moving_down_count - down
+        if (down and next_up and moving_up_count > self.minimum_change_frames_for_hit-1) or \
+           (up and next_down and moving_down_count > self.minimum_change_frames_for_hit-1):
+            return frame_num
+        return None
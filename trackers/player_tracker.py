@@ -1,21 +1,69 @@
-from ultralytics import YOLO 
 import cv2
-import pickle
+import numpy as np
 import sys
 sys.path.append('../')
-from utils import measure_distance, get_center_of_bbox
+from .frame_stride import FrameStrideMixin, detections_from_keyframes
+from inference import BackendMixin, load_yolo_model, has_batched_tracking, reset_yolo_tracking
+from utils import measure_distance, get_center_of_bbox, read_stub, save_stub, iter_frame_windows, Detections, as_detections, profile_stage, timed, get_writable_frame
 
-class PlayerTracker:
-    def __init__(self,model_path):
-        self.model = YOLO(model_path)
+def get_court_area(court_keypoints, court_margin):
+    # Crop (x1, y1, x2, y2) holding the court and the players around it, the court
+    # outline (convex hull of the keypoints) and the margin in pixels: court_margin is a
+    # fraction of the court width, the crop gets twice that above the court for the
+    # bodies of the far players.
+    points = np.asarray(court_keypoints, dtype=np.float32).reshape(-1, 2)
+    x1, y1 = points.min(axis=0)
+    x2, y2 = points.max(axis=0)
+    margin = court_margin * (x2 - x1)
+    crop = (max(int(x1 - margin), 0), max(int(y1 - 2*margin), 0), int(np.ceil(x2 + margin)), int(np.ceil(y2 + margin)))
+    return crop, cv2.convexHull(points), margin
 
+
+class PlayerTracker(BackendMixin, FrameStrideMixin):
+    def __init__(self,model_path, stride=1, motion_threshold=None, fill_method='linear', person_only=False, court_margin=None, court_keypoints=None,
+                 backend='torch', quantization=None, server=None):
+        self.model_path = model_path
+        self.init_backend(backend, quantization, server)
+        self.model = load_yolo_model(model_path, backend, quantization, server=server)
+        # Checked up front: a batch tracked by an older ultralytics has already broken the tracks
+        self.batched_tracking = has_batched_tracking(self.model)
+        self.init_stride(stride, motion_threshold, fill_method)
+        # person_only asks the model for people only instead of every COCO class.
+        # With court_margin and the court keypoints (set_court_keypoints), the model only
+        # sees the court area and people whose feet are further than court_margin outside
+        # the court are dropped.
+        self.person_only = person_only
+        self.court_margin = court_margin
+        self.court_keypoints = None
+        self.court_area = None
+        if court_keypoints is not None:
+            self.set_court_keypoints(court_keypoints)
+
+    def set_court_keypoints(self, court_keypoints):
+        # Keypoints of the first frame when there is one row per frame, like choose_and_filter_players
+        court_keypoints = np.asarray(court_keypoints, dtype=np.float64)
+        if court_keypoints.ndim == 2:
+            court_keypoints = court_keypoints[0]
+        self.court_keypoints = court_keypoints
+        if self.court_margin is not None:
+            self.court_area = get_court_area(court_keypoints, self.court_margin)
+
+    def uses_court_area(self):
+        return self.court_margin is not None
+
+    @timed('player_tracker.choose_players')
     def choose_and_filter_players(self, court_keypoints, player_detections):
-        player_detections_first_frame = player_detections[0]
-        chosen_player = self.choose_players(court_keypoints, player_detections_first_frame)
-        filtered_player_detections = []
-        for player_dict in player_detections:
-            filtered_player_dict = {track_id: bbox for track_id, bbox in player_dict.items() if track_id in chosen_player}
-            filtered_player_detections.append(filtered_player_dict)
+        player_detections = as_detections(player_detections)
+        # Players are chosen on the first frame with two people, e.g. the court mask may
+        # drop one for a few frames; on the frame with the most when there is none
+        court_keypoints = np.asarray(court_keypoints)
+        if court_keypoints.ndim == 2:
+            court_keypoints = court_keypoints[0]
+        people_per_frame = np.bincount(player_detections.frame_idx.astype(np.int64), minlength=max(player_detections.number_of_frames, 1))
+        two_people_frames = np.flatnonzero(people_per_frame >= 2)
+        choice_frame = two_people_frames[0] if len(two_people_frames) else int(np.argmax(people_per_frame))
+        chosen_player = self.choose_players(court_keypoints, player_detections[choice_frame])
+        filtered_player_detections = player_detections.filter_tracks(chosen_player)
         return filtered_player_detections
 
     def choose_players(self, court_keypoints, player_dict):
@@ -33,31 +81,111 @@ class PlayerTracker:
         
         # sorrt the distances in ascending order
         distances.sort(key = lambda x: x[1])
-        # Choose the first 2 tracks
-        chosen_players = [distances[0][0], distances[1][0]]
+        # Choose the first 2 tracks, fewer when fewer people were detected
+        chosen_players = [track_id for track_id, _ in distances[:2]]
         return chosen_players
 
 
-    def detect_frames(self,frames, read_from_stub=False, stub_path=None):
+    def get_inference_params(self):
+        # Everything besides the video and the weights that changes the detections
+        return dict({'tracker': 'player', 'mode': 'track', 'persist': True}, **self.get_backend_params(), **self.get_stride_params(), **self.get_detection_params())
+
+    def get_options(self):
+        # Keyword arguments that rebuild this tracker, e.g. in another process
+        court_keypoints = self.court_keypoints.tolist() if self.court_keypoints is not None else None
+        return dict(self.get_stride_options(), person_only=self.person_only, court_margin=self.court_margin, court_keypoints=court_keypoints,
+                    **self.get_backend_options())
+
+    def get_detection_params(self):
+        # person_only and the court crop change which boxes the model returns; without
+        # them the key is the one of the whole frame with every class
+        params = {}
+        if self.person_only:
+            params['person_only'] = True
+        if self.court_area is not None:
+            params['court_margin'] = self.court_margin
+            params['court_crop'] = list(self.court_area[0])
+            params['court_keypoints'] = np.round(self.court_keypoints, 1).tolist()
+        return params
+
+    def get_cache_key(self, cache, video_path):
+        return cache.get_key(video_path, self.model_path, self.get_inference_params())
+
+    def detect_frames(self,frames, read_from_stub=False, stub_path=None, batch_size=1, cache=None, video_path=None):
         player_detections = []
 
         if read_from_stub and stub_path is not None:
-            with open(stub_path, 'rb') as f:
-                player_detections = pickle.load(f)
-            return player_detections
+            return as_detections(read_stub(stub_path))
+
+        use_cache = cache is not None and video_path is not None
+        if use_cache:
+            cache_key = self.get_cache_key(cache, video_path)
+            cached_detections = cache.load(cache_key)
+            if cached_detections is not None:
+                return cached_detections
+
+        with profile_stage('player_tracker.detect', frames=len(frames)):
+            # With a stride only some of the frames go through the model
+            detection_frames = self.stride_scheduler.get_detection_frames(len(frames), frames)
+            if self.stride_scheduler.is_enabled():
+                frames_to_detect = [frames[frame_num] for frame_num in detection_frames]
+            else:
+                frames_to_detect = frames
+            if batch_size > 1:
+                for frames_batch in iter_frame_windows(frames_to_detect, batch_size):
+                    player_detections.extend(self.detect_batch(frames_batch))
+            else:
+                for frame in frames_to_detect:
+                    player_dict = self.detect_frame(frame)
+                    player_detections.append(player_dict)
+
+        if self.stride_scheduler.is_enabled():
+            # The skipped frames get boxes from the detected frames around them
+            player_detections = detections_from_keyframes(player_detections, detection_frames, len(frames), self.fill_method).to_list()
 
-        for frame in frames:
-            player_dict = self.detect_frame(frame)
-            player_detections.append(player_dict)
-        
         if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(player_detections, f)
+            save_stub(player_detections, stub_path)
+
+        player_detections = Detections.from_list(player_detections)
+
+        if use_cache:
+            cache.save(cache_key, player_detections)
         
         return player_detections
 
     def detect_frame(self,frame):
-        results = self.model.track(frame, persist=True)[0]
+        if self.uses_court_area() and self.court_area is None:
+            raise ValueError("court_margin needs the court keypoints, call set_court_keypoints first")
+        results = self.model.track(self.crop_to_court(frame), persist=True, **self.get_track_kwargs())[0]
+        return self.get_player_dict(results)
+
+    def detect_batch(self,frames):
+        # One model call for the whole batch. For a list of images ultralytics>=8.1
+        # runs a single tracker over the results in order, so with persist=True
+        # the track ids stay consistent across batches like in detect_frame.
+        if not self.batched_tracking:
+            return [self.detect_frame(frame) for frame in frames]
+        if self.uses_court_area() and self.court_area is None:
+            raise ValueError("court_margin needs the court keypoints, call set_court_keypoints first")
+        results_batch = self.model.track([self.crop_to_court(frame) for frame in frames], persist=True, **self.get_track_kwargs())
+        return [self.get_player_dict(results) for results in results_batch]
+
+    def get_track_kwargs(self):
+        if not self.person_only:
+            return {}
+        return {'classes': [class_id for class_id, name in self.model.names.items() if name == 'person']}
+
+    def crop_to_court(self, frame):
+        if self.court_area is None:
+            return frame
+        x1, y1, x2, y2 = self.court_area[0]
+        return np.ascontiguousarray(frame[y1:y2, x1:x2])
+
+    def reset_tracking(self):
+        # Forget the tracks of earlier frames, e.g. before tracking an unrelated range of frames
+        reset_yolo_tracking(self.model)
+
+    def get_player_dict(self,results):
         id_name_dict = results.names
 
         player_dict = {}
@@ -68,20 +196,41 @@ class PlayerTracker:
             object_cls_name = id_name_dict[object_cls_id]
             if object_cls_name == "person":
                 player_dict[track_id] = result
-        
+
+        if self.court_area is not None:
+            # crop to frame coordinates
+            crop_x1, crop_y1 = self.court_area[0][:2]
+            player_dict = {track_id: [bbox[0]+crop_x1, bbox[1]+crop_y1, bbox[2]+crop_x1, bbox[3]+crop_y1] for track_id, bbox in player_dict.items()}
+            player_dict = self.filter_court_area(player_dict)
         return player_dict
 
+    def filter_court_area(self, player_dict):
+        # Without the people whose feet are further than the margin outside the court
+        _, court_hull, margin = self.court_area
+        filtered_player_dict = {}
+        for track_id, bbox in player_dict.items():
+            foot_position = ((bbox[0]+bbox[2])/2, bbox[3])
+            # signed distance, negative outside the court
+            if cv2.pointPolygonTest(court_hull, foot_position, True) >= -margin:
+                filtered_player_dict[track_id] = bbox
+        return filtered_player_dict
+
     def draw_bboxes(self,video_frames, player_detections):
+        player_detections = as_detections(player_detections)
         output_video_frames = []
-        for frame, player_dict in zip(video_frames, player_detections):
-            # Draw Bounding Boxes
-            for track_id, bbox in player_dict.items():
-                x1, y1, x2, y2 = bbox
-                cv2.putText(frame, f"Player ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+        for frame, frame_num in zip(video_frames, range(len(player_detections))):
+            frame = self.draw_bboxes_on_frame(get_writable_frame(frame), *player_detections.get_frame(frame_num))
             output_video_frames.append(frame)
         
         return output_video_frames
 
+    def draw_bboxes_on_frame(self, frame, track_ids, bboxes):
+        # Draw Bounding Boxes
+        for track_id, bbox in zip(track_ids, bboxes):
+            x1, y1, x2, y2 = bbox
+            cv2.putText(frame, f"Player ID: {track_id}",(int(bbox[0]),int(bbox[1] -10 )),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+        return frame
+
 
     
\ No newline at end of file
@@ -0,0 +1,212 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_stream, get_video_frame_count, get_bbox_iou_matrix, Detections, FrameStore
+from .player_tracker import PlayerTracker
+from .ball_tracker import BallTracker
+
+
+def get_shards(number_of_frames, number_of_shards, overlap):
+    # (read_start, own_start, own_end) per shard. A shard owns the frames [own_start, own_end)
+    # and also reads the overlap frames before own_start: they warm up its tracker and are
+    # where its track ids are matched with the previous shard. The last shard reads to the
+    # end of the video since the frame count from the metadata can be off.
+    number_of_shards = max(1, min(number_of_shards, number_of_frames))
+    boundaries = np.linspace(0, number_of_frames, number_of_shards+1).astype(int).tolist()
+    shards = []
+    for shard_index in range(number_of_shards):
+        own_start = boundaries[shard_index]
+        own_end = boundaries[shard_index+1] if shard_index < number_of_shards-1 else None
+        shards.append((max(own_start - overlap, 0), own_start, own_end))
+    return shards
+
+
+def match_tracks(previous_rows, current_rows, overlap_start, overlap_end, iou_threshold):
+    # {current track id: previous track id} for the tracks whose boxes overlap the most
+    # over the frames [overlap_start, overlap_end) that both shards saw. Rows are
+    # (frame_idx, track_id, bboxes) in video frame numbers.
+    previous_frame_idx, previous_track_id, previous_bboxes = previous_rows
+    current_frame_idx, current_track_id, current_bboxes = current_rows
+    previous_ids = np.unique(previous_track_id[(previous_frame_idx >= overlap_start) & (previous_frame_idx < overlap_end)])
+    current_ids = np.unique(current_track_id[(current_frame_idx >= overlap_start) & (current_frame_idx < overlap_end)])
+    if len(previous_ids) == 0 or len(current_ids) == 0:
+        return {}
+
+    # Sum of IoU per (previous, current) pair and frames where the current track was seen
+    iou_sum = np.zeros((len(previous_ids), len(current_ids)))
+    current_frames_seen = np.zeros(len(current_ids))
+    for frame_num in range(overlap_start, overlap_end):
+        previous_mask = previous_frame_idx == frame_num
+        current_mask = current_frame_idx == frame_num
+        if not current_mask.any():
+            continue
+        current_columns = np.searchsorted(current_ids, current_track_id[current_mask])
+        current_frames_seen[current_columns] += 1
+        if not previous_mask.any():
+            continue
+        previous_rows_index = np.searchsorted(previous_ids, previous_track_id[previous_mask])
+        iou = get_bbox_iou_matrix(previous_bboxes[previous_mask], current_bboxes[current_mask])
+        np.add.at(iou_sum, (previous_rows_index[:, None], current_columns[None, :]), iou)
+    mean_iou = iou_sum / np.maximum(current_frames_seen, 1)
+
+    # Greedy matching, best pairs first
+    id_map = {}
+    matched_previous = set()
+    for previous_index, current_index in zip(*np.unravel_index(np.argsort(-mean_iou, axis=None), mean_iou.shape)):
+        if mean_iou[previous_index, current_index] < iou_threshold:
+            break
+        if current_index in id_map or previous_index in matched_previous:
+            continue
+        id_map[current_index] = previous_index
+        matched_previous.add(previous_index)
+    return {int(current_ids[current_index]): int(previous_ids[previous_index]) for current_index, previous_index in id_map.items()}
+
+
+def merge_shard_detections(shards, shard_detections, id_maps=None):
+    # One Detections for the whole video from the owned frames of every shard.
+    # shard_detections frame numbers start at each shard's read_start.
+    frame_idx = []
+    track_id = []
+    bboxes = []
+    number_of_frames = 0
+    for shard_index, ((read_start, own_start, own_end), detections) in enumerate(zip(shards, shard_detections)):
+        global_frame_idx = detections.frame_idx + read_start
+        own_rows = global_frame_idx >= own_start
+        shard_track_id = detections.track_id[own_rows]
+        if id_maps is not None:
+            id_map = id_maps[shard_index]
+            shard_track_id = np.array([id_map[int(detection_id)] for detection_id in shard_track_id], dtype=np.int32)
+        frame_idx.append(global_frame_idx[own_rows])
+        track_id.append(shard_track_id)
+        bboxes.append(detections.bboxes[own_rows])
+        number_of_frames = max(number_of_frames, read_start + detections.number_of_frames)
+    return Detections(np.concatenate(frame_idx), np.concatenate(track_id), np.concatenate(bboxes), number_of_frames,
+                      width=shard_detections[0].width)
+
+
+def stitch_tracks(shards, shard_detections, iou_threshold=0.5):
+    # Merge per-shard player detections, giving a track that crosses a shard border the
+    # id it had in the previous shard. The first shard keeps its ids, tracks that start
+    # in a later shard get new ones.
+    id_maps = []
+    previous_rows = None
+    next_track_id = 1
+    for (read_start, own_start, own_end), detections in zip(shards, shard_detections):
+        global_frame_idx = detections.frame_idx + read_start
+        current_rows = (global_frame_idx, detections.track_id, detections.bboxes)
+
+        if previous_rows is None:
+            id_map = {int(detection_id): int(detection_id) for detection_id in detections.get_track_ids()}
+        else:
+            id_map = match_tracks(previous_rows, current_rows, read_start, own_start, iou_threshold)
+        for detection_id in detections.get_track_ids().tolist():
+            if detection_id not in id_map:
+                id_map[detection_id] = next_track_id
+                next_track_id += 1
+        if id_map:
+            next_track_id = max(next_track_id, max(id_map.values()) + 1)
+        id_maps.append(id_map)
+
+        # The next shard is matched against the boxes this shard keeps, with stitched ids
+        own_rows = global_frame_idx >= own_start
+        stitched_track_id = np.array([id_map[int(detection_id)] for detection_id in detections.track_id[own_rows]], dtype=np.int32)
+        previous_rows = (global_frame_idx[own_rows], stitched_track_id, detections.bboxes[own_rows])
+
+    return merge_shard_detections(shards, shard_detections, id_maps)
+
+
+# Trackers of a worker process, loaded once per process by init_shard_worker
+shard_trackers = None
+
+
+def init_shard_worker(player_model_path, ball_model_path, player_options, ball_options):
+    global shard_trackers
+    shard_trackers = (PlayerTracker(model_path=player_model_path, **player_options),
+                      BallTracker(model_path=ball_model_path, **ball_options))
+
+
+def detect_shard(video_path, read_start, read_end, batch_size, detect_players, detect_ball, frame_store_path=None):
+    player_tracker, ball_tracker = shard_trackers
+    # The same process may get several shards, each one starts with fresh tracks
+    player_tracker.reset_tracking()
+    ball_tracker.reset_tracking()
+
+    if frame_store_path is not None:
+        # A view of the shard's frames in the decoded video, nothing is decoded
+        frames = FrameStore(frame_store_path)[read_start:read_end]
+    else:
+        frames = list(read_video_stream(video_path, read_start, read_end))
+    player_detections = player_tracker.detect_frames(frames, batch_size=batch_size) if detect_players else None
+    ball_detections = ball_tracker.detect_frames(frames, batch_size=batch_size) if detect_ball else None
+    return player_detections, ball_detections
+
+
+class ShardedDetector:
+    # Player and ball detection of one video split over a pool of processes: the video is
+    # cut into number_of_shards time ranges that overlap by `overlap` frames, each process
+    # loads the models once and detects whole shards, and the results are merged with
+    # player track ids stitched across the shard borders.
+    def __init__(self, player_tracker, ball_tracker, number_of_shards, overlap=48, batch_size=1, iou_threshold=0.5, processes=None):
+        self.player_tracker = player_tracker
+        self.ball_tracker = ball_tracker
+        self.number_of_shards = number_of_shards
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.iou_threshold = iou_threshold
+        self.processes = processes
+
+    def get_player_cache_key(self, cache, video_path):
+        # Stitched track ids can differ from a single pass, so sharded player detections
+        # are cached apart. Ball detections do not depend on the shards.
+        inference_params = dict(self.player_tracker.get_inference_params(),
+                                shards=self.number_of_shards,
+                                shard_overlap=self.overlap,
+                                iou_threshold=self.iou_threshold)
+        return cache.get_key(video_path, self.player_tracker.model_path, inference_params)
+
+    def detect_shards(self, video_path, detect_players=True, detect_ball=True, frame_store=None):
+        # With the FrameStore of the video, workers read their frames from it
+        number_of_frames = len(frame_store) if frame_store is not None else get_video_frame_count(video_path)
+        frame_store_path = frame_store.path if frame_store is not None else None
+        shards = get_shards(number_of_frames, self.number_of_shards, self.overlap)
+
+        # spawn: torch and the trackers do not survive a fork of a process that already uses them
+        with ProcessPoolExecutor(max_workers=self.processes or len(shards),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_shard_worker,
+                                 initargs=(self.player_tracker.model_path, self.ball_tracker.model_path,
+                                           self.player_tracker.get_options(), self.ball_tracker.get_options())) as executor:
+            futures = [executor.submit(detect_shard, video_path, read_start, own_end, self.batch_size, detect_players, detect_ball, frame_store_path)
+                       for read_start, own_start, own_end in shards]
+            results = [future.result() for future in futures]
+
+        player_detections = stitch_tracks(shards, [result[0] for result in results], self.iou_threshold) if detect_players else None
+        ball_detections = merge_shard_detections(shards, [result[1] for result in results]) if detect_ball else None
+        return player_detections, ball_detections
+
+    def detect(self, video_path, cache=None, frame_store=None):
+        player_detections = None
+        ball_detections = None
+        if cache is not None:
+            player_cache_key = self.get_player_cache_key(cache, video_path)
+            ball_cache_key = self.ball_tracker.get_cache_key(cache, video_path)
+            player_detections = cache.load(player_cache_key)
+            ball_detections = cache.load(ball_cache_key)
+
+        if player_detections is None or ball_detections is None:
+            detected_players, detected_ball = self.detect_shards(video_path,
+                                                                 detect_players=player_detections is None,
+                                                                 detect_ball=ball_detections is None,
+                                                                 frame_store=frame_store)
+            if player_detections is None:
+                player_detections = detected_players
+                if cache is not None:
+                    cache.save(player_cache_key, player_detections)
+            if ball_detections is None:
+                ball_detections = detected_ball
+                if cache is not None:
+                    cache.save(ball_cache_key, ball_detections)
+
+        return player_detections, ball_detections
@@ -1,4 +1,14 @@
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, measure_distance, get_foot_position,get_closest_keypoint_index,get_height_of_bbox,measure_xy_distance,get_center_of_bbox
+from .profiling import Profiler, profiler, profile_stage, timed, get_peak_rss_bytes, run_with_profilers
+from .video_utils import read_video, save_video, read_video_stream, iter_frame_windows, VideoWriter, get_video_frame_count, get_video_fps
+from .frame_store import FrameStore, get_writable_frame
+from .video_encoders import Cv2Encoder, FFmpegEncoder, BackgroundEncoder, get_encoder, is_ffmpeg_available, resolve_encoder, get_output_video_path, ENCODERS, OUTPUT_EXTENSIONS
+from .bbox_utils import get_center_of_bbox, measure_distance, get_foot_position,get_closest_keypoint_index,get_closest_keypoint_indices,get_keypoints_at_indices,get_bbox_iou_matrix,get_height_of_bbox,measure_xy_distance,get_center_of_bbox
 from .conversions import convert_pixel_distance_to_meters, convert_meters_to_pixel_distance
-from .player_stats_drawer_utils import draw_player_stats
\ No newline at end of file
+from .player_stats_drawer_utils import draw_player_stats, draw_player_stats_on_frame
+from .stub_utils import read_stub, save_stub
+from .detections import Detections, as_detections
+from .detection_cache import DetectionCache
+from .array_utils import sliding_window_max
+from .sprite_utils import Sprite, SpriteCache, blend_rectangle
+from .overlay_renderer import OverlayRenderer
+from .pipeline import PipelineExecutor, PipelineStage
\ No newline at end of file
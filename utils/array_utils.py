@@ -0,0 +1,26 @@
+import numpy as np
+
+def sliding_window_max(values, before, after):
+    # result[i] = nanmax(values[i-before : i+after]), windows clipped at both ends, NaN
+    # where the window has no values. O(n) with the van Herk / Gil-Werman block scheme:
+    # per block prefix and suffix maxima, any window is one suffix and one prefix.
+    values = np.asarray(values, dtype=np.float64)
+    number_of_values = len(values)
+    window = before + after
+    if number_of_values == 0 or window <= 0:
+        return np.full(number_of_values, np.nan)
+
+    values = np.where(np.isnan(values), -np.inf, values)
+    number_of_blocks = -(-(number_of_values + window) // window)
+    padded = np.full(number_of_blocks*window, -np.inf)
+    padded[before:before+number_of_values] = values
+
+    blocks = padded.reshape(number_of_blocks, window)
+    prefix_max = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix_max = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    # window of value i starts at i in the padded array and ends at i+window-1
+    starts = np.arange(number_of_values)
+    result = np.maximum(suffix_max[starts], prefix_max[starts+window-1])
+    result[np.isneginf(result)] = np.nan
+    return result
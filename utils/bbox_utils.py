@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     center_x = int((x1 + x2) / 2)
@@ -25,6 +27,22 @@ def get_closest_keypoint_index(point,keypoints,keypoint_indices):
     
     return key_point_ind
 
+# Vectorized get_closest_keypoint_index for an (N, 2) array of points,
+# keypoints are either one (28,) set or one (N, 28) row per point
+def get_closest_keypoint_indices(points,keypoints,keypoint_indices):
+    keypoint_indices = np.asarray(keypoint_indices)
+    keypoints_y = np.asarray(keypoints, dtype=np.float64)[..., keypoint_indices*2+1]
+    distances = np.abs(np.asarray(points, dtype=np.float64)[:, 1:2] - keypoints_y)
+    # argmin keeps the first of equal distances, like the strict < in the loop
+    return keypoint_indices[np.argmin(distances, axis=1)]
+
+# (x, y) of keypoint keypoint_indices[i] for every point, keypoints as in get_closest_keypoint_indices
+def get_keypoints_at_indices(keypoints,keypoint_indices):
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    if keypoints.ndim == 1:
+        return keypoints.reshape(-1, 2)[keypoint_indices]
+    return keypoints.reshape(len(keypoints), -1, 2)[np.arange(len(keypoints)), keypoint_indices]
+
 def get_height_of_bbox(bbox):
     return bbox[3] - bbox[1]
 
@@ -32,4 +50,18 @@ def measure_xy_distance(p1,p2):
     return abs(p1[0]-p2[0]), abs(p1[1]-p2[1])
 
 def get_center_of_bbox(bbox):
-    return (int((bbox[0] + bbox[2]) / 2), int((bbox[1] + bbox[3]) / 2))
\ No newline at end of file
+    return (int((bbox[0] + bbox[2]) / 2), int((bbox[1] + bbox[3]) / 2))
+
+# Intersection over union of (N, 4) boxes against (M, 4) boxes -> (N, M)
+def get_bbox_iou_matrix(boxes_a, boxes_b):
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
\ No newline at end of file
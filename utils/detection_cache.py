@@ -0,0 +1,120 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from .detections import Detections, as_detections
+
+# Bump when the on-disk layout changes so old entries are never read back
+CACHE_FORMAT_VERSION = 2
+
+
+def hash_file(path, sample_size=1<<20, number_of_samples=16):
+    # Content hash of a (possibly multi-GB) file: its size plus number_of_samples
+    # evenly spaced chunks, so computing a cache key does not read the whole video
+    size = os.path.getsize(path)
+    file_hash = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= sample_size*number_of_samples:
+            file_hash.update(f.read())
+        else:
+            for i in range(number_of_samples):
+                f.seek(i*(size-sample_size)//(number_of_samples-1))
+                file_hash.update(f.read(sample_size))
+    return file_hash.hexdigest()
+
+
+def remove_entry(path):
+    # Runs sharing the cache may remove the same entry at the same time
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DetectionCache:
+    # Detection results stored as one .npz file per (video, model, inference parameters).
+    # Entries are named <source>_<key>.npz where source identifies the video path, model
+    # and parameters and key also covers the file contents: when the video or the model
+    # weights change, the new entry replaces the stale one for the same source.
+    # The least recently used entries are evicted once the cache exceeds max_size_bytes.
+    def __init__(self, cache_dir='tracker_cache', max_size_bytes=1<<30):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, video_path, model_path, inference_params):
+        params = json.dumps(inference_params, sort_keys=True)
+        source = hashlib.sha256(f"{os.path.abspath(video_path)}|{model_path}|{params}".encode()).hexdigest()[:16]
+
+        # model_path may also be a name that ultralytics resolves, e.g. 'yolov8x'
+        model_hash = hash_file(model_path) if os.path.isfile(model_path) else model_path
+        content = f"{CACHE_FORMAT_VERSION}|{hash_file(video_path)}|{model_hash}|{params}"
+        key = hashlib.sha256(content.encode()).hexdigest()[:32]
+        return f"{source}_{key}"
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load_arrays(self, key):
+        path = self.get_path(key)
+        try:
+            with np.load(path) as data:
+                arrays = (data['frame_idx'], data['track_id'], data['bboxes'], int(data['number_of_frames']))
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing, or removed by another process since
+            return None
+        except (OSError, KeyError, ValueError):
+            # Unreadable or partially written entry
+            remove_entry(path)
+            return None
+        return arrays
+
+    def load(self, key):
+        arrays = self.load_arrays(key)
+        if arrays is None:
+            return None
+        return Detections(*arrays)
+
+    def save(self, key, detections):
+        detections = as_detections(detections)
+        path = self.get_path(key)
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     frame_idx=detections.frame_idx,
+                     track_id=detections.track_id,
+                     # float64 as is: boxes filled in between stride keyframes and boxes
+                     # shifted back from a court crop are not exact in float32
+                     bboxes=detections.bboxes,
+                     number_of_frames=np.int64(len(detections)))
+        os.replace(tmp_path, path)
+
+        self.remove_stale_entries(key)
+        self.evict()
+
+    def remove_stale_entries(self, key):
+        source = key.split('_')[0]
+        for path in glob.glob(os.path.join(self.cache_dir, f"{source}_*.npz")):
+            if path != self.get_path(key):
+                remove_entry(path)
+
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            remove_entry(path)
+            total_size -= size
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class Detections:
+    # Detections of a whole video as a struct of arrays, one row per detection:
+    #   frame_idx  (N,)   int32, sorted
+    #   track_id   (N,)   int32
+    #   bboxes     (N, k) float64, x1, y1, x2, y2 (or x, y for mini court positions)
+    # Rows of a frame are contiguous, so get_frame is two slices and no copy.
+    # Indexing with a frame number returns the old {track_id: bbox} dict for compatibility.
+    def __init__(self, frame_idx, track_id, bboxes, number_of_frames, width=4):
+        frame_idx = np.asarray(frame_idx, dtype=np.int32)
+        track_id = np.asarray(track_id, dtype=np.int32)
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(len(frame_idx), -1 if len(frame_idx) else width)
+
+        if len(frame_idx) > 1 and np.any(frame_idx[1:] < frame_idx[:-1]):
+            order = np.argsort(frame_idx, kind='stable')
+            frame_idx, track_id, bboxes = frame_idx[order], track_id[order], bboxes[order]
+
+        self.frame_idx = frame_idx
+        self.track_id = track_id
+        self.bboxes = bboxes
+        self.number_of_frames = number_of_frames
+        self.frame_offsets = np.searchsorted(frame_idx, np.arange(number_of_frames+1))
+
+    @classmethod
+    def from_list(cls, detections, width=4):
+        # List[Dict[track_id, bbox]] -> Detections
+        frame_idx = []
+        track_id = []
+        bboxes = []
+        for frame_num, detection_dict in enumerate(detections):
+            for detection_id, bbox in detection_dict.items():
+                frame_idx.append(frame_num)
+                track_id.append(detection_id)
+                bboxes.append(bbox)
+        return cls(frame_idx, track_id, bboxes, len(detections), width=width)
+
+    @classmethod
+    def from_dense(cls, track_id, bboxes):
+        # One box per frame for a single track, frames with NaN boxes are left out
+        bboxes = np.asarray(bboxes, dtype=np.float64)
+        frame_idx = np.flatnonzero(~np.isnan(bboxes).any(axis=1))
+        return cls(frame_idx, np.full(len(frame_idx), track_id), bboxes[frame_idx], len(bboxes), width=bboxes.shape[1])
+
+    @classmethod
+    def concatenate(cls, detections_list):
+        # Join detections of consecutive frame ranges, e.g. the windows of a stream
+        if not detections_list:
+            return cls([], [], [], 0)
+
+        frame_idx = []
+        offset = 0
+        for detections in detections_list:
+            frame_idx.append(detections.frame_idx + offset)
+            offset += detections.number_of_frames
+        return cls(np.concatenate(frame_idx),
+                   np.concatenate([detections.track_id for detections in detections_list]),
+                   np.concatenate([detections.bboxes for detections in detections_list]),
+                   offset,
+                   width=detections_list[0].width)
+
+    def to_list(self):
+        return [self[frame_num] for frame_num in range(self.number_of_frames)]
+
+    @property
+    def width(self):
+        return self.bboxes.shape[1]
+
+    def __len__(self):
+        return self.number_of_frames
+
+    def __getitem__(self, frame_num):
+        track_ids, bboxes = self.get_frame(frame_num)
+        return dict(zip(track_ids.tolist(), bboxes.tolist()))
+
+    def __iter__(self):
+        for frame_num in range(self.number_of_frames):
+            yield self[frame_num]
+
+    def get_frame(self, frame_num):
+        # (track_ids, bboxes) of one frame, as views into the arrays
+        start, end = self.frame_offsets[frame_num], self.frame_offsets[frame_num+1]
+        return self.track_id[start:end], self.bboxes[start:end]
+
+    def get_track(self, track_id):
+        # (frame_idx, bboxes) of the frames where the track was detected
+        mask = self.track_id == track_id
+        return self.frame_idx[mask], self.bboxes[mask]
+
+    def get_track_bboxes(self, track_id):
+        # Dense (number_of_frames, k) boxes of one track, NaN where it was not detected
+        frame_idx, bboxes = self.get_track(track_id)
+        dense_bboxes = np.full((self.number_of_frames, self.width), np.nan)
+        dense_bboxes[frame_idx] = bboxes
+        return dense_bboxes
+
+    def get_track_ids(self):
+        return np.unique(self.track_id)
+
+    def filter_tracks(self, track_ids):
+        mask = np.isin(self.track_id, track_ids)
+        return Detections(self.frame_idx[mask], self.track_id[mask], self.bboxes[mask], self.number_of_frames, width=self.width)
+
+
+def as_detections(detections, width=4):
+    # Accept both Detections and the old list-of-dicts format
+    if isinstance(detections, Detections):
+        return detections
+    return Detections.from_list(detections, width=width)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import struct
+import numpy as np
+from .detection_cache import hash_file
+from .profiling import profile_stage
+from .video_utils import read_video_stream
+
+# Raw frame file: a fixed size header, then the decoded frames as uint8 N x H x W x C
+# (BGR, as OpenCV decodes them) with no padding. The header records the content hash of
+# the video the frames came from, so a store is reused only for the same video.
+FRAME_STORE_MAGIC = b'TNFRAMES'
+FRAME_STORE_VERSION = 1
+# magic, version, number_of_frames, height, width, channels, sha256 of the video (hash_file)
+HEADER_FORMAT = '<8sIIIII32s'
+HEADER_SIZE = 128
+
+
+def get_writable_frame(frame):
+    # Frames of a FrameStore are read-only views of the file, drawing on one needs a copy
+    return frame if frame.flags.writeable else frame.copy()
+
+
+def read_frame_store_header(path):
+    # (number_of_frames, height, width, channels, video_hash) or None for a missing,
+    # foreign or unfinished file
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+        magic, version, number_of_frames, height, width, channels, video_hash = struct.unpack(HEADER_FORMAT, header)
+    except (OSError, struct.error):
+        return None
+    if magic != FRAME_STORE_MAGIC or version != FRAME_STORE_VERSION:
+        return None
+    if os.path.getsize(path) != HEADER_SIZE + number_of_frames*height*width*channels:
+        return None
+    return number_of_frames, height, width, channels, video_hash.hex()
+
+
+class FrameStore:
+    # Decoded frames of a video, memory-mapped from a raw frame file. Works in place of
+    # the list of read_video: len(), frames[i] and iteration give read-only views of the
+    # file without copying, frames[a:b] a view of a range. The OS pages frames in when
+    # they are used and drops them again under memory pressure, so the video is never
+    # held in RAM, and the file is reused by later runs on the same video.
+    def __init__(self, path):
+        header = read_frame_store_header(path)
+        if header is None:
+            raise ValueError(f"{path} is not a complete frame store")
+        number_of_frames, height, width, channels, self.video_hash = header
+        self.path = path
+        self.frames = np.asarray(np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(number_of_frames, height, width, channels)))
+
+    @classmethod
+    def create(cls, video_path, path):
+        # Decode the whole video once into a new store file at path
+        video_hash = hash_file(video_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        number_of_frames = 0
+        frame_shape = None
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(bytes(HEADER_SIZE))
+                for frame in read_video_stream(video_path):
+                    if frame_shape is None:
+                        frame_shape = frame.shape
+                    elif frame.shape != frame_shape:
+                        raise ValueError(f"Frame {number_of_frames} of {video_path} is {frame.shape}, earlier frames are {frame_shape}")
+                    with profile_stage('frame_store.write', frames=1):
+                        f.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+                    number_of_frames += 1
+                if frame_shape is None:
+                    raise ValueError(f"Could not read any frame from {video_path}")
+                height, width, channels = frame_shape
+                f.seek(0)
+                f.write(struct.pack(HEADER_FORMAT, FRAME_STORE_MAGIC, FRAME_STORE_VERSION, number_of_frames, height, width, channels, bytes.fromhex(video_hash)))
+            # Never a half written store under the final name
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return cls(path)
+
+    @classmethod
+    def from_video(cls, video_path, store_dir='frame_store'):
+        # The store of this video in store_dir, decoded on the first call and re-decoded
+        # when the video changed
+        os.makedirs(store_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        source = hashlib.sha256(os.path.abspath(video_path).encode()).hexdigest()[:16]
+        path = os.path.join(store_dir, f"{name}_{source}.frames")
+        header = read_frame_store_header(path)
+        if header is not None and header[4] == hash_file(video_path):
+            return cls(path)
+        return cls.create(video_path, path)
+
+    @property
+    def frame_shape(self):
+        return self.frames.shape[1:]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
@@ -0,0 +1,29 @@
+from .profiling import profile_stage
+from .frame_store import get_writable_frame
+
+
+class OverlayRenderer:
+    # Draws every overlay layer on a frame before moving to the next frame, so
+    # drawing is a single pass over the video with no intermediate frame lists.
+    # A layer is a function (frame, frame_num) -> frame.
+    def __init__(self):
+        self.layers = []
+
+    def add_layer(self, name, draw_function):
+        self.layers.append((name, draw_function))
+        return self
+
+    def get_layer_names(self):
+        return [name for name, _ in self.layers]
+
+    def render_frame(self, frame, frame_num):
+        for name, draw_function in self.layers:
+            with profile_stage(f'draw.{name}', frames=1):
+                frame = draw_function(frame, frame_num)
+        return frame
+
+    def render(self, frames):
+        # Works with a list (batch), a generator (streaming) or a FrameStore, whose
+        # read-only frames are drawn on copies; yields drawn frames lazily
+        for frame_num, frame in enumerate(frames):
+            yield self.render_frame(get_writable_frame(frame), frame_num)
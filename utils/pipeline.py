@@ -0,0 +1,206 @@
+import heapq
+import queue
+import threading
+import time
+
+
+class PipelineStage:
+    # One step of a pipeline: function(item) -> item, run by `workers` threads.
+    # ordered stages get their input in source order (stateful work such as tracking)
+    # and must have a single worker.
+    def __init__(self, name, function, workers=1, ordered=False):
+        if ordered and workers != 1:
+            raise ValueError(f"Stage {name!r} is ordered and needs exactly one worker, got {workers}")
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.ordered = ordered
+
+
+class StageMetrics:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.queue_depth_total = 0
+        self.queue_depth_samples = 0
+        self.queue_depth_max = 0
+        self.lock = threading.Lock()
+
+    def add_item(self, busy_seconds):
+        with self.lock:
+            self.items += 1
+            self.busy_seconds += busy_seconds
+
+    def add_queue_depth(self, depth):
+        with self.lock:
+            self.queue_depth_total += depth
+            self.queue_depth_samples += 1
+            self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    def to_dict(self, wall_seconds):
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_seconds': self.busy_seconds,
+            'items_per_second': self.items / wall_seconds if wall_seconds > 0 else 0.0,
+            # Share of the run the stage's workers were busy; the bottleneck is close to 1
+            'utilization': self.busy_seconds / (wall_seconds * self.workers) if wall_seconds > 0 else 0.0,
+            'queue_depth_mean': self.queue_depth_total / self.queue_depth_samples if self.queue_depth_samples else 0.0,
+            'queue_depth_max': self.queue_depth_max,
+        }
+
+
+class PipelineExecutor:
+    # Runs source -> stages -> sink with every step in its own thread(s) and a bounded
+    # queue in front of each stage and the sink. A full queue blocks the step before it
+    # (backpressure), and at most max_in_flight items exist between source and sink, so
+    # memory stays bounded even while out-of-order results wait to be reordered.
+    # The sink always sees items in source order.
+    END = object()
+
+    def __init__(self, stages, queue_size=8, max_in_flight=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        if max_in_flight is None:
+            max_in_flight = queue_size * (len(stages) + 1) + sum(stage.workers for stage in stages)
+        self.max_in_flight = max_in_flight
+        self.metrics = []
+        self.wall_seconds = 0.0
+
+    def run(self, source, sink, source_name='decode', sink_name='encode'):
+        self.stop_event = threading.Event()
+        self.errors = []
+        self.in_flight = threading.Semaphore(self.max_in_flight)
+
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        source_metrics = StageMetrics(source_name, 1)
+        stage_metrics = [StageMetrics(stage.name, stage.workers) for stage in self.stages]
+        sink_metrics = StageMetrics(sink_name, 1)
+        self.metrics = [source_metrics] + stage_metrics + [sink_metrics]
+
+        threads = [threading.Thread(target=self.run_source, args=(source, queues[0], source_metrics), name=source_name)]
+        for stage_index, stage in enumerate(self.stages):
+            # The last worker of a stage to finish passes the end marker on
+            remaining_workers = [stage.workers]
+            for worker_index in range(stage.workers):
+                threads.append(threading.Thread(target=self.run_stage,
+                                                args=(stage, queues[stage_index], queues[stage_index+1], stage_metrics[stage_index], remaining_workers),
+                                                name=f"{stage.name}-{worker_index}"))
+        threads.append(threading.Thread(target=self.run_sink, args=(sink, queues[-1], sink_metrics), name=sink_name))
+
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start_time
+
+        if self.errors:
+            raise self.errors[0]
+        return self.get_metrics()
+
+    def fail(self, error):
+        self.errors.append(error)
+        self.stop_event.set()
+
+    def put(self, output_queue, item):
+        while not self.stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, input_queue, metrics):
+        metrics.add_queue_depth(input_queue.qsize())
+        while not self.stop_event.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return self.END
+
+    def iter_input(self, input_queue, metrics, ordered):
+        # (index, item) pairs until the end marker, in source order if asked
+        pending = []
+        next_index = 0
+        while True:
+            entry = self.get(input_queue, metrics)
+            if entry is self.END:
+                if not self.stop_event.is_set():
+                    # Let the other workers of the stage see the end marker too
+                    self.put(input_queue, self.END)
+                return
+            if not ordered:
+                yield entry
+                continue
+            heapq.heappush(pending, entry)
+            while pending and pending[0][0] == next_index:
+                yield heapq.heappop(pending)
+                next_index += 1
+
+    def run_source(self, source, output_queue, metrics):
+        try:
+            iterator = iter(source)
+            index = 0
+            while True:
+                while not self.in_flight.acquire(timeout=0.1):
+                    if self.stop_event.is_set():
+                        return
+                start_time = time.perf_counter()
+                item = next(iterator, self.END)
+                if item is self.END:
+                    self.put(output_queue, self.END)
+                    return
+                metrics.add_item(time.perf_counter() - start_time)
+                if not self.put(output_queue, (index, item)):
+                    return
+                index += 1
+        except Exception as error:
+            self.fail(error)
+
+    def run_stage(self, stage, input_queue, output_queue, metrics, remaining_workers):
+        try:
+            for index, item in self.iter_input(input_queue, metrics, stage.ordered):
+                start_time = time.perf_counter()
+                item = stage.function(item)
+                metrics.add_item(time.perf_counter() - start_time)
+                if not self.put(output_queue, (index, item)):
+                    return
+        except Exception as error:
+            self.fail(error)
+            return
+
+        with metrics.lock:
+            remaining_workers[0] -= 1
+            last_worker = remaining_workers[0] == 0
+        if last_worker:
+            self.put(output_queue, self.END)
+
+    def run_sink(self, sink, input_queue, metrics):
+        try:
+            for _, item in self.iter_input(input_queue, metrics, True):
+                start_time = time.perf_counter()
+                sink(item)
+                metrics.add_item(time.perf_counter() - start_time)
+                self.in_flight.release()
+        except Exception as error:
+            self.fail(error)
+
+    def get_metrics(self):
+        return {
+            'wall_seconds': self.wall_seconds,
+            'stages': {metrics.name: metrics.to_dict(self.wall_seconds) for metrics in self.metrics},
+        }
+
+    def format_metrics(self):
+        lines = [f"{'stage':<16}{'workers':>8}{'items':>8}{'items/s':>10}{'busy %':>8}{'queue avg':>11}{'queue max':>11}"]
+        for name, stage in self.get_metrics()['stages'].items():
+            lines.append(f"{name:<16}{stage['workers']:>8}{stage['items']:>8}{stage['items_per_second']:>10.1f}"
+                         f"{stage['utilization']*100:>8.0f}{stage['queue_depth_mean']:>11.1f}{stage['queue_depth_max']:>11}")
+        lines.append(f"wall time {self.wall_seconds:.2f}s")
+        return "\n".join(lines)
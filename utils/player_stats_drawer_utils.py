@@ -1,58 +1,73 @@
 import numpy as np
 import cv2
+from .sprite_utils import Sprite, SpriteCache, blend_rectangle
+from .frame_store import get_writable_frame
 
-def draw_player_stats(output_video_frames,player_stats):
+player_stats_sprites = SpriteCache()
 
+def draw_player_stats(output_video_frames,player_stats):
+    # A FrameStore is read-only, its frames are drawn on copies in a new list
+    if not isinstance(output_video_frames, list):
+        output_video_frames = list(output_video_frames)
     for index, row in player_stats.iterrows():
-        player_1_shot_speed = row['player_1_last_shot_speed']
-        player_2_shot_speed = row['player_2_last_shot_speed']
-        player_1_speed = row['player_1_last_player_speed']
-        player_2_speed = row['player_2_last_player_speed']
-
-        avg_player_1_shot_speed = row['player_1_average_shot_speed']
-        avg_player_2_shot_speed = row['player_2_average_shot_speed']
-        avg_player_1_speed = row['player_1_average_player_speed']
-        avg_player_2_speed = row['player_2_average_player_speed']
-
-        frame = output_video_frames[index]
-        shapes = np.zeros_like(frame, np.uint8)
-
-        width=350
-        height=230
-
-        start_x = frame.shape[1]-400
-        start_y = frame.shape[0]-500
-        end_x = start_x+width
-        end_y = start_y+height
-
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (start_x, start_y), (end_x, end_y), (0, 0, 0), -1)
-        alpha = 0.5 
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-        output_video_frames[index] = frame
-
-        text = "     Player 1     Player 2"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+80, start_y+30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        text = "Shot Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{player_1_shot_speed:.1f} km/h    {player_2_shot_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        text = "Player Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{player_1_speed:.1f} km/h    {player_2_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-        
-        
-        text = "avg. S. Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{avg_player_1_shot_speed:.1f} km/h    {avg_player_2_shot_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-        
-        text = "avg. P. Speed"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+10, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-        text = f"{avg_player_1_speed:.1f} km/h    {avg_player_2_speed:.1f} km/h"
-        output_video_frames[index] = cv2.putText(output_video_frames[index], text, (start_x+130, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-    
-    return output_video_frames
\ No newline at end of file
+        output_video_frames[index] = draw_player_stats_on_frame(get_writable_frame(output_video_frames[index]), row)
+
+    return output_video_frames
+
+def draw_player_stats_on_frame(frame, row):
+    player_1_shot_speed = row['player_1_last_shot_speed']
+    player_2_shot_speed = row['player_2_last_shot_speed']
+    player_1_speed = row['player_1_last_player_speed']
+    player_2_speed = row['player_2_last_player_speed']
+
+    avg_player_1_shot_speed = row['player_1_average_shot_speed']
+    avg_player_2_shot_speed = row['player_2_average_shot_speed']
+    avg_player_1_speed = row['player_1_average_player_speed']
+    avg_player_2_speed = row['player_2_average_player_speed']
+
+    width=350
+    height=230
+
+    start_x = frame.shape[1]-400
+    start_y = frame.shape[0]-500
+    end_x = start_x+width
+    end_y = start_y+height
+
+    alpha = 0.5
+    blend_rectangle(frame, start_x, start_y, end_x, end_y, (0, 0, 0), alpha)
+
+    # Header and row labels are the same on every frame, only the numbers are drawn per frame
+    labels_sprite = player_stats_sprites.get(frame.shape, lambda: Sprite.from_drawing(frame.shape, draw_player_stats_labels))
+    labels_sprite.paste(frame)
+
+    text = f"{player_1_shot_speed:.1f} km/h    {player_2_shot_speed:.1f} km/h"
+    frame = cv2.putText(frame, text, (start_x+130, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    text = f"{player_1_speed:.1f} km/h    {player_2_speed:.1f} km/h"
+    frame = cv2.putText(frame, text, (start_x+130, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    text = f"{avg_player_1_shot_speed:.1f} km/h    {avg_player_2_shot_speed:.1f} km/h"
+    frame = cv2.putText(frame, text, (start_x+130, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    text = f"{avg_player_1_speed:.1f} km/h    {avg_player_2_speed:.1f} km/h"
+    frame = cv2.putText(frame, text, (start_x+130, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    return frame
+
+def draw_player_stats_labels(frame):
+    start_x = frame.shape[1]-400
+    start_y = frame.shape[0]-500
+
+    text = "     Player 1     Player 2"
+    frame = cv2.putText(frame, text, (start_x+80, start_y+30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    text = "Shot Speed"
+    frame = cv2.putText(frame, text, (start_x+10, start_y+80), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+    text = "Player Speed"
+    frame = cv2.putText(frame, text, (start_x+10, start_y+120), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+    text = "avg. S. Speed"
+    frame = cv2.putText(frame, text, (start_x+10, start_y+160), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+    text = "avg. P. Speed"
+    frame = cv2.putText(frame, text, (start_x+10, start_y+200), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+
+    return frame
@@ -0,0 +1,134 @@
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+def get_peak_rss_bytes():
+    # Peak resident memory of this process since it started
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class Profiler:
+    # Wall time, number of calls and frames handled per named stage, summed over all
+    # threads. Stage names are dotted, e.g. 'player_tracker.detect' or 'draw.mini_court';
+    # stages can be nested, each one is reported on its own.
+    def __init__(self):
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.start_time = time.perf_counter()
+
+    def add(self, name, seconds, frames=0):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'frames': 0}
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            stage['frames'] += frames
+
+    @contextmanager
+    def stage(self, name, frames=0):
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time, frames)
+
+    def get_report(self):
+        wall_seconds = time.perf_counter() - self.start_time
+        with self.lock:
+            stages = {}
+            for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+                stages[name] = dict(stage,
+                                    fps=stage['frames'] / stage['seconds'] if stage['frames'] and stage['seconds'] > 0 else None,
+                                    share_of_wall=stage['seconds'] / wall_seconds if wall_seconds > 0 else None)
+        return {
+            'wall_seconds': wall_seconds,
+            'peak_rss_bytes': get_peak_rss_bytes(),
+            'stages': stages,
+        }
+
+    def save_report(self, path, **extra):
+        report = dict(self.get_report(), **extra)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def format_report(self):
+        report = self.get_report()
+        lines = [f"{'stage':<40}{'calls':>8}{'seconds':>10}{'frames':>8}{'fps':>9}{'% wall':>8}"]
+        for name, stage in report['stages'].items():
+            fps = f"{stage['fps']:.1f}" if stage['fps'] is not None else '-'
+            lines.append(f"{name:<40}{stage['calls']:>8}{stage['seconds']:>10.3f}{stage['frames']:>8}{fps:>9}{stage['share_of_wall']*100:>8.1f}")
+        peak_rss = report['peak_rss_bytes']
+        lines.append(f"wall time {report['wall_seconds']:.2f}s, peak RSS " + (f"{peak_rss/(1<<20):.0f} MB" if peak_rss is not None else "n/a"))
+        return "\n".join(lines)
+
+
+# Shared by the whole process, the pipeline code records into it
+profiler = Profiler()
+
+
+def profile_stage(name, frames=0):
+    # with profile_stage('mini_court.convert', frames=len(detections)): ...
+    return profiler.stage(name, frames)
+
+
+def run_with_profilers(function, cprofile_path=None, pyinstrument_path=None):
+    # Run function() under cProfile and/or pyinstrument and write their output, when a path is given
+    pyinstrument_profiler = None
+    if pyinstrument_path is not None:
+        try:
+            from pyinstrument import Profiler as PyinstrumentProfiler
+        except ImportError:
+            raise ImportError("pyinstrument is not installed: pip install pyinstrument")
+        pyinstrument_profiler = PyinstrumentProfiler()
+    cprofile_profiler = cProfile.Profile() if cprofile_path is not None else None
+
+    if pyinstrument_profiler is not None:
+        pyinstrument_profiler.start()
+    if cprofile_profiler is not None:
+        cprofile_profiler.enable()
+    try:
+        return function()
+    finally:
+        if cprofile_profiler is not None:
+            cprofile_profiler.disable()
+            cprofile_profiler.dump_stats(cprofile_path)
+        if pyinstrument_profiler is not None:
+            pyinstrument_profiler.stop()
+            with open(pyinstrument_path, 'w') as f:
+                f.write(pyinstrument_profiler.output_html())
+
+
+def timed(name):
+    # Decorator version of profile_stage, without a frame count
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profiler.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+
+class Sprite:
+    # Static overlay drawn once and pasted on every frame. pixels is the drawing over a
+    # black background and inverse_alpha how much of the frame shows through (255 where
+    # nothing was drawn, 0 where the drawing is opaque, in between on antialiased edges).
+    def __init__(self, x, y, pixels, inverse_alpha):
+        self.x = x
+        self.y = y
+        self.pixels = pixels
+        self.inverse_alpha = inverse_alpha
+
+    @classmethod
+    def from_drawing(cls, frame_shape, draw_function):
+        # Run the drawing on a black and a white canvas: the black one gives the drawn colors,
+        # the difference between the two how transparent each pixel is.
+        canvas = np.zeros(frame_shape, dtype=np.uint8)
+        white_canvas = np.full(frame_shape, 255, dtype=np.uint8)
+        draw_function(canvas)
+        draw_function(white_canvas)
+        inverse_alpha = cv2.subtract(white_canvas, canvas)
+
+        drawn = np.any(inverse_alpha != 255, axis=2)
+        rows = np.flatnonzero(drawn.any(axis=1))
+        cols = np.flatnonzero(drawn.any(axis=0))
+        if len(rows) == 0:
+            return cls(0, 0, canvas[:0, :0].copy(), inverse_alpha[:0, :0].copy())
+        y1, y2 = rows[0], rows[-1]+1
+        x1, x2 = cols[0], cols[-1]+1
+        return cls(x1, y1, canvas[y1:y2, x1:x2].copy(), inverse_alpha[y1:y2, x1:x2].copy())
+
+    def paste(self, frame):
+        # frame = pixels + frame * inverse_alpha / 255, in place on the sprite area only
+        height, width = self.pixels.shape[:2]
+        roi = frame[self.y:self.y+height, self.x:self.x+width]
+        cv2.multiply(roi, self.inverse_alpha, dst=roi, scale=1/255.)
+        cv2.add(roi, self.pixels, dst=roi)
+        return frame
+
+
+class SpriteCache:
+    # Sprites built on first use and kept, keyed by what they depend on (usually the frame shape)
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, key, build_function):
+        if key not in self.sprites:
+            self.sprites[key] = build_function()
+        return self.sprites[key]
+
+
+solid_sprites = SpriteCache()
+
+
+def blend_rectangle(frame, start_x, start_y, end_x, end_y, color, alpha):
+    # In place version of drawing a filled rectangle on a copy of the frame and blending it
+    # back with addWeighted: only the pixels inside the rectangle (corners inclusive, like
+    # cv2.rectangle) are read and written.
+    start_x, start_y = max(int(start_x), 0), max(int(start_y), 0)
+    end_x, end_y = min(int(end_x)+1, frame.shape[1]), min(int(end_y)+1, frame.shape[0])
+    if start_x >= end_x or start_y >= end_y:
+        return frame
+
+    roi = frame[start_y:end_y, start_x:end_x]
+    solid = solid_sprites.get((roi.shape, tuple(color)), lambda: np.full(roi.shape, color, dtype=np.uint8))
+    cv2.addWeighted(solid, alpha, roi, 1 - alpha, 0, dst=roi)
+    return frame
@@ -0,0 +1,13 @@
+import os
+import pickle
+
+def read_stub(stub_path):
+    with open(stub_path, 'rb') as f:
+        return pickle.load(f)
+
+def save_stub(obj, stub_path):
+    stub_dir = os.path.dirname(stub_path)
+    if stub_dir:
+        os.makedirs(stub_dir, exist_ok=True)
+    with open(stub_path, 'wb') as f:
+        pickle.dump(obj, f)
@@ -0,0 +1,200 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import cv2
+from .profiling import profile_stage
+
+ENCODERS = ('auto', 'ffmpeg', 'cv2')
+# Container of each encoder's output: MJPG in AVI, H.264/HEVC in MP4
+OUTPUT_EXTENSIONS = {'ffmpeg': '.mp4', 'cv2': '.avi'}
+
+# Short names for the ffmpeg encoders, any other ffmpeg encoder name is passed as is
+FFMPEG_CODECS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'h265': 'libx265',
+}
+
+# x264 preset names for NVENC, which numbers its presets p1 (fastest) to p7
+NVENC_PRESETS = {
+    'ultrafast': 'p1',
+    'superfast': 'p1',
+    'veryfast': 'p2',
+    'faster': 'p3',
+    'fast': 'p3',
+    'medium': 'p4',
+    'slow': 'p5',
+    'slower': 'p6',
+    'veryslow': 'p7',
+}
+
+
+def is_ffmpeg_available(ffmpeg_path='ffmpeg'):
+    return shutil.which(ffmpeg_path) is not None
+
+
+def resolve_encoder(encoder='auto', ffmpeg_path='ffmpeg'):
+    # 'auto' is ffmpeg when it is installed, cv2 otherwise
+    if encoder == 'auto':
+        return 'ffmpeg' if is_ffmpeg_available(ffmpeg_path) else 'cv2'
+    if encoder not in ENCODERS:
+        raise ValueError(f"Unknown encoder {encoder}, expected one of {ENCODERS}")
+    return encoder
+
+
+def get_output_video_path(output_dir, encoder='cv2', name='output_video', ffmpeg_path='ffmpeg'):
+    # <output_dir>/<name>.mp4 for ffmpeg, .avi for cv2
+    return os.path.join(output_dir, name + OUTPUT_EXTENSIONS[resolve_encoder(encoder, ffmpeg_path)])
+
+
+class Cv2Encoder:
+    # cv2.VideoWriter, MJPG by default; opened on the first frame
+    def __init__(self, output_video_path, fps=24, fourcc='MJPG'):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            self.writer = cv2.VideoWriter(self.output_video_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (frame.shape[1], frame.shape[0]))
+        with profile_stage('video.encode', frames=1):
+            self.writer.write(frame)
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class FFmpegEncoder:
+    # Raw BGR frames piped into an ffmpeg process that compresses them with codec
+    # (libx264 by default, libx265, h264_nvenc/hevc_nvenc and h264_qsv/hevc_qsv use the
+    # GPU). crf is the quality (lower is better and bigger), preset the speed/size trade
+    # off in x264 names, threads 0 lets the encoder decide. Opened on the first frame.
+    def __init__(self, output_video_path, fps=24, codec='h264', crf=23, preset='veryfast', threads=0, ffmpeg_path='ffmpeg'):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.codec = FFMPEG_CODECS.get(codec, codec)
+        self.crf = crf
+        self.preset = preset
+        self.threads = threads
+        self.ffmpeg_path = ffmpeg_path
+        self.process = None
+        self.stderr = None
+        self.frame_shape = None
+
+    def get_codec_args(self):
+        if self.codec.endswith('_nvenc'):
+            return ['-c:v', self.codec, '-preset', NVENC_PRESETS.get(self.preset, self.preset), '-rc', 'vbr', '-cq', str(self.crf), '-b:v', '0']
+        if self.codec.endswith('_qsv'):
+            return ['-c:v', self.codec, '-preset', self.preset, '-global_quality', str(self.crf)]
+        return ['-c:v', self.codec, '-preset', self.preset, '-crf', str(self.crf), '-threads', str(self.threads)]
+
+    def get_command(self, width, height):
+        command = [self.ffmpeg_path, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                   # yuv420p needs even sizes
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                   *self.get_codec_args(),
+                   '-pix_fmt', 'yuv420p']
+        if self.codec in ('libx265', 'hevc_nvenc', 'hevc_qsv') and os.path.splitext(self.output_video_path)[1].lower() in ('.mp4', '.mov'):
+            # HEVC tag QuickTime and browsers play
+            command += ['-tag:v', 'hvc1']
+        return command + [self.output_video_path]
+
+    def write(self, frame):
+        if self.process is None:
+            self.frame_shape = frame.shape
+            # A file and not a pipe: nothing reads a pipe until ffmpeg fails, and ffmpeg
+            # blocks once it filled the pipe buffer with messages
+            self.stderr = tempfile.TemporaryFile()
+            self.process = subprocess.Popen(self.get_command(frame.shape[1], frame.shape[0]), stdin=subprocess.PIPE, stderr=self.stderr)
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame of shape {frame.shape} in a video of shape {self.frame_shape}")
+        with profile_stage('video.encode', frames=1):
+            try:
+                self.process.stdin.write(frame.tobytes())
+            except BrokenPipeError:
+                self.raise_error()
+
+    def release(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        self.process.wait()
+        if self.process.returncode != 0:
+            self.raise_error()
+        self.process = None
+        self.stderr.close()
+        self.stderr = None
+
+    def raise_error(self):
+        self.process.kill()
+        self.process.wait()
+        self.stderr.seek(0)
+        stderr = self.stderr.read().decode(errors='replace').strip()
+        self.stderr.close()
+        self.process = None
+        self.stderr = None
+        raise RuntimeError(f"ffmpeg could not encode {self.output_video_path}: {stderr}")
+
+
+class BackgroundEncoder:
+    # Runs another encoder on its own thread: write() only queues the frame and blocks when
+    # queue_size frames are already waiting. Frames must not change after write().
+    # An error of the encoder is raised by the next write() or by release().
+    def __init__(self, encoder, queue_size=16):
+        self.encoder = encoder
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='video-encoder', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            # After an error the remaining frames are dropped so that write() never blocks
+            if self.error is None:
+                try:
+                    self.encoder.write(frame)
+                except Exception as error:
+                    self.error = error
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(frame)
+
+    def release(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        try:
+            self.encoder.release()
+        finally:
+            if self.error is not None:
+                raise self.error
+
+
+def get_encoder(output_video_path, fps=24, encoder='cv2', fourcc='MJPG', codec='h264', crf=23, preset='veryfast', threads=0,
+                ffmpeg_path='ffmpeg', background=False, queue_size=16):
+    # encoder: 'cv2', 'ffmpeg' or 'auto' (ffmpeg when it is installed, cv2 otherwise)
+    encoder = resolve_encoder(encoder, ffmpeg_path)
+    if encoder == 'ffmpeg':
+        if not is_ffmpeg_available(ffmpeg_path):
+            raise FileNotFoundError(f"{ffmpeg_path} not found, install ffmpeg or use the cv2 encoder")
+        video_encoder = FFmpegEncoder(output_video_path, fps, codec=codec, crf=crf, preset=preset, threads=threads, ffmpeg_path=ffmpeg_path)
+    else:
+        video_encoder = Cv2Encoder(output_video_path, fps, fourcc=fourcc)
+    if background:
+        video_encoder = BackgroundEncoder(video_encoder, queue_size=queue_size)
+    return video_encoder
+
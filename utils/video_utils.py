@@ -1,19 +1,92 @@
 import cv2
+from .profiling import profile_stage
+from .video_encoders import get_encoder
 
 def read_video(video_path):
     cap = cv2.VideoCapture(video_path)
     frames = []
     while cap.isOpened():
-        ret, frame = cap.read()
+        with profile_stage('video.decode', frames=1):
+            ret, frame = cap.read()
         if not ret:
             break
         frames.append(frame)
     cap.release()
     return frames
 
-def save_video(output_video_frames, output_video_path):
-    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
-    for frame in output_video_frames:
-        out.write(frame)
-    out.release()
\ No newline at end of file
+def read_video_stream(video_path, start_frame=0, end_frame=None):
+    # Yield frames one at a time instead of decoding the whole video into a list,
+    # optionally only frames [start_frame, end_frame)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        # Seeking with CAP_PROP_POS_FRAMES is not frame accurate for many codecs,
+        # so earlier frames are skipped with grab() (decoded but never converted)
+        frame_num = 0
+        if start_frame > 0:
+            with profile_stage('video.skip', frames=start_frame):
+                while frame_num < start_frame and cap.grab():
+                    frame_num += 1
+        while cap.isOpened() and (end_frame is None or frame_num < end_frame):
+            with profile_stage('video.decode', frames=1):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            frame_num += 1
+    finally:
+        cap.release()
+
+def get_video_frame_count(video_path):
+    # From the container metadata, can be off by a few frames
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
+
+def get_video_fps(video_path, default=24):
+    # From the container metadata; some files report 0 or nonsense, then the default is used
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if not fps or fps != fps or fps > 1000:
+        return default
+    return fps
+
+def iter_frame_windows(frames, window_size):
+    # Group an iterable of frames into lists of at most window_size frames
+    window = []
+    for frame in frames:
+        window.append(frame)
+        if len(window) == window_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+class VideoWriter:
+    # Writer that receives frames as they are produced. The encoder is opened on the first
+    # frame: encoder='cv2' writes with cv2.VideoWriter (fourcc), 'ffmpeg' compresses with
+    # codec/crf/preset/threads through an ffmpeg pipe and 'auto' uses ffmpeg when it is
+    # installed. background=True encodes on a thread, frames must not change after write().
+    def __init__(self, output_video_path, fps=24, fourcc='MJPG', **encoder_options):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.encoder = get_encoder(output_video_path, fps, fourcc=fourcc, **encoder_options)
+
+    def write(self, frame):
+        self.encoder.write(frame)
+
+    def release(self):
+        self.encoder.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def save_video(output_video_frames, output_video_path, fps=24, **encoder_options):
+    # Works with a list or with a generator of frames; encoder_options as for VideoWriter
+    with VideoWriter(output_video_path, fps, **encoder_options) as out:
+        for frame in output_video_frames:
+            out.write(frame)